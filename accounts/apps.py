@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.apps import apps
+        from django.db.models.signals import post_delete
+        from .sync import SyncSeqMixin, record_deletion
+
+        for model in apps.get_models():
+            if issubclass(model, SyncSeqMixin):
+                post_delete.connect(record_deletion, sender=model, dispatch_uid=f'sync_tombstone_{model._meta.label_lower}')
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0029_user_is_available_for_match_user_is_online_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='sync_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='password',
+            field=models.CharField(default='pbkdf2_sha256$720000$buAZgeFAyWnWDoyNrRq2Cp$4HCPSRXZshddESy9kRDHOXdAdTmJ11j6wKk9OYp4XNI=', max_length=128),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-18 07:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_sync_seqs(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    SyncCounter = apps.get_model('accounts', 'SyncCounter')
+    SyncCounter.objects.bulk_create(
+        [SyncCounter(user_id=user_id, seq=seq) for user_id, seq in User.objects.filter(sync_seq__gt=0).values_list('id', 'sync_seq')],
+        batch_size=500,
+    )
+
+
+def restore_sync_seqs(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    SyncCounter = apps.get_model('accounts', 'SyncCounter')
+    for user_id, seq in SyncCounter.objects.values_list('user_id', 'seq'):
+        User.objects.filter(id=user_id).update(sync_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0030_user_sync_seq_alter_user_password'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(copy_sync_seqs, restore_sync_seqs),
+        migrations.RemoveField(
+            model_name='user',
+            name='sync_seq',
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='password',
+            field=models.CharField(default='pbkdf2_sha256$720000$CDVtBBb2elQFqnMB8Hj2Dl$eDiOCQE7bYZrviGByIJt6knUsA83ppYAr/cLtMRCXy4=', max_length=128),
+        ),
+    ]
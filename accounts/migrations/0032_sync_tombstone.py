@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-18 07:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0031_sync_counter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='password',
+            field=models.CharField(default='pbkdf2_sha256$720000$ILmuELEJToWfoeX7di1ZvX$JntHb+UQOfW1Uck9z3Sy/bgEP7Fw3pAi/GV6VtrodTk=', max_length=128),
+        ),
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=32)),
+                ('object_id', models.BigIntegerField()),
+                ('sync_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_tombstones', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'sync_seq'], name='tombstone_user_sync_seq_idx')],
+            },
+        ),
+    ]
@@ -52,3 +52,37 @@ class User(AbstractBaseUser):
     def __str__(self):
         return f"User {self.id}"
 
+
+
+class SyncCounter(models.Model):
+    """
+    Last change sequence handed out to a user's pages, branches and progress
+    reports (see accounts.sync). Kept off the user row so taking a value
+    does not lock the user against last_seen / is_online updates.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='sync_counter')
+    seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"SyncCounter {self.user_id} ({self.seq})"
+
+
+class SyncTombstone(models.Model):
+    """
+    A deleted UserPage, Branch or UserProgressReport, stamped with a sync
+    sequence value so other devices learn of the deletion (see accounts.sync).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_tombstones')
+    # Key of the deleted row's kind in the users/<id>/sync payload, e.g. "user_pages"
+    kind = models.CharField(max_length=32)
+    object_id = models.BigIntegerField()
+    sync_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sync_seq'], name='tombstone_user_sync_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"SyncTombstone {self.kind} {self.object_id}"
@@ -0,0 +1,64 @@
+"""
+Shared boto3 S3 clients.
+
+Building a client is slow and memory hungry, so every S3 code path should go
+through get_s3_client() instead of calling boto3.client() itself. Clients are
+built lazily on first use and then shared by every request and worker thread
+in the process (boto3 clients are thread-safe once created).
+"""
+import threading
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _build_client(endpoint_url=None):
+    # boto3's default session is not thread-safe, so each client gets its own
+    session = boto3.session.Session(
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        region_name=settings.AWS_S3_REGION_NAME,
+    )
+    return session.client(
+        's3',
+        endpoint_url=endpoint_url,
+        config=Config(
+            signature_version='s3v4',
+            max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+            read_timeout=settings.AWS_S3_READ_TIMEOUT,
+            retries={'max_attempts': settings.AWS_S3_MAX_ATTEMPTS, 'mode': 'standard'},
+        ),
+    )
+
+
+def get_s3_client(endpoint_url=None):
+    """
+    Return the shared S3 client for `endpoint_url` (AWS_S3_ENDPOINT_URL by default).
+
+    Pass an explicit endpoint to talk to a local S3 stand-in such as moto's
+    server without touching the production client.
+    """
+    endpoint_url = endpoint_url or settings.AWS_S3_ENDPOINT_URL
+    client = _clients.get(endpoint_url)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(endpoint_url)
+        if client is None:
+            client = _build_client(endpoint_url)
+            _clients[endpoint_url] = client
+    return client
+
+
+def reset_s3_clients():
+    """
+    Forget every shared client, e.g. after entering a moto mock in tests.
+    """
+    with _clients_lock:
+        _clients.clear()
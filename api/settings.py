@@ -225,3 +225,72 @@ AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME')
 AWS_DEFAULT_ACL = None
 AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
 AWS_S3_OBJECT_PARAMETERS = {'CacheControl': 'max-age=86400'}
+
+# Presigned image URLs are reused for a whole window so downstream caches can hit
+AWS_PRESIGNED_URL_EXPIRES_IN = config('AWS_PRESIGNED_URL_EXPIRES_IN', default=3600, cast=int)
+AWS_PRESIGNED_URL_WINDOW = config('AWS_PRESIGNED_URL_WINDOW', default=900, cast=int)
+
+# Shared S3 clients (see api/s3.py)
+AWS_S3_REGION_NAME = config('AWS_REGION_NAME', default=None)
+AWS_S3_ENDPOINT_URL = config('AWS_S3_ENDPOINT_URL', default=None)
+AWS_S3_MAX_POOL_CONNECTIONS = config('AWS_S3_MAX_POOL_CONNECTIONS', default=50, cast=int)
+AWS_S3_CONNECT_TIMEOUT = config('AWS_S3_CONNECT_TIMEOUT', default=5, cast=int)
+AWS_S3_READ_TIMEOUT = config('AWS_S3_READ_TIMEOUT', default=30, cast=int)
+AWS_S3_MAX_ATTEMPTS = config('AWS_S3_MAX_ATTEMPTS', default=5, cast=int)
+
+# Cache (shared through Redis when available so catalog versions agree across workers)
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "hifz",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
+# Mushaf catalog (pages and segments) caching, see mushaf/catalog.py. Set REDIS_URL in
+# production: with the local-memory cache each process holds its own copy of the catalog
+# version, so processes can disagree on it for up to MUSHAF_CATALOG_VERSION_TTL seconds.
+MUSHAF_CATALOG_VERSION_TTL = config('MUSHAF_CATALOG_VERSION_TTL', default=60, cast=int)
+MUSHAF_CATALOG_MAX_AGE = config('MUSHAF_CATALOG_MAX_AGE', default=86400, cast=int)
+MUSHAF_CATALOG_CHECK_INTERVAL = config('MUSHAF_CATALOG_CHECK_INTERVAL', default=5, cast=int)
+MUSHAF_CATALOG_WARM = config('MUSHAF_CATALOG_WARM', default=True, cast=bool)
+# How long a built manifest (mushaf/manifest.py) stays cached; superseded versions expire after this
+MUSHAF_MANIFEST_CACHE_TTL = config('MUSHAF_MANIFEST_CACHE_TTL', default=7 * 86400, cast=int)
+
+# UserPage.drawn_paths storage: 'json', or 'binary' for the packed format in user_page/stroke_codec.py
+USER_PAGE_STROKE_STORAGE = config('USER_PAGE_STROKE_STORAGE', default='json')
+USER_PAGE_STROKE_SCALE = config('USER_PAGE_STROKE_SCALE', default=100, cast=int)
+
+# Ramer-Douglas-Peucker tolerance (in drawing units) applied to new strokes; 0 disables
+USER_PAGE_SIMPLIFY_TOLERANCE = config('USER_PAGE_SIMPLIFY_TOLERANCE', default=0.5, cast=float)
+
+# UserPage commit storage: 'full' copies drawn_paths on every commit, 'delta' stores
+# the change from the previous commit with a full snapshot every USER_PAGE_SNAPSHOT_INTERVAL
+USER_PAGE_COMMIT_STORAGE = config('USER_PAGE_COMMIT_STORAGE', default='full')
+USER_PAGE_SNAPSHOT_INTERVAL = config('USER_PAGE_SNAPSHOT_INTERVAL', default=20, cast=int)
+USER_PAGE_DELTA_CACHE_TTL = config('USER_PAGE_DELTA_CACHE_TTL', default=86400, cast=int)
+
+# Commit history page size for users/<id>/pages/<page>/branch/<branch>?limit=&cursor=
+USER_PAGE_HISTORY_PAGE_SIZE = config('USER_PAGE_HISTORY_PAGE_SIZE', default=20, cast=int)
+USER_PAGE_HISTORY_MAX_PAGE_SIZE = config('USER_PAGE_HISTORY_MAX_PAGE_SIZE', default=100, cast=int)
+
+# Rows fetched per round trip by the user_pages export (users/<id>/export)
+USER_PAGE_EXPORT_CHUNK_SIZE = config('USER_PAGE_EXPORT_CHUNK_SIZE', default=200, cast=int)
+
+# Most commits accepted by one user_pages/batch upload
+USER_PAGE_BATCH_MAX_COMMITS = config('USER_PAGE_BATCH_MAX_COMMITS', default=200, cast=int)
+
+# How far (seconds) a queued commit's created_at may be ahead of the server clock;
+# times within this are taken as the time of the upload
+USER_PAGE_BATCH_CLOCK_SKEW = config('USER_PAGE_BATCH_CLOCK_SKEW', default=300, cast=int)
+
+# Changes returned per users/<id>/sync?since= request
+USER_SYNC_PAGE_SIZE = config('USER_SYNC_PAGE_SIZE', default=200, cast=int)
+USER_SYNC_MAX_PAGE_SIZE = config('USER_SYNC_MAX_PAGE_SIZE', default=1000, cast=int)
@@ -18,8 +18,8 @@ from django.contrib import admin
 from django.urls import path, include
 
 from accounts.views import CreateUserView, SignInView, UpdateUserView, SearchUserByEmailView, FindUserByIdView
-from mushaf_page.views import MushafPageView, FindPageByVerseRefView
-from user_page.views import UserPageView, CreateUserPageView, UserProgressView, RandomUserPageView
+from mushaf_page.views import MushafPageView, FindPageByVerseRefView, FindPagesByVerseRefsView
+from user_page.views import UserPageView, CreateUserPageView, UserProgressView, RandomUserPageView, UserPageDrawnPathsView, UserPagesExportView, BatchCreateUserPagesView, UserSyncView
 from lead.views import CreateLeadView
 from mushaf_segment.views import MushafSegmentsView
 
@@ -30,9 +30,14 @@ urlpatterns = [
     path('users/sign_in', SignInView.as_view(), name='sign-in'),
     path('mushafs/<int:mushaf_id>/pages/<int:page_number>', MushafPageView.as_view(), name='show_mushaf_page'),   
     path('find_page/<int:mushaf_id>/<str:verse_ref>', FindPageByVerseRefView.as_view(), name='find_page_by_verse_ref_page'),   
+    path('find_pages/<int:mushaf_id>', FindPagesByVerseRefsView.as_view(), name='find_pages_by_verse_refs'),
     path('users/<int:user_id>/pages/<int:mushaf_page_id>/branch/<int:branch_id>', UserPageView.as_view(), name='show_user_page'),   
     path('users/<int:user_id>', FindUserByIdView.as_view(), name='show_user_page'),
+    path('users/<int:user_id>/export', UserPagesExportView.as_view(), name='export_user_pages'),
+    path('users/<int:user_id>/sync', UserSyncView.as_view(), name='user_sync'),
     path('user_pages', CreateUserPageView.as_view(), name='create_user_page'),   
+    path('user_pages/batch', BatchCreateUserPagesView.as_view(), name='batch_create_user_pages'),
+    path('user_pages/<int:user_page_id>/drawn_paths', UserPageDrawnPathsView.as_view(), name='user_page_drawn_paths'),
     path('users/search', SearchUserByEmailView.as_view(), name='search_user_page'),   
     
     path('users/<int:user_id>/progress/random/<int:current_page_number>', RandomUserPageView.as_view(), name='user_progress'),   
@@ -47,6 +52,7 @@ urlpatterns = [
     path('', include('mushaf_segment.urls')),  
     path('', include('missions.urls')),
     path('', include('mushaf_page.urls')),
+    path('', include('mushaf.urls')),
     path('', include('branch.urls')),
     path('', include('stats.urls')),
 ]
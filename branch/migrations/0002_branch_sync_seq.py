@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-18 06:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='sync_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='branch',
+            index=models.Index(fields=['user', 'sync_seq'], name='branch_user_sync_seq_idx'),
+        ),
+    ]
@@ -3,15 +3,23 @@ from django.contrib.auth.models import User
 import random
 from django.db import IntegrityError
 from django.conf import settings
+from accounts.sync import SyncSeqMixin
 
 
-class Branch(models.Model):
+class Branch(SyncSeqMixin, models.Model):
     id = models.AutoField(primary_key=True)
     title = models.CharField(max_length=255)
     position = models.IntegerField()
     hash_id = models.IntegerField(unique=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
+    sync_kind = 'branches'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sync_seq'], name='branch_user_sync_seq_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.hash_id:
             while True:
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class MushafConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mushaf'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import request_started
+
+        if settings.MUSHAF_CATALOG_WARM:
+            # Warm lazily in each worker rather than at import time, before a preforking server forks
+            from .catalog import warm_catalogs_on_first_request
+            request_started.connect(warm_catalogs_on_first_request, dispatch_uid='mushaf_warm_catalogs')
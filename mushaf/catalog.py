@@ -0,0 +1,416 @@
+"""
+Per-mushaf catalog of pages and segments.
+
+Pages and segments of a mushaf are reference data that almost never change.
+Every write to them bumps Mushaf.catalog_version, and read endpoints derive
+their ETags from that number, so clients holding the current version get a
+304 without the view touching the ORM.
+
+The current version is read through the Django cache; the database is only
+consulted on a cache miss. Production needs a shared cache (REDIS_URL): with
+the local-memory fallback each process caches the version on its own, so
+after a bump processes can disagree on it (and on the ETag they send) for up
+to MUSHAF_CATALOG_VERSION_TTL seconds.
+
+Each process also keeps an immutable in-memory MushafCatalog per mushaf
+(array-backed page and segment data). It is warmed on the first request a
+worker process serves (after any fork, so no database connection is opened
+in a preforking server's master), rebuilt
+when the catalog version moves, and serves verse, page and segment lookups
+without database queries.
+"""
+import copy
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Mushaf
+
+CATALOG_VERSION_CACHE_KEY = 'mushaf:{}:catalog_version'
+
+
+def get_catalog_version(mushaf_id):
+    """
+    Return the current catalog version of a mushaf (0 if it does not exist).
+    """
+    cache_key = CATALOG_VERSION_CACHE_KEY.format(mushaf_id)
+    version = cache.get(cache_key)
+    if version is None:
+        version = Mushaf.objects.filter(id=mushaf_id).values_list('catalog_version', flat=True).first() or 0
+        cache.set(cache_key, version, settings.MUSHAF_CATALOG_VERSION_TTL)
+    return version
+
+
+def bump_catalog_version(mushaf_id):
+    """
+    Mark the catalog of a mushaf as changed once the current transaction commits.
+    """
+    def bump():
+        Mushaf.objects.filter(id=mushaf_id).update(catalog_version=F('catalog_version') + 1)
+        cache.delete(CATALOG_VERSION_CACHE_KEY.format(mushaf_id))
+        # Other processes notice through the version check in get_catalog()
+        discard_catalog(mushaf_id)
+
+    transaction.on_commit(bump)
+
+
+def catalog_etag(mushaf_id, version, *parts, weak=False):
+    tag = '-'.join(str(part) for part in ('mushaf', mushaf_id, f'v{version}', *parts))
+    return f'W/"{tag}"' if weak else f'"{tag}"'
+
+
+def _opaque_tag(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def catalog_conditional_get(max_age=None, etag_parts=None, weak=False):
+    """
+    Decorator for APIView.get methods serving catalog data of one mushaf.
+
+    Emits an ETag built from the catalog version and answers If-None-Match
+    with a 304 before the view runs (using weak comparison, as If-None-Match
+    requires).
+
+    Args:
+        max_age (int | callable): Cache-Control max-age in seconds, or a
+            callable returning it (defaults to MUSHAF_CATALOG_MAX_AGE).
+        etag_parts (callable): Optional (request, **kwargs) -> tuple of extra
+            values the representation depends on besides the catalog version.
+        weak (bool): Send a weak ETag, for bodies that are equivalent but not
+            byte-identical across processes (e.g. ones embedding presigned URLs).
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(self, request, *args, mushaf_id, **kwargs):
+            version = get_catalog_version(mushaf_id)
+            parts = etag_parts(request, mushaf_id=mushaf_id, **kwargs) if etag_parts else ()
+            etag = catalog_etag(mushaf_id, version, *parts, weak=weak)
+
+            if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+            if _opaque_tag(etag) in {_opaque_tag(tag) for tag in if_none_match}:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = get(self, request, *args, mushaf_id=mushaf_id, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+
+            age = max_age() if callable(max_age) else max_age
+            response['ETag'] = etag
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.MUSHAF_CATALOG_MAX_AGE if age is None else age,
+            )
+            patch_vary_headers(response, ('Accept',))
+            return response
+        return wrapper
+    return decorator
+
+
+logger = logging.getLogger(__name__)
+
+PAGE_FIELDS = (
+    'id', 'mushaf_id', 'page_number', 'image_url', 'image_s3_key',
+    'verse_ref_start', 'verse_ref_end', 'verse_key_start', 'verse_key_end', 'image_variants',
+)
+SEGMENT_FIELDS = ('id', 'mushaf_id', 'title', 'category', 'category_position', 'first_page', 'last_page')
+
+SURAH = 'surah'
+JUZ = 'juz'
+DEFAULT_SEGMENT_CATEGORY = SURAH
+
+
+class PageRecord:
+    __slots__ = PAGE_FIELDS
+
+    def __init__(self, *values):
+        for field, value in zip(PAGE_FIELDS, values):
+            setattr(self, field, value)
+
+    def as_page(self):
+        """
+        Return an equivalent MushafPage instance without querying the database.
+
+        The instance gets its own copy of image_variants, so changes to it do
+        not leak into the shared catalog.
+        """
+        from mushaf_page.models import MushafPage
+
+        field_names = [field.attname for field in MushafPage._meta.concrete_fields]
+        values = [getattr(self, name) for name in field_names]
+        values[field_names.index('image_variants')] = copy.deepcopy(self.image_variants)
+        return MushafPage.from_db('default', field_names, values)
+
+
+class SegmentRecord:
+    __slots__ = SEGMENT_FIELDS
+
+    def __init__(self, *values):
+        for field, value in zip(SEGMENT_FIELDS, values):
+            setattr(self, field, value)
+
+    def __str__(self):
+        return self.title
+
+
+class MushafCatalog:
+    """
+    Immutable snapshot of the pages and segments of one mushaf.
+    """
+
+    __slots__ = (
+        'mushaf_id', 'version', 'pages', 'page_numbers', 'positions_by_page_id',
+        'positions_by_page_number', 'segments', 'segment_first_pages', 'segment_last_pages',
+        'segment_tables', 'segment_memberships', 'verse_index', 'checked_at',
+    )
+
+    def __init__(self, mushaf_id, version, page_rows, segment_rows):
+        from mushaf_page.verse_index import VerseIndex
+
+        self.mushaf_id = mushaf_id
+        self.version = version
+        self.pages = tuple(PageRecord(*row) for row in page_rows)
+        self.page_numbers = array('i', (page.page_number for page in self.pages))
+        self.positions_by_page_id = {page.id: position for position, page in enumerate(self.pages)}
+        self.positions_by_page_number = {}
+        for position, page in enumerate(self.pages):
+            # Legacy duplicate page numbers resolve to the oldest row
+            self.positions_by_page_number.setdefault(page.page_number, position)
+
+        # Ordered by first page so segment_first_pages can be bisected
+        self.segments = tuple(sorted(
+            (SegmentRecord(*row) for row in segment_rows),
+            key=lambda segment: (segment.first_page, segment.category, segment.category_position, segment.id),
+        ))
+        self.segment_first_pages = array('i', (segment.first_page for segment in self.segments))
+        self.segment_last_pages = array('i', (segment.last_page for segment in self.segments))
+        self.segment_tables = self._build_segment_tables()
+        self.segment_memberships = self._build_segment_memberships()
+
+        self.verse_index = VerseIndex(
+            mushaf_id,
+            ((page.id, page.page_number, page.verse_key_start, page.verse_key_end) for page in self.pages),
+        )
+        self.checked_at = time.monotonic()
+
+    @classmethod
+    def load(cls, mushaf_id):
+        from mushaf_page.models import MushafPage
+        from mushaf_segment.models import MushafSegment
+
+        version = get_catalog_version(mushaf_id)
+        page_rows = MushafPage.objects.filter(mushaf_id=mushaf_id).order_by('page_number', 'id').values_list(*PAGE_FIELDS)
+        segment_rows = MushafSegment.objects.filter(mushaf_id=mushaf_id).order_by('id').values_list(*SEGMENT_FIELDS)
+        return cls(mushaf_id, version, page_rows, segment_rows)
+
+    def page(self, page_id):
+        position = self.positions_by_page_id.get(page_id)
+        return None if position is None else self.pages[position]
+
+    def page_by_number(self, page_number):
+        position = self.positions_by_page_number.get(page_number)
+        return None if position is None else self.pages[position]
+
+    def _build_segment_memberships(self):
+        """
+        Interval index: for every page number, the positions of all segments
+        (any category) covering it.
+        """
+        last_page = max(list(self.page_numbers) + list(self.segment_last_pages) + [0])
+        memberships = [[] for _ in range(last_page + 1)]
+        for position, segment in enumerate(self.segments):
+            for page_number in range(max(segment.first_page, 0), segment.last_page + 1):
+                memberships[page_number].append(position)
+        return tuple(tuple(positions) for positions in memberships)
+
+    def segments_containing(self, page_number):
+        """
+        Every segment, of any category, that covers the page.
+        """
+        if not 0 <= page_number < len(self.segment_memberships):
+            return []
+        return [self.segments[position] for position in self.segment_memberships[page_number]]
+
+    def segments_overlapping(self, first_page, last_page=None):
+        """
+        Every segment, of any category, sharing at least one page with
+        first_page..last_page (inclusive), ordered by first page.
+        """
+        if last_page is None or last_page == first_page:
+            return self.segments_containing(first_page)
+        if last_page < first_page:
+            first_page, last_page = last_page, first_page
+        # Segments starting after the range cannot overlap it
+        candidates = bisect_right(self.segment_first_pages, last_page)
+        return [
+            self.segments[position]
+            for position in range(candidates)
+            if self.segment_last_pages[position] >= first_page
+        ]
+
+    def _build_segment_tables(self):
+        """
+        One array per category mapping page_number -> position in self.segments
+        (-1 where no segment of that category covers the page).
+        """
+        last_page = max(list(self.page_numbers) + list(self.segment_last_pages) + [0])
+        tables = {}
+        # Write later segments first so that on a page shared by two segments
+        # (a surah ending where the next begins) the earlier one wins
+        order = sorted(
+            range(len(self.segments)),
+            key=lambda position: (self.segments[position].category_position, self.segments[position].id),
+            reverse=True,
+        )
+        for position in order:
+            segment = self.segments[position]
+            table = tables.get(segment.category)
+            if table is None:
+                table = tables[segment.category] = array('i', [-1]) * (last_page + 1)
+            for page_number in range(max(segment.first_page, 0), segment.last_page + 1):
+                table[page_number] = position
+        return tables
+
+    def segment_for_page(self, page_number, category=DEFAULT_SEGMENT_CATEGORY):
+        """
+        Return the segment of `category` containing the page, or None. O(1).
+        """
+        table = self.segment_tables.get(category)
+        if table is None or not 0 <= page_number < len(table):
+            return None
+        position = table[page_number]
+        return None if position < 0 else self.segments[position]
+
+    def segment_and_percentage(self, page_number, category=DEFAULT_SEGMENT_CATEGORY):
+        """
+        Return the segment of `category` containing the page and how far into
+        it the page is (rounded percent), or (None, 0).
+        """
+        segment = self.segment_for_page(page_number, category)
+        if segment is None:
+            return None, 0
+        total_pages_in_range = segment.last_page - segment.first_page + 1
+        percentage = ((page_number - segment.first_page) / total_pages_in_range) * 100
+        return segment, round(percentage)
+
+
+_catalogs = {}
+_page_mushaf_ids = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(mushaf_id):
+    """
+    Return the in-memory catalog of a mushaf, (re)building it when the catalog
+    version has moved. The version is checked at most once every
+    MUSHAF_CATALOG_CHECK_INTERVAL seconds.
+    """
+    catalog = _catalogs.get(mushaf_id)
+    if catalog is not None:
+        now = time.monotonic()
+        if now - catalog.checked_at < settings.MUSHAF_CATALOG_CHECK_INTERVAL:
+            return catalog
+        if get_catalog_version(mushaf_id) == catalog.version:
+            catalog.checked_at = now
+            return catalog
+
+    with _catalogs_lock:
+        current = _catalogs.get(mushaf_id)
+        if current is not None and current is not catalog:
+            # Another thread rebuilt it while we waited
+            return current
+        catalog = MushafCatalog.load(mushaf_id)
+        _catalogs[mushaf_id] = catalog
+        for page in catalog.pages:
+            _page_mushaf_ids[page.id] = mushaf_id
+    return catalog
+
+
+def get_catalog_for_page(mushaf_page_id):
+    """
+    Return the catalog holding a MushafPage id, or None for an unknown page.
+    """
+    mushaf_id = _page_mushaf_ids.get(mushaf_page_id)
+    if mushaf_id is None:
+        from mushaf_page.models import MushafPage
+
+        mushaf_id = MushafPage.objects.filter(id=mushaf_page_id).values_list('mushaf_id', flat=True).first()
+        if mushaf_id is None:
+            return None
+    catalog = get_catalog(mushaf_id)
+    return catalog if catalog.page(mushaf_page_id) is not None else None
+
+
+def resolve_segment(mushaf_id, page_number, category=DEFAULT_SEGMENT_CATEGORY):
+    """
+    Return the segment of `category` containing a page of a mushaf, or None.
+
+    Answered from the catalog's precomputed page-to-segment table, so repeated
+    calls for the same (mushaf, category, page) cost a dict and array lookup.
+    """
+    return get_catalog(mushaf_id).segment_for_page(page_number, category)
+
+
+def get_catalog_page(mushaf_page_id):
+    """
+    Return the PageRecord for a MushafPage id, or None for an unknown page.
+    """
+    catalog = get_catalog_for_page(mushaf_page_id)
+    return catalog.page(mushaf_page_id) if catalog else None
+
+
+def discard_catalog(mushaf_id=None):
+    """
+    Drop the in-memory catalog of a mushaf (or of every mushaf) in this process.
+    """
+    with _catalogs_lock:
+        if mushaf_id is None:
+            _catalogs.clear()
+        else:
+            _catalogs.pop(mushaf_id, None)
+
+
+def warm_catalogs():
+    """
+    Load every mushaf's catalog so later requests do not pay for it. Failures
+    (e.g. no database yet) are logged, not raised.
+    """
+    try:
+        for mushaf_id in Mushaf.objects.values_list('id', flat=True):
+            get_catalog(mushaf_id)
+    except Exception:
+        logger.exception("Could not warm the mushaf catalogs")
+
+
+_warmed_pid = None
+_warm_lock = threading.Lock()
+
+
+def warm_catalogs_on_first_request(sender, **kwargs):
+    """
+    request_started receiver warming the catalogs once per worker process.
+
+    Keyed by pid, so a worker forked from a process that already warmed up
+    still loads its own copy over its own database connection.
+    """
+    global _warmed_pid
+    if _warmed_pid == os.getpid():
+        return
+    with _warm_lock:
+        if _warmed_pid == os.getpid():
+            return
+        _warmed_pid = os.getpid()
+    warm_catalogs()
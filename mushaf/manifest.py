@@ -0,0 +1,102 @@
+"""
+Whole-mushaf manifest: every page (id, number, verse range, image key) and
+every segment in one JSON document.
+
+A manifest is built once per catalog version, compressed up front (gzip, and
+brotli when the `brotli` package is installed) and stored in the cache under
+its mushaf id and content hash for MUSHAF_MANIFEST_CACHE_TTL seconds, so
+superseded versions age out. The hash goes into the URL, so the document
+itself can be cached forever by clients and the CDN.
+"""
+import gzip
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .catalog import get_catalog_version
+
+try:
+    import brotli
+except ImportError:  # Optional: manifests are then offered as gzip/identity only
+    brotli = None
+
+MANIFEST_HASH_CACHE_KEY = 'mushaf:{}:manifest:v{}'
+MANIFEST_BODY_CACHE_KEY = 'mushaf:{}:manifest:{}'
+
+
+def build_manifest(mushaf_id, version):
+    from mushaf_page.models import MushafPage
+    from mushaf_segment.models import MushafSegment
+
+    pages = MushafPage.objects.filter(mushaf_id=mushaf_id).order_by('page_number').values_list(
+        'id', 'page_number', 'verse_ref_start', 'verse_ref_end', 'image_s3_key'
+    )
+    segments = MushafSegment.objects.filter(mushaf_id=mushaf_id).order_by('category', 'category_position').values(
+        'id', 'title', 'category', 'category_position', 'first_page', 'last_page'
+    )
+    return {
+        'mushaf_id': mushaf_id,
+        'catalog_version': version,
+        # Pages are rows to keep the document small; see page_fields for the order
+        'page_fields': ['id', 'page_number', 'verse_ref_start', 'verse_ref_end', 'image_s3_key'],
+        'pages': [list(page) for page in pages],
+        'segments': list(segments),
+    }
+
+
+def encode_manifest(manifest):
+    """
+    Serialize a manifest and precompress it.
+
+    Returns:
+        tuple: (content hash, {content-encoding: bytes}) where "identity" is
+        the uncompressed body.
+    """
+    body = json.dumps(manifest, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    encodings = {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        encodings['br'] = brotli.compress(body, quality=11)
+    return hashlib.sha256(body).hexdigest()[:20], encodings
+
+
+def _cached_encodings(mushaf_id, manifest_hash):
+    entry = cache.get(MANIFEST_BODY_CACHE_KEY.format(mushaf_id, manifest_hash))
+    if entry is None:
+        return None
+    entry_mushaf_id, encodings = entry
+    return encodings if entry_mushaf_id == mushaf_id else None
+
+
+def current_manifest_hash(mushaf_id):
+    """
+    Return the content hash of the manifest for the current catalog version,
+    building and storing the manifest if this version has not been seen yet.
+    """
+    version = get_catalog_version(mushaf_id)
+    hash_key = MANIFEST_HASH_CACHE_KEY.format(mushaf_id, version)
+    manifest_hash = cache.get(hash_key)
+    if manifest_hash is not None and _cached_encodings(mushaf_id, manifest_hash) is not None:
+        return manifest_hash
+
+    manifest_hash, encodings = encode_manifest(build_manifest(mushaf_id, version))
+    timeout = settings.MUSHAF_MANIFEST_CACHE_TTL
+    cache.set(MANIFEST_BODY_CACHE_KEY.format(mushaf_id, manifest_hash), (mushaf_id, encodings), timeout)
+    cache.set(hash_key, manifest_hash, timeout)
+    return manifest_hash
+
+
+def get_manifest_encodings(mushaf_id, manifest_hash):
+    """
+    Return the precompressed bodies stored for `manifest_hash` of this mushaf,
+    or None if the hash is unknown (e.g. an old version that has expired, or
+    the manifest of another mushaf).
+    """
+    encodings = _cached_encodings(mushaf_id, manifest_hash)
+    if encodings is None and current_manifest_hash(mushaf_id) == manifest_hash:
+        encodings = _cached_encodings(mushaf_id, manifest_hash)
+    return encodings
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mushaf', '0002_mushaf_title'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mushaf',
+            name='catalog_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -7,6 +7,8 @@ class Mushaf(models.Model):
     id = models.AutoField(primary_key=True)
     # Add other fields as needed
     title = models.CharField(max_length=255, default='null')  # Adjust the max length as needed
+    # Bumped whenever pages or segments change, see mushaf.catalog
+    catalog_version = models.PositiveIntegerField(default=1)
 
     class Meta:
         app_label = 'mushaf'
@@ -14,14 +16,14 @@ class Mushaf(models.Model):
     def __str__(self):
         return f"Mushaf {self.id}"
     
-    def get_segment_and_percentage(self, page_number):
-        try:
-            segment = self.mushafsegment_set.get(first_page__lte=page_number, last_page__gte=page_number)
-        except:
-            return None, 0
+    def get_segment_and_percentage(self, page_number, category='surah'):
+        """
+        Return the segment of `category` ("surah" or "juz") containing the page
+        and the rounded percentage of the way through it, or (None, 0).
 
-        total_pages_in_range = segment.last_page - segment.first_page + 1
-        percentage = ((page_number - segment.first_page) / total_pages_in_range) * 100
-        rounded_number = round(percentage)
+        Served from the in-memory catalog's page-to-segment table, so no query
+        is made; see mushaf.catalog.
+        """
+        from .catalog import get_catalog
 
-        return segment, rounded_number
\ No newline at end of file
+        return get_catalog(self.id).segment_and_percentage(page_number, category)
@@ -1,3 +1,119 @@
+import gzip
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from mushaf_page.models import MushafPage
+from . import catalog, manifest
+from .catalog import MushafCatalog, catalog_etag, discard_catalog, get_catalog
+from .manifest import current_manifest_hash
+from .models import Mushaf
+
+
+class CatalogTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.mushaf = Mushaf.objects.create(title='Test')
+        for page_number in (1, 2, 3):
+            MushafPage.objects.create(
+                mushaf=self.mushaf, page_number=page_number,
+                verse_ref_start=f'1:{page_number * 2 - 1}', verse_ref_end=f'1:{page_number * 2}',
+            )
+        self.addCleanup(discard_catalog, self.mushaf.id)
+
+
+class CatalogConditionalGetTests(CatalogTestCase):
+    def test_catalog_etag(self):
+        self.assertEqual(catalog_etag(1, 4, 'surahs'), '"mushaf-1-v4-surahs"')
+        self.assertEqual(catalog_etag(1, 4, 'page', 2, weak=True), 'W/"mushaf-1-v4-page-2"')
+
+    def test_segments_use_strong_etag(self):
+        url = f'/mushafs/{self.mushaf.id}/surahs'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_presigned_page_uses_weak_etag(self):
+        url = f'/mushafs/{self.mushaf.id}/pages/2'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertLessEqual(int(response['Cache-Control'].split('max-age=')[1].split(',')[0]), 900)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # If-None-Match uses weak comparison, so the strong form matches too
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag[2:]).status_code, 304)
+
+    def test_version_bump_changes_etag(self):
+        url = f'/mushafs/{self.mushaf.id}/pages/2'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            MushafPage.objects.filter(mushaf=self.mushaf, page_number=3).first().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ManifestTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Mushaf.objects.create(title='Other')
+        self.addCleanup(discard_catalog, self.other.id)
+
+    def manifest_url(self, mushaf_id):
+        response = self.client.get(f'/mushafs/{mushaf_id}/manifest')
+        self.assertEqual(response.status_code, 302)
+        return response['Location']
+
+    def test_manifest_round_trip(self):
+        response = self.client.get(self.manifest_url(self.mushaf.id), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        document = json.loads(gzip.decompress(response.content))
+        self.assertEqual(document['mushaf_id'], self.mushaf.id)
+        self.assertEqual([page[1] for page in document['pages']], [1, 2, 3])
+
+    def test_hash_of_another_mushaf_is_not_served(self):
+        manifest_hash = current_manifest_hash(self.mushaf.id)
+        response = self.client.get(f'/mushafs/{self.other.id}/manifest/{manifest_hash}.json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_entries_expire(self):
+        with mock.patch.object(manifest.cache, 'set') as cache_set:
+            current_manifest_hash(self.mushaf.id)
+        manifest_calls = [call for call in cache_set.call_args_list if ':manifest:' in call.args[0]]
+        self.assertEqual(len(manifest_calls), 2)
+        for call in manifest_calls:
+            self.assertEqual(call.args[2], settings.MUSHAF_MANIFEST_CACHE_TTL)
+
+
+class CatalogPageTests(CatalogTestCase):
+    def test_find_page_by_verse_ref_reads_one_catalog(self):
+        stale = get_catalog(self.mushaf.id)
+        rebuilt = MushafCatalog(self.mushaf.id, stale.version + 1, [], [])
+        with mock.patch('mushaf.catalog.get_catalog', side_effect=[stale, rebuilt]):
+            page = MushafPage.find_page_by_verse_ref(self.mushaf.id, '1:3')
+        self.assertEqual(page.page_number, 2)
+
+    def test_as_page_copies_image_variants(self):
+        MushafPage.objects.filter(mushaf=self.mushaf, page_number=1).update(image_variants={'webp': {'480': 'a.webp'}})
+        record = get_catalog(self.mushaf.id).page_by_number(1)
+        page = record.as_page()
+        page.image_variants['webp']['480'] = 'changed.webp'
+        self.assertEqual(record.image_variants, {'webp': {'480': 'a.webp'}})
+        self.assertEqual(record.as_page().image_variants, {'webp': {'480': 'a.webp'}})
 
-# Create your tests here.
+    def test_catalogs_warm_once_per_process(self):
+        discard_catalog()
+        with mock.patch.object(catalog, '_warmed_pid', None), mock.patch.object(catalog, 'warm_catalogs') as warm:
+            catalog.warm_catalogs_on_first_request(sender=None)
+            catalog.warm_catalogs_on_first_request(sender=None)
+        warm.assert_called_once_with()
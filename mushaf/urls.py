@@ -0,0 +1,7 @@
+from django.urls import path
+from .views import MushafManifestView, MushafManifestContentView
+
+urlpatterns = [
+    path('mushafs/<int:mushaf_id>/manifest', MushafManifestView.as_view(), name='mushaf_manifest'),
+    path('mushafs/<int:mushaf_id>/manifest/<str:manifest_hash>.json', MushafManifestContentView.as_view(), name='mushaf_manifest_content'),
+]
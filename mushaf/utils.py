@@ -1,10 +1,17 @@
 import os
-import boto3
+from django.conf import settings
 from django.core.files.base import ContentFile
 from mushaf.models import Mushaf
 from mushaf_page.models import MushafPage
-from decouple import config
 from botocore.exceptions import NoCredentialsError
+from api.s3 import get_s3_client
+from mushaf_page.derivatives import render_many, upload_derivatives
+
+
+def _read_files(paths):
+    for path in paths:
+        with open(path, 'rb') as f:
+            yield f.read()
 
 def upload_mushaf_images(folder_path='13v2'):
     try:
@@ -12,17 +19,8 @@ def upload_mushaf_images(folder_path='13v2'):
         mushaf, created = Mushaf.objects.get_or_create(title=folder_path)
 
         # AWS S3 settings
-        bucket_name = 'hifzworld'
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=config('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=config('AWS_SECRET_ACCESS_KEY'),
-            region_name=config('AWS_REGION_NAME'),
-            config=boto3.session.Config(signature_version='s3v4')
-        )
-
-        # Delete existing pages for this Mushaf
-        MushafPage.objects.filter(mushaf=mushaf).delete()
+        bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+        s3 = get_s3_client()
 
         # Process images in the specified folder
         image_files = sorted(
@@ -30,6 +28,8 @@ def upload_mushaf_images(folder_path='13v2'):
             key=lambda x: int(x.split('_')[1].split('.')[0])
         )
 
+        rows = []
+        originals = []
         for image_file in image_files:
             page_number = int(image_file.split('_')[1].split('.')[0]) + 1  # Adjusting for mushaf page numbering
             file_path = os.path.join(folder_path, image_file)
@@ -41,13 +41,12 @@ def upload_mushaf_images(folder_path='13v2'):
             try:
                 s3.upload_fileobj(ContentFile(file_content), bucket_name, s3_key)
                 
-                # Create MushafPage record
-                MushafPage.objects.create(
-                    mushaf=mushaf,
-                    page_number=page_number,
-                    image_url=f'https://{bucket_name}.s3.amazonaws.com/{s3_key}',
-                    image_s3_key=s3_key
-                )
+                rows.append({
+                    'page_number': page_number,
+                    'image_url': f'https://{bucket_name}.s3.amazonaws.com/{s3_key}',
+                    'image_s3_key': s3_key,
+                })
+                originals.append(file_path)
 
                 print(f"Uploaded {image_file} to S3 as {s3_key}")
 
@@ -58,7 +57,24 @@ def upload_mushaf_images(folder_path='13v2'):
                 print(f"Error uploading {image_file}: {e}")
                 continue
 
-        print(f"All images uploaded and pages created for Mushaf: {folder_path}")
+        # Render WebP/AVIF derivatives for every uploaded page on a process pool;
+        # a page whose derivatives fail still gets its row for the original
+        try:
+            for row, rendered in zip(rows, render_many(_read_files(originals), return_exceptions=True)):
+                if isinstance(rendered, Exception):
+                    print(f"Error rendering derivatives for page {row['page_number']}: {rendered}")
+                    continue
+                variants = {}
+                try:
+                    upload_derivatives(s3, bucket_name, row['image_s3_key'], rendered, variants)
+                except Exception as e:
+                    print(f"Error uploading derivatives for page {row['page_number']}: {e}")
+                if variants:
+                    row['image_variants'] = variants
+        finally:
+            # Reconcile the page rows in bulk; existing pages (and their UserPages) are kept
+            created, updated = MushafPage.upsert_pages(mushaf, rows)
+            print(f"All images uploaded for Mushaf: {folder_path} ({created} pages created, {updated} updated)")
 
     except Exception as e:
         print(f"Error processing mushaf images: {e}")
@@ -1,3 +1,56 @@
-from django.shortcuts import render
+from django.http import HttpResponse, HttpResponseRedirect
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
 
-# Create your views here.
+from .manifest import current_manifest_hash, get_manifest_encodings
+
+# Preferred order when the client accepts several encodings
+MANIFEST_ENCODINGS = ('br', 'gzip')
+IMMUTABLE_MAX_AGE = 31536000
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class MushafManifestView(APIView):
+    """
+    Points the client at the content-addressed manifest of the current catalog version.
+    """
+
+    def get(self, request, mushaf_id):
+        manifest_hash = current_manifest_hash(mushaf_id)
+        response = HttpResponseRedirect(reverse('mushaf_manifest_content', args=[mushaf_id, manifest_hash]))
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class MushafManifestContentView(APIView):
+    """
+    Serves a precompressed manifest by content hash; the body never changes.
+    """
+
+    def get(self, request, mushaf_id, manifest_hash):
+        encodings = get_manifest_encodings(mushaf_id, manifest_hash)
+        if encodings is None:
+            return Response({"detail": "Unknown manifest version."}, status=status.HTTP_404_NOT_FOUND)
+
+        accepted = accepted_encodings(request)
+        encoding = next((name for name in MANIFEST_ENCODINGS if name in accepted and name in encodings), None)
+
+        response = HttpResponse(encodings[encoding or 'identity'], content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['ETag'] = f'"{manifest_hash}"'
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
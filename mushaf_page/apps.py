@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MushafPageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mushaf_page'
+
+    def ready(self):
+        from . import signals  # noqa: F401
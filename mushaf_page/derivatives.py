@@ -0,0 +1,180 @@
+"""
+Compressed, multi-resolution derivatives of mushaf page images.
+
+Originals are full-size GIF/PNG scans. For every page we generate WebP (and
+AVIF where the installed Pillow supports it) copies at a few widths plus a
+tiny thumbnail, upload them next to the original and record their keys in
+MushafPage.image_variants:
+
+    {"webp": {"480": key, "960": key, "1440": key},
+     "avif": {...},
+     "thumbnail": key}
+
+Image encoding is CPU bound, so batches are rendered on a process pool.
+"""
+import io
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from PIL import Image, features
+
+DERIVATIVE_WIDTHS = (480, 960, 1440)
+THUMBNAIL_WIDTH = 96
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+FORMATS = ['webp'] + (['avif'] if features.check('avif') else [])
+CONTENT_TYPES = {'webp': 'image/webp', 'avif': 'image/avif'}
+
+
+def _resized(image, width):
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'avif':
+        image.save(buffer, 'AVIF', quality=AVIF_QUALITY)
+    else:
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    return buffer.getvalue()
+
+
+def render_derivatives(content):
+    """
+    Render every derivative of one page image.
+
+    Runs inside process pool workers, so it must stay free of Django/DB access.
+
+    Args:
+        content (bytes): The original image file.
+
+    Returns:
+        list: (variant, width, image_format, encoded bytes) tuples, where variant
+        is the format name or "thumbnail".
+    """
+    with Image.open(io.BytesIO(content)) as original:
+        # GIF scans are palette based; WebP/AVIF need RGB(A)
+        image = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    rendered = []
+    for width in DERIVATIVE_WIDTHS:
+        resized = _resized(image, width)
+        for image_format in FORMATS:
+            rendered.append((image_format, width, image_format, _encode(resized, image_format)))
+    rendered.append(('thumbnail', THUMBNAIL_WIDTH, 'webp', _encode(_resized(image, THUMBNAIL_WIDTH), 'webp')))
+    return rendered
+
+
+def derivative_key(original_key, variant, width, image_format):
+    directory, file_name = posixpath.split(original_key)
+    stem = posixpath.splitext(file_name)[0]
+    return posixpath.join(directory, 'derivatives', f'{stem}-{variant}-w{width}.{image_format}')
+
+
+def upload_derivatives(s3, bucket_name, original_key, rendered, variants=None):
+    """
+    Upload rendered derivatives and return the image_variants dict for the page.
+
+    Keys are added to `variants` (a new dict by default) as each upload
+    finishes, so after a failed upload it still lists the ones that succeeded.
+    """
+    if variants is None:
+        variants = {}
+    for variant, width, image_format, data in rendered:
+        key = derivative_key(original_key, variant, width, image_format)
+        s3.put_object(
+            Bucket=bucket_name,
+            Key=key,
+            Body=data,
+            ContentType=CONTENT_TYPES[image_format],
+            CacheControl='public, max-age=31536000, immutable',
+        )
+        if variant == 'thumbnail':
+            variants['thumbnail'] = key
+        else:
+            variants.setdefault(variant, {})[str(width)] = key
+    return variants
+
+
+def _render_or_error(content):
+    try:
+        return render_derivatives(content)
+    except Exception as e:
+        return e
+
+
+def render_many(contents, workers=None, window=32, return_exceptions=False):
+    """
+    Render derivatives for many originals in parallel across CPU cores.
+
+    Inputs are consumed `window` at a time so only a bounded number of
+    originals is held in memory.
+
+    Args:
+        contents (iterable): Original image bytes.
+        workers (int): Process count (defaults to the number of cores).
+        return_exceptions (bool): Yield the exception for an original that
+            cannot be rendered instead of raising it.
+
+    Yields:
+        list: render_derivatives() output for each input, in input order.
+    """
+    render = _render_or_error if return_exceptions else render_derivatives
+    contents = iter(contents)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        while True:
+            batch = list(islice(contents, window))
+            if not batch:
+                return
+            yield from executor.map(render, batch)
+
+
+def generate_mushaf_derivatives(mushaf_id, bucket_name=None, workers=None,
+                                endpoint_url=None, only_missing=True, log=print):
+    """
+    Build derivatives for every mirrored page of a mushaf from its S3 original,
+    in `bucket_name` (AWS_STORAGE_BUCKET_NAME by default).
+
+    Pages finished before an error are still saved.
+
+    Returns:
+        int: Number of pages that got new derivatives.
+    """
+    from api.s3 import get_s3_client
+    from mushaf.catalog import bump_catalog_version
+    from django.conf import settings
+    from .models import MushafPage
+
+    bucket_name = bucket_name or settings.AWS_STORAGE_BUCKET_NAME
+    s3 = get_s3_client(endpoint_url)
+    pages = MushafPage.objects.filter(mushaf_id=mushaf_id).exclude(image_s3_key='null').order_by('page_number')
+    if only_missing:
+        pages = pages.filter(image_variants={})
+    pages = list(pages.only('id', 'page_number', 'image_s3_key', 'image_variants'))
+
+    def originals():
+        for page in pages:
+            yield s3.get_object(Bucket=bucket_name, Key=page.image_s3_key)['Body'].read()
+
+    done = []
+    try:
+        for page, rendered in zip(pages, render_many(originals(), workers=workers)):
+            variants = {}
+            try:
+                upload_derivatives(s3, bucket_name, page.image_s3_key, rendered, variants)
+            finally:
+                if variants:
+                    page.image_variants = variants
+                    done.append(page)
+            log(f"Derivatives ready for page {page.page_number}")
+    finally:
+        if done:
+            MushafPage.objects.bulk_update(done, ['image_variants'], batch_size=500)
+            bump_catalog_version(mushaf_id)
+    return len(done)
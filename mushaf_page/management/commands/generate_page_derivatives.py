@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from mushaf_page.derivatives import generate_mushaf_derivatives
+
+
+class Command(BaseCommand):
+    help = "Render WebP/AVIF derivatives and thumbnails for a mushaf's mirrored page images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('mushaf_id', type=int)
+        parser.add_argument('--bucket', help="Bucket holding the originals (default: AWS_STORAGE_BUCKET_NAME)")
+        parser.add_argument('--workers', type=int, help="Process count (default: number of cores)")
+        parser.add_argument('--endpoint-url', help="S3 endpoint override, e.g. a local moto server")
+        parser.add_argument('--all', action='store_true', help="Regenerate pages that already have derivatives")
+
+    def handle(self, *args, **options):
+        count = generate_mushaf_derivatives(
+            options['mushaf_id'],
+            bucket_name=options['bucket'],
+            workers=options['workers'],
+            endpoint_url=options['endpoint_url'],
+            only_missing=not options['all'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(f"Generated derivatives for {count} pages")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from mushaf_page.mirror import mirror_mushaf_images
+
+
+class Command(BaseCommand):
+    help = "Mirror a mushaf's page images into S3 using a thread pool; safe to re-run after a failure."
+
+    def add_arguments(self, parser):
+        parser.add_argument('mushaf_id', type=int)
+        parser.add_argument('--bucket', help="Destination bucket (default: AWS_STORAGE_BUCKET_NAME)")
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--state-file', help="Progress file (default: .mirror_state_<mushaf_id>.json)")
+        parser.add_argument('--endpoint-url', help="S3 endpoint override, e.g. a local moto server")
+        parser.add_argument('--force', action='store_true', help="Ignore recorded progress")
+
+    def handle(self, *args, **options):
+        mushaf_id = options['mushaf_id']
+        counts = mirror_mushaf_images(
+            mushaf_id,
+            bucket_name=options['bucket'],
+            workers=options['workers'],
+            state_path=options['state_file'] or f'.mirror_state_{mushaf_id}.json',
+            endpoint_url=options['endpoint_url'],
+            force=options['force'],
+            log=self.stdout.write,
+        )
+        if counts['failed']:
+            self.stderr.write(f"{counts['failed']} pages failed; re-run to retry them.")
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mushaf_page', '0005_mushafpage_verse_ref_end_mushafpage_verse_ref_start'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mushafpage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0 on 2026-10-18 06:39
+
+import re
+
+from django.db import migrations, models
+
+
+def _verse_key(verse_ref):
+    match = re.match(r'^(\d+):(\d+)$', (verse_ref or '').strip())
+    if not match:
+        return None
+    return int(match.group(1)) * 1000 + int(match.group(2))
+
+
+def backfill_verse_keys(apps, schema_editor):
+    MushafPage = apps.get_model('mushaf_page', 'MushafPage')
+    pages = list(MushafPage.objects.only('id', 'verse_ref_start', 'verse_ref_end'))
+    for page in pages:
+        page.verse_key_start = _verse_key(page.verse_ref_start)
+        page.verse_key_end = _verse_key(page.verse_ref_end)
+    MushafPage.objects.bulk_update(pages, ['verse_key_start', 'verse_key_end'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mushaf', '0003_mushaf_catalog_version'),
+        ('mushaf_page', '0006_mushafpage_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mushafpage',
+            name='verse_key_end',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mushafpage',
+            name='verse_key_start',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_verse_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='mushafpage',
+            index=models.Index(fields=['mushaf', 'verse_key_start', 'verse_key_end'], name='mushafpage_verse_keys_idx'),
+        ),
+    ]
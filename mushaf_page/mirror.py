@@ -0,0 +1,169 @@
+"""
+Concurrent, resumable mirroring of mushaf page images into S3.
+
+Each page image is downloaded from its `image_url` and uploaded to
+`mushafs/<mushaf_id>/pages/<page_number>.<ext>`. Downloads and uploads run on
+a bounded thread pool, objects already in the bucket with a matching MD5 are
+skipped, and progress is recorded in a JSON state file so an interrupted run
+picks up where it stopped.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+
+from api.s3 import get_s3_client
+from mushaf.catalog import bump_catalog_version
+from .models import MushafPage
+
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/103.0.0.0 Safari/537.36'
+}
+# Persist state and page keys every this many finished pages
+CHECKPOINT_EVERY = 50
+
+_thread_local = threading.local()
+
+
+def _http_session():
+    # requests.Session is not safe to share between threads; keep one per worker
+    session = getattr(_thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(DOWNLOAD_HEADERS)
+        _thread_local.session = session
+    return session
+
+
+def page_s3_key(page):
+    extension = os.path.splitext(page.image_url.split('?')[0])[1].lower() or '.gif'
+    return f'mushafs/{page.mushaf_id}/pages/{page.page_number}{extension}'
+
+
+def load_state(state_path):
+    if state_path and os.path.exists(state_path):
+        with open(state_path) as state_file:
+            return json.load(state_file)
+    return {}
+
+
+def save_state(state_path, state):
+    if not state_path:
+        return
+    temp_path = f'{state_path}.tmp'
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file, indent=1, sort_keys=True)
+    os.replace(temp_path, state_path)
+
+
+def _remote_etag(s3, bucket_name, key):
+    try:
+        return s3.head_object(Bucket=bucket_name, Key=key)['ETag'].strip('"')
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def mirror_page(page, key, bucket_name, s3, known_md5=None, timeout=30):
+    """
+    Mirror a single page image. Returns (status, md5) where status is
+    "skipped" or "uploaded".
+    """
+    # Single-part uploads use the content MD5 as their ETag
+    if known_md5 and _remote_etag(s3, bucket_name, key) == known_md5:
+        return 'skipped', known_md5
+
+    response = _http_session().get(page.image_url, timeout=timeout)
+    response.raise_for_status()
+    content = response.content
+    md5 = hashlib.md5(content).hexdigest()
+
+    if not known_md5 and _remote_etag(s3, bucket_name, key) == md5:
+        return 'skipped', md5
+
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=content,
+        ContentType=mimetypes.guess_type(key)[0] or 'application/octet-stream',
+    )
+    return 'uploaded', md5
+
+
+def mirror_mushaf_images(mushaf_id, bucket_name=None, workers=8,
+                         state_path=None, endpoint_url=None, force=False, log=print):
+    """
+    Mirror every page image of a mushaf into S3.
+
+    Args:
+        mushaf_id (int): ID of the Mushaf whose pages are mirrored.
+        bucket_name (str): Destination bucket (AWS_STORAGE_BUCKET_NAME by default).
+        workers (int): Size of the download/upload thread pool.
+        state_path (str): JSON file recording finished pages, used to resume.
+        endpoint_url (str): Optional S3 endpoint (e.g. a moto server).
+        force (bool): Re-download and re-check every page, ignoring the state file.
+
+    Returns:
+        dict: Counts of uploaded, skipped and failed pages.
+    """
+    bucket_name = bucket_name or settings.AWS_STORAGE_BUCKET_NAME
+    s3 = get_s3_client(endpoint_url)
+    state = {} if force else load_state(state_path)
+    pages = list(
+        MushafPage.objects.filter(mushaf_id=mushaf_id)
+        .exclude(image_url='null')
+        .only('id', 'mushaf_id', 'page_number', 'image_url', 'image_s3_key')
+        .order_by('page_number')
+    )
+
+    counts = {'uploaded': 0, 'skipped': 0, 'failed': 0}
+    changed_pages = []
+
+    def checkpoint():
+        save_state(state_path, state)
+        if changed_pages:
+            MushafPage.objects.bulk_update(changed_pages, ['image_s3_key'], batch_size=500)
+            changed_pages.clear()
+            bump_catalog_version(mushaf_id)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for page in pages:
+            key = page_s3_key(page)
+            known_md5 = state.get(key)
+            futures[executor.submit(mirror_page, page, key, bucket_name, s3, known_md5)] = (page, key)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            page, key = futures[future]
+            try:
+                result, md5 = future.result()
+            except (requests.exceptions.RequestException, ClientError, BotoCoreError) as e:
+                counts['failed'] += 1
+                log(f"Error mirroring page {page.page_number}: {e}")
+                continue
+
+            counts[result] += 1
+            state[key] = md5
+            if page.image_s3_key != key:
+                page.image_s3_key = key
+                changed_pages.append(page)
+
+            if done % CHECKPOINT_EVERY == 0:
+                checkpoint()
+                log(f"{done}/{len(pages)} pages processed")
+    finally:
+        # Keep the progress made so far even if the run is interrupted
+        executor.shutdown(cancel_futures=True)
+        checkpoint()
+
+    log(f"Mirrored mushaf {mushaf_id}: {counts['uploaded']} uploaded, "
+        f"{counts['skipped']} skipped, {counts['failed']} failed")
+    return counts
@@ -1,15 +1,38 @@
-from django.db import models
+from django.db import models, transaction
 from mushaf.models import Mushaf  # Import the Mushaf model
 from .thirteen_liner_image_urls import IMAGE_URLS  # Import the array
 import re
 
 import requests
 from django.core.files.base import ContentFile
+from django.conf import settings
 from django.http import HttpResponse
 from django.shortcuts import render
-import boto3
 from botocore.exceptions import NoCredentialsError
-from decouple import config
+from api.s3 import get_s3_client
+from .verse_index import verse_key
+
+
+class MushafPageQuerySet(models.QuerySet):
+    def containing_verse(self, verse_ref):
+        """
+        Pages whose verse range contains `verse_ref`, as one indexed range query.
+        """
+        key = verse_key(verse_ref)
+        if key is None:
+            raise ValueError("The verse reference must be in the format 'chapter:verse'.")
+        return self.filter(verse_key_start__lte=key, verse_key_end__gte=key).order_by('page_number')
+
+    def overlapping_verses(self, start_verse_ref, end_verse_ref):
+        """
+        Pages holding any verse between the two references (inclusive).
+        """
+        start_key, end_key = verse_key(start_verse_ref), verse_key(end_verse_ref)
+        if start_key is None or end_key is None:
+            raise ValueError("The verse reference must be in the format 'chapter:verse'.")
+        if start_key > end_key:
+            start_key, end_key = end_key, start_key
+        return self.filter(verse_key_start__lte=end_key, verse_key_end__gte=start_key).order_by('page_number')
 
 
 class MushafPage(models.Model):
@@ -23,18 +46,60 @@ class MushafPage(models.Model):
     mushaf = models.ForeignKey(Mushaf, on_delete=models.CASCADE)  # Adjust on_delete as needed
     verse_ref_start = models.CharField(max_length=255, default="null")
     verse_ref_end = models.CharField(max_length=255, default="null")
+    # chapter * 1000 + verse of the refs above, kept in sync on save
+    verse_key_start = models.IntegerField(null=True, blank=True, editable=False)
+    verse_key_end = models.IntegerField(null=True, blank=True, editable=False)
+    # S3 keys of the compressed derivatives, see mushaf_page.derivatives
+    image_variants = models.JSONField(default=dict, blank=True)
+
+    objects = MushafPageQuerySet.as_manager()
 
     class Meta:
         app_label = 'mushaf_page'
+        indexes = [
+            models.Index(fields=['mushaf', 'verse_key_start', 'verse_key_end'], name='mushafpage_verse_keys_idx'),
+        ]
 
     def __str__(self):
         return f"MushafPage {self.id}"
 
+    def sync_verse_keys(self):
+        """
+        Recompute the integer verse keys; returns the names of fields that changed.
+        """
+        changed = []
+        for key_field, ref_field in (('verse_key_start', 'verse_ref_start'), ('verse_key_end', 'verse_ref_end')):
+            key = verse_key(getattr(self, ref_field))
+            if getattr(self, key_field) != key:
+                setattr(self, key_field, key)
+                changed.append(key_field)
+        return changed
+
+    def save(self, *args, **kwargs):
+        changed = self.sync_verse_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and changed:
+            kwargs['update_fields'] = set(update_fields) | set(changed)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def find_pages_by_verse_range(cls, mushaf_id, start_verse_ref, end_verse_ref):
+        """
+        Find every MushafPage holding a verse between the two references.
+
+        Returns:
+            QuerySet: The matching pages ordered by page number.
+        """
+        return cls.objects.filter(mushaf_id=mushaf_id).overlapping_verses(start_verse_ref, end_verse_ref)
+
     @classmethod
     def find_page_by_verse_ref(cls, mushaf_id, verse_ref):
         """
         Find a MushafPage that contains the given verse reference.
 
+        The verse range is resolved against the in-process mushaf catalog, so
+        no database query is made once the catalog is loaded.
+
         Args:
             mushaf_id (int): ID of the Mushaf to filter the pages.
             verse_ref (str): The verse reference in the format "chapter:verse".
@@ -42,52 +107,47 @@ class MushafPage(models.Model):
         Returns:
             MushafPage: The page containing the verse reference, or None if not found.
         """
-        try:
-            # Ensure the verse reference is in the correct format
-            if not re.match(r'^\d+:\d+$', verse_ref):
-                raise ValueError("The verse reference must be in the format 'chapter:verse'.")
+        from mushaf.catalog import get_catalog
 
-            # Split the verse reference into chapter and verse (convert to integers for numerical comparison)
-            search_chapter, search_verse = map(int, verse_ref.split(':'))
-            print(f"Search Chapter: {search_chapter}, Search Verse: {search_verse}")
-
-            # Query all MushafPages for the specified mushaf
-            pages = cls.objects.filter(mushaf_id=mushaf_id)
-            print(f"Found {pages.count()} pages for mushaf_id: {mushaf_id}")
+        # One catalog for both steps, so a rebuild in between cannot split them
+        catalog = get_catalog(mushaf_id)
+        try:
+            match = catalog.verse_index.lookup(verse_ref)
+        except ValueError as e:
+            raise ValueError(f"Invalid input: {e}")
+        if match is None:
+            return None
+        page_id, _page_number = match
+        return catalog.page(page_id).as_page()
 
-            for page in pages:
-                # Skip pages without verse_ref_start or verse_ref_end
-                if not page.verse_ref_start or not page.verse_ref_end:
-                    print(f"Skipping page {page.id} due to missing verse_ref_start or verse_ref_end.")
-                    continue
+    @classmethod
+    def find_page_entry_by_verse_ref(cls, mushaf_id, verse_ref):
+        """
+        Resolve a verse reference to a (page_id, page_number) pair without
+        touching the database once the mushaf's index is built.
 
-                # Parse start and end references for each page
-                try:
-                    start_chapter, start_verse = map(int, page.verse_ref_start.split(':'))
-                    end_chapter, end_verse = map(int, page.verse_ref_end.split(':'))
-                except ValueError as ve:
-                    print(f"Skipping page {page.id} due to invalid verse references: {ve}")
-                    continue
-
-                print(f"Checking page {page.id}: Start {start_chapter}:{start_verse}, End {end_chapter}:{end_verse}")
-
-                # Check if the search verse falls within the range of this page
-                if (start_chapter < search_chapter or 
-                    (start_chapter == search_chapter and start_verse <= search_verse)) and \
-                (end_chapter > search_chapter or 
-                    (end_chapter == search_chapter and end_verse >= search_verse)):
-                    print(f"Match found: Page {page.id}")
-                    return page
-
-            # If no matching page is found, return None
-            print(f"No matching page found for verse_ref: {verse_ref}")
-            return None
+        Raises:
+            ValueError: If the verse reference is not in the format "chapter:verse".
+        """
+        from .verse_index import get_verse_index
 
+        try:
+            return get_verse_index(mushaf_id).lookup(verse_ref)
         except ValueError as e:
             raise ValueError(f"Invalid input: {e}")
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return None
+
+    @classmethod
+    def find_page_entries_by_verse_refs(cls, mushaf_id, verse_refs):
+        """
+        Batch version of find_page_entry_by_verse_ref.
+
+        Returns:
+            list: A (page_id, page_number) pair per reference, in input order, or
+            None where the reference is malformed or not on any page.
+        """
+        from .verse_index import get_verse_index
+
+        return get_verse_index(mushaf_id).lookup_many(verse_refs)
 
     def create_mushaf_pages(mushaf_id):
         try:
@@ -96,28 +156,80 @@ class MushafPage(models.Model):
             print(f"Mushaf with id {mushaf_id} does not exist.")
             return
 
-        # Delete existing MushafPage objects for the given Mushaf
-        MushafPage.objects.filter(mushaf_id=mushaf_id).delete()
-
-        for index, url in enumerate(IMAGE_URLS):
+        rows = []
+        for url in IMAGE_URLS:
             match = re.search(r'/L(\d+)\.GIF$', url)
-            page_number = int(match.group(1))
-
-            MushafPage.objects.create(
-                mushaf=mushaf,
-                page_number=page_number,
-                image_url=url,
-            )
-            print(page_number, url)
-    
+            rows.append({'page_number': int(match.group(1)), 'image_url': url})
+
+        # Reconcile instead of delete + recreate so UserPage history survives
+        created, updated = MushafPage.upsert_pages(mushaf, rows)
+        print(f"Mushaf {mushaf_id}: {created} pages created, {updated} updated")
+
+    @classmethod
+    def upsert_pages(cls, mushaf, rows, batch_size=500):
+        """
+        Reconcile the page catalog of a mushaf with `rows`, matching on
+        (mushaf, page_number).
+
+        Pages are never deleted, so dependent UserPage and UserProgressReport
+        rows are left alone. Only pages whose values actually differ are
+        written, in batches, so reloading an unchanged catalog costs a single
+        query.
+
+        Args:
+            mushaf (Mushaf | int): The Mushaf (or its ID) the pages belong to.
+            rows (iterable): Dicts with a "page_number" key plus any other
+                MushafPage field values to set.
+            batch_size (int): Maximum rows per INSERT/UPDATE statement.
+
+        Returns:
+            tuple: (number of pages created, number of pages updated)
+        """
+        mushaf_id = getattr(mushaf, 'id', mushaf)
+
+        existing = {}
+        for page in cls.objects.filter(mushaf_id=mushaf_id).order_by('-id'):
+            # Legacy duplicates: reconcile against the oldest row for each number
+            existing[page.page_number] = page
+
+        to_create, to_update, update_fields = [], [], set()
+        for row in rows:
+            values = dict(row)
+            page_number = values.pop('page_number')
+            page = existing.get(page_number)
+            if page is None:
+                page = cls(mushaf_id=mushaf_id, page_number=page_number, **values)
+                page.sync_verse_keys()
+                to_create.append(page)
+                continue
+
+            changed = [field for field, value in values.items() if getattr(page, field) != value]
+            for field in changed:
+                setattr(page, field, values[field])
+            # bulk_update bypasses save(), so keep the integer keys in sync here
+            changed += page.sync_verse_keys()
+            if changed:
+                update_fields.update(changed)
+                to_update.append(page)
+
+        if to_create or to_update:
+            with transaction.atomic():
+                if to_create:
+                    cls.objects.bulk_create(to_create, batch_size=batch_size)
+                if to_update:
+                    cls.objects.bulk_update(to_update, sorted(update_fields), batch_size=batch_size)
+
+            # Bulk writes skip the post_save signal that normally does this
+            from mushaf.catalog import bump_catalog_version
+            bump_catalog_version(mushaf_id)
+
+        return len(to_create), len(to_update)
+
     def saveMushafPages(mushaf_id):
-        pages = MushafPage.objects.filter(mushaf_id=mushaf_id).order_by('page_number')
-        for page in pages:
-            # print(save_to_s3)
-            save = MushafPage.save_to_s3(page)
-            print(save)
+        # Concurrent and resumable; see mushaf_page.mirror
+        from .mirror import mirror_mushaf_images
 
-        return
+        return mirror_mushaf_images(mushaf_id, state_path=f'.mirror_state_{mushaf_id}.json')
 
     def save_to_s3(page):
         # Replace 'YOUR_FILE_URL' with the actual URL of the file you want to download
@@ -134,25 +246,29 @@ class MushafPage(models.Model):
 
         if response.status_code == 200:
             # Replace 'your_bucket_name' and 'your_file_key' with your S3 bucket name and the desired file key
-            bucket_name = 'hifzworld'
+            bucket_name = settings.AWS_STORAGE_BUCKET_NAME
             file_name = f'{page.page_number}.gif'
             file_key = f'mushafs/{page.mushaf_id}/pages/{file_name}'
 
             # Upload the file to S3
             try:
-                # s3 = boto3.client('s3')
-                s3 = boto3.client(
-                    's3',
-                    aws_access_key_id=config('AWS_ACCESS_KEY_ID'),
-                    aws_secret_access_key=config('AWS_SECRET_ACCESS_KEY'),
-                    region_name=config('AWS_REGION_NAME'),
-                    config=boto3.session.Config(signature_version='s3v4')
-                )
-                
+                s3 = get_s3_client()
+
                 # Use upload_fileobj instead of upload_file
                 s3.upload_fileobj(ContentFile(response.content), bucket_name, file_key)
                 # image_s3_key
                 page.image_s3_key = file_key
+
+                # WebP/AVIF copies at several widths plus a thumbnail; a failure
+                # here keeps the original and whichever copies were uploaded
+                from .derivatives import render_derivatives, upload_derivatives
+                variants = {}
+                try:
+                    upload_derivatives(s3, bucket_name, file_key, render_derivatives(response.content), variants)
+                except Exception as e:
+                    print(f"Error generating derivatives: {str(e)}")
+                if variants:
+                    page.image_variants = variants
                 page.save()
 
                 presigned_url = s3.generate_presigned_url(
@@ -0,0 +1,139 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.s3 import get_s3_client
+
+
+class PresignedUrlCache:
+    """
+    Cache of presigned S3 GET URLs shared by every worker process.
+
+    Time is cut into fixed windows. Every request for the same object inside a
+    window gets the same URL (same signature and expiry), so browsers and the
+    CDN can reuse their cached copy of the image. URLs are signed for
+    `expires_in` seconds, which must outlast the window so a URL handed out at
+    the very end of a window is still valid for `expires_in - window` seconds.
+
+    The first URL signed for a window is stored in the Django cache, so all
+    processes hand out the same one; this needs a shared cache backend (Redis,
+    see CACHES), with the local-memory default each process signs its own.
+    A per-process copy saves the cache round trip on repeat lookups.
+    """
+
+    def __init__(self, window=900, expires_in=3600, client_factory=None, shared_cache=cache):
+        if window >= expires_in:
+            raise ValueError("The presign window must be shorter than the URL expiry.")
+        self.window = window
+        self.expires_in = expires_in
+        self._client_factory = client_factory or get_s3_client
+        self._shared_cache = shared_cache
+        self._entries = {}
+        self._current_bucket = None
+        self._lock = threading.Lock()
+
+    def time_bucket(self, now=None):
+        return int((time.time() if now is None else now) // self.window)
+
+    def seconds_left_in_window(self, now=None):
+        """
+        Seconds until URLs handed out now stop being reused; useful as a max-age.
+        """
+        now = time.time() if now is None else now
+        return int((self.time_bucket(now) + 1) * self.window - now)
+
+    def _evict_expired(self, time_bucket):
+        # Entries from earlier windows are never served again
+        self._entries = {
+            cache_key: url for cache_key, url in self._entries.items()
+            if cache_key[2] >= time_bucket
+        }
+        self._current_bucket = time_bucket
+
+    @staticmethod
+    def shared_cache_key(bucket_name, key, time_bucket):
+        # Object keys may hold characters cache backends reject, so hash them
+        digest = hashlib.md5(f'{bucket_name}/{key}'.encode('utf-8')).hexdigest()
+        return f'presign:{time_bucket}:{digest}'
+
+    def _sign(self, bucket_name, key):
+        return self._client_factory().generate_presigned_url(
+            'get_object',
+            Params={'Bucket': bucket_name, 'Key': key},
+            ExpiresIn=self.expires_in
+        )
+
+    def _remember(self, time_bucket, entries):
+        with self._lock:
+            if self._current_bucket != time_bucket:
+                self._evict_expired(time_bucket)
+            self._entries.update(entries)
+
+    def url(self, bucket_name, key, now=None):
+        """
+        Return the presigned GET URL for `key`, signing it at most once per window.
+        """
+        return self.urls(bucket_name, [key], now=now)[key]
+
+    def urls(self, bucket_name, keys, now=None):
+        """
+        Batch version of url(); returns a {key: url} dict.
+        """
+        now = time.time() if now is None else now
+        time_bucket = self.time_bucket(now)
+
+        result = {}
+        missing = []
+        for key in set(keys):
+            url = self._entries.get((bucket_name, key, time_bucket))
+            if url is None:
+                missing.append(key)
+            else:
+                result[key] = url
+        if not missing:
+            return result
+
+        shared_keys = {self.shared_cache_key(bucket_name, key, time_bucket): key for key in missing}
+        found = {shared_keys[shared_key]: url for shared_key, url in self._shared_cache.get_many(list(shared_keys)).items()}
+        # Entries die with their window
+        timeout = self.seconds_left_in_window(now) + 1
+        for shared_key, key in shared_keys.items():
+            if key in found:
+                continue
+            url = self._sign(bucket_name, key)
+            # Keep the first URL signed for this window if another process raced us
+            if not self._shared_cache.add(shared_key, url, timeout):
+                url = self._shared_cache.get(shared_key) or url
+            found[key] = url
+
+        self._remember(time_bucket, {(bucket_name, key, time_bucket): url for key, url in found.items()})
+        result.update(found)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._current_bucket = None
+
+
+presigned_urls = PresignedUrlCache(
+    window=settings.AWS_PRESIGNED_URL_WINDOW,
+    expires_in=settings.AWS_PRESIGNED_URL_EXPIRES_IN,
+)
+
+
+def presigned_image_url(key):
+    """
+    Presigned URL for an object in the default storage bucket.
+    """
+    return presigned_urls.url(settings.AWS_STORAGE_BUCKET_NAME, key)
+
+
+def presigned_image_urls(keys):
+    """
+    Batch version of presigned_image_url(); returns a {key: url} dict.
+    """
+    return presigned_urls.urls(settings.AWS_STORAGE_BUCKET_NAME, keys)
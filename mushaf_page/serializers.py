@@ -1,33 +1,60 @@
 from rest_framework import serializers
 from .models import MushafPage
-from django.contrib.auth import authenticate
-from django.core.exceptions import ObjectDoesNotExist
+from .presign import presigned_image_url, presigned_image_urls
+
+
+def signed_srcset(image_variants):
+    """
+    Turn MushafPage.image_variants into the same shape with presigned URLs
+    in place of S3 keys, e.g. {"webp": {"480": url, ...}, "thumbnail": url}.
+    """
+    if not image_variants:
+        return {}
+    keys = [image_variants['thumbnail']] if 'thumbnail' in image_variants else []
+    for variant, widths in image_variants.items():
+        if isinstance(widths, dict):
+            keys.extend(widths.values())
+    urls = presigned_image_urls(keys)
+
+    srcset = {}
+    for variant, widths in image_variants.items():
+        if isinstance(widths, dict):
+            srcset[variant] = {width: urls[key] for width, key in widths.items()}
+        else:
+            srcset[variant] = urls[widths]
+    return srcset
 
 
-from django.core.files.base import ContentFile
-from django.http import HttpResponse
-from django.shortcuts import render
-import boto3
-from botocore.exceptions import NoCredentialsError
-from decouple import config
 class MushafPageSerializer(serializers.ModelSerializer):
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = MushafPage
         fields = '__all__'
 
+    def get_image_srcset(self, obj):
+        return signed_srcset(obj.image_variants)
+
     def get_s3_url(self, obj):
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=config('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=config('AWS_SECRET_ACCESS_KEY'),
-            region_name=config('AWS_REGION_NAME'),
-            config=boto3.session.Config(signature_version='s3v4')
-        )
-
-        s3_url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': config("AWS_STORAGE_BUCKET_NAME"), 'Key': obj.image_s3_key},
-            ExpiresIn=3600  # Set the expiration time for the URL in seconds (adjust as needed)
-        )
-        return s3_url
+        # Signed at most once per window per page, see PresignedUrlCache
+        return presigned_image_url(obj.image_s3_key)
+
+
+class CatalogMushafPageField(serializers.Field):
+    """
+    Read-only nested MushafPage representation built from the in-memory
+    mushaf catalog instead of following the foreign key, so serializing a
+    list of user pages does not query every page row.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'mushaf_page_id')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, mushaf_page_id):
+        from mushaf.catalog import get_catalog_page
+
+        record = get_catalog_page(mushaf_page_id)
+        page = record.as_page() if record else MushafPage.objects.get(id=mushaf_page_id)
+        return MushafPageSerializer(page, context=self.context).data
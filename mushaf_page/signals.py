@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mushaf.catalog import bump_catalog_version
+from .models import MushafPage
+
+
+@receiver(post_save, sender=MushafPage)
+@receiver(post_delete, sender=MushafPage)
+def invalidate_mushaf_page_caches(sender, instance, **kwargs):
+    # Any write to a page may move a verse range; the catalog rebuilds on next use
+    bump_catalog_version(instance.mushaf_id)
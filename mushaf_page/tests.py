@@ -1,3 +1,317 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from botocore.exceptions import EndpointConnectionError
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from moto import mock_aws
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.s3 import get_s3_client, reset_s3_clients
+from mushaf.catalog import discard_catalog
+from mushaf.models import Mushaf
+from mushaf.utils import upload_mushaf_images
+from . import derivatives, mirror
+from .models import MushafPage
+from .presign import PresignedUrlCache
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.signed = 0
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.signed += 1
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?sig={self.signed}&expires={ExpiresIn}"
+
+
+class PresignedUrlCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = FakeS3Client()
+
+    def make_cache(self):
+        return PresignedUrlCache(window=900, expires_in=3600, client_factory=lambda: self.client)
+
+    def test_same_window_reuses_url(self):
+        presign = self.make_cache()
+        first = presign.url('bucket', 'pages/1.gif', now=1000)
+        second = presign.url('bucket', 'pages/1.gif', now=1700)
+        self.assertEqual(first, second)
+        self.assertEqual(self.client.signed, 1)
+
+    def test_new_window_signs_again(self):
+        presign = self.make_cache()
+        first = presign.url('bucket', 'pages/1.gif', now=1000)
+        second = presign.url('bucket', 'pages/1.gif', now=1900)
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.client.signed, 2)
+
+    def test_processes_share_url_through_cache(self):
+        # Two instances stand in for two worker processes
+        first = self.make_cache().url('bucket', 'pages/1.gif', now=1000)
+        second = self.make_cache().url('bucket', 'pages/1.gif', now=1000)
+        self.assertEqual(first, second)
+        self.assertEqual(self.client.signed, 1)
+
+    def test_urls_batch(self):
+        presign = self.make_cache()
+        presign.url('bucket', 'pages/1.gif', now=1000)
+        urls = presign.urls('bucket', ['pages/1.gif', 'pages/2.gif', 'pages/2.gif'], now=1000)
+        self.assertEqual(set(urls), {'pages/1.gif', 'pages/2.gif'})
+        self.assertEqual(self.client.signed, 2)
+
+    def test_seconds_left_in_window(self):
+        presign = self.make_cache()
+        self.assertEqual(presign.seconds_left_in_window(now=1000), 800)
+
+    def test_window_must_be_shorter_than_expiry(self):
+        with self.assertRaises(ValueError):
+            PresignedUrlCache(window=3600, expires_in=3600)
+
+
+class S3ClientTests(SimpleTestCase):
+    def setUp(self):
+        mock = mock_aws()
+        mock.start()
+        self.addCleanup(mock.stop)
+        reset_s3_clients()
+        self.addCleanup(reset_s3_clients)
+
+    def test_client_is_shared(self):
+        self.assertIs(get_s3_client(), get_s3_client())
+
+    def test_client_is_shared_across_threads(self):
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(get_s3_client())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+    def test_endpoint_gets_its_own_client(self):
+        local = get_s3_client('http://localhost:5000')
+        self.assertIsNot(local, get_s3_client())
+        self.assertIs(local, get_s3_client('http://localhost:5000'))
+        self.assertEqual(local.meta.endpoint_url, 'http://localhost:5000')
+
+    def test_reset_builds_new_client(self):
+        client = get_s3_client()
+        reset_s3_clients()
+        self.assertIsNot(client, get_s3_client())
+
+    def test_round_trip_against_moto(self):
+        s3 = get_s3_client()
+        s3.create_bucket(Bucket='hifzworld-test')
+        s3.put_object(Bucket='hifzworld-test', Key='pages/1.gif', Body=b'GIF89a')
+        body = s3.get_object(Bucket='hifzworld-test', Key='pages/1.gif')['Body'].read()
+        self.assertEqual(body, b'GIF89a')
+
+    def test_presigned_url_is_signed(self):
+        cache.clear()
+        url = PresignedUrlCache().url('hifzworld-test', 'pages/1.gif')
+        self.assertIn('pages/1.gif', url)
+        self.assertIn('X-Amz-Signature=', url)
+        self.assertIn('X-Amz-Expires=3600', url)
+
+
+def gif_bytes(width=200, height=300):
+    buffer = io.BytesIO()
+    Image.new('P', (width, height)).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+class PageImageHandler(BaseHTTPRequestHandler):
+    # Serves /pages/<n>.gif as a small GIF with the path appended; anything else is a 404
+    def do_GET(self):
+        if not self.path.startswith('/pages/'):
+            self.send_error(404)
+            return
+        body = gif_bytes() + self.path.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalS3TestCase(TestCase):
+    """
+    Page images served from a local HTTP server, mirrored into a moto bucket.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), PageImageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        mock = mock_aws()
+        mock.start()
+        self.addCleanup(mock.stop)
+        reset_s3_clients()
+        self.addCleanup(reset_s3_clients)
+        self.s3 = get_s3_client()
+        # The code under test defaults to this bucket
+        self.bucket_name = settings.AWS_STORAGE_BUCKET_NAME
+        self.s3.create_bucket(Bucket=self.bucket_name)
+
+        self.mushaf = Mushaf.objects.create(title='Test')
+        for page_number in (1, 2, 3):
+            MushafPage.objects.create(
+                mushaf=self.mushaf, page_number=page_number,
+                image_url=f'{self.base_url}/pages/{page_number}.gif',
+            )
+        state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(state_dir.cleanup)
+        self.state_path = os.path.join(state_dir.name, 'state.json')
+
+
+class MirrorMushafImagesTests(LocalS3TestCase):
+    def mirror(self, **kwargs):
+        return mirror.mirror_mushaf_images(
+            self.mushaf.id, bucket_name=self.bucket_name, workers=2, state_path=self.state_path,
+            log=lambda message: None, **kwargs
+        )
+
+    def test_uploads_pages_and_records_keys(self):
+        counts = self.mirror()
+        self.assertEqual(counts, {'uploaded': 3, 'skipped': 0, 'failed': 0})
+        body = self.s3.get_object(Bucket=self.bucket_name, Key=f'mushafs/{self.mushaf.id}/pages/2.gif')['Body'].read()
+        self.assertTrue(body.endswith(b'/pages/2.gif'))
+        self.assertEqual(
+            sorted(MushafPage.objects.values_list('image_s3_key', flat=True)),
+            [f'mushafs/{self.mushaf.id}/pages/{n}.gif' for n in (1, 2, 3)],
+        )
+
+    def test_rerun_skips_mirrored_pages(self):
+        self.mirror()
+        self.assertEqual(self.mirror(), {'uploaded': 0, 'skipped': 3, 'failed': 0})
+
+    def test_failed_download_is_counted(self):
+        MushafPage.objects.filter(page_number=3).update(image_url=f'{self.base_url}/missing.gif')
+        counts = self.mirror()
+        self.assertEqual(counts, {'uploaded': 2, 'skipped': 0, 'failed': 1})
+        with open(self.state_path) as state_file:
+            self.assertEqual(len(json.load(state_file)), 2)
+
+    def test_connection_error_is_counted(self):
+        mirror_page = mirror.mirror_page
+
+        def flaky_mirror_page(page, *args, **kwargs):
+            if page.page_number == 2:
+                raise EndpointConnectionError(endpoint_url='http://127.0.0.1:1')
+            return mirror_page(page, *args, **kwargs)
+
+        with mock.patch.object(mirror, 'mirror_page', flaky_mirror_page):
+            counts = self.mirror()
+        self.assertEqual(counts, {'uploaded': 2, 'skipped': 0, 'failed': 1})
+
+    def test_progress_is_saved_when_interrupted(self):
+        with mock.patch.object(mirror, 'as_completed', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.mirror()
+        self.assertTrue(os.path.exists(self.state_path))
+
+
+class FailingS3Client:
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+        self.keys = []
+
+    def put_object(self, Key, **kwargs):
+        if len(self.keys) == self.fail_after:
+            raise EndpointConnectionError(endpoint_url='http://127.0.0.1:1')
+        self.keys.append(Key)
+
+
+class DerivativesTests(LocalS3TestCase):
+    def test_upload_keeps_finished_variants(self):
+        rendered = derivatives.render_derivatives(gif_bytes())
+        s3 = FailingS3Client(fail_after=1)
+        variants = {}
+        with self.assertRaises(EndpointConnectionError):
+            derivatives.upload_derivatives(s3, self.bucket_name, 'mushafs/1/pages/1.gif', rendered, variants)
+        self.assertEqual(variants, {'webp': {'480': s3.keys[0]}})
+
+    def test_generate_uses_default_bucket(self):
+        mirror.mirror_mushaf_images(self.mushaf.id, workers=1, log=lambda message: None)
+        count = derivatives.generate_mushaf_derivatives(self.mushaf.id, workers=1, log=lambda message: None)
+        self.assertEqual(count, 3)
+        page = MushafPage.objects.get(mushaf=self.mushaf, page_number=1)
+        self.assertIn('thumbnail', page.image_variants)
+        self.s3.head_object(Bucket=self.bucket_name, Key=page.image_variants['webp']['480'])
+
+    def test_save_to_s3_keeps_original_when_render_fails(self):
+        page = MushafPage.objects.get(mushaf=self.mushaf, page_number=1)
+        with mock.patch.object(derivatives, 'render_derivatives', side_effect=OSError('cannot identify image')):
+            MushafPage.save_to_s3(page)
+        page.refresh_from_db()
+        self.assertEqual(page.image_s3_key, f'mushafs/{self.mushaf.id}/pages/1.gif')
+        self.assertEqual(page.image_variants, {})
+
+    def test_upload_keeps_pages_whose_derivatives_fail(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        with open(os.path.join(folder.name, 'page_0.png'), 'wb') as image_file:
+            image_file.write(gif_bytes())
+        with open(os.path.join(folder.name, 'page_1.png'), 'wb') as image_file:
+            image_file.write(b'not an image')
+
+        with mock.patch('builtins.print'):
+            upload_mushaf_images(folder.name)
+
+        pages = {page.page_number: page for page in MushafPage.objects.filter(mushaf__title=folder.name)}
+        self.assertEqual(sorted(pages), [1, 2])
+        self.assertIn('thumbnail', pages[1].image_variants)
+        self.assertEqual(pages[2].image_variants, {})
+        self.s3.head_object(Bucket=self.bucket_name, Key=pages[2].image_s3_key)
+
+
+class FindPagesByVerseRefsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.mushaf = Mushaf.objects.create(title='Test')
+        for page_number in (1, 2):
+            MushafPage.objects.create(
+                mushaf=self.mushaf, page_number=page_number,
+                verse_ref_start=f'1:{page_number * 2 - 1}', verse_ref_end=f'1:{page_number * 2}',
+            )
+        self.addCleanup(discard_catalog, self.mushaf.id)
+        self.url = f'/find_pages/{self.mushaf.id}'
+
+    def test_resolves_refs_in_order(self):
+        response = self.client.post(self.url, {'verse_refs': ['1:3', '1:1', '9:9']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['verse_ref'], result['page_number']) for result in response.data['results']],
+            [('1:3', 2), ('1:1', 1), ('9:9', None)],
+        )
+
+    def test_body_must_be_an_object(self):
+        response = self.client.post(self.url, ['1:1'], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_refs_are_rejected(self):
+        response = self.client.post(self.url, {'verse_refs': ['1:1', 'one:two', 7]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['malformed'], ['one:two', 7])
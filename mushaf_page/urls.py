@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import MushafPageDetailView
+from .views import MushafPageDetailView, MushafPageBundleView
 
 urlpatterns = [
     path('mushaf_pages/<int:pk>/', MushafPageDetailView.as_view(), name='mushaf_page_detail'),
+    path('mushafs/<int:mushaf_id>/pages/<int:page_number>/bundle', MushafPageBundleView.as_view(), name='mushaf_page_bundle'),
 ]
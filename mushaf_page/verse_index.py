@@ -0,0 +1,149 @@
+import re
+from bisect import bisect_right
+
+import numpy as np
+
+VERSE_REF_PATTERN = re.compile(r'^(\d+):(\d+)$')
+
+# Verses per chapter never reach 1000, so chapter * 1000 + verse sorts the
+# same way as comparing (chapter, verse) tuples.
+VERSE_KEY_CHAPTER_FACTOR = 1000
+
+
+def verse_key(verse_ref):
+    """
+    Encode a "chapter:verse" reference as a single sortable integer.
+
+    Returns None when the reference is missing or malformed (e.g. the "null"
+    default on MushafPage).
+    """
+    if not verse_ref:
+        return None
+    match = VERSE_REF_PATTERN.match(verse_ref.strip())
+    if not match:
+        return None
+    chapter, verse = int(match.group(1)), int(match.group(2))
+    return chapter * VERSE_KEY_CHAPTER_FACTOR + verse
+
+
+class VerseIndex:
+    """
+    Sorted interval index of the pages of one mushaf.
+
+    Pages are kept ordered by their start key so a verse lookup is a bisect
+    instead of a scan over every page.
+    """
+
+    __slots__ = (
+        'mushaf_id', 'start_keys', 'end_keys', 'page_ids', 'page_numbers',
+        'start_array', 'end_array',
+    )
+
+    def __init__(self, mushaf_id, rows):
+        """
+        Args:
+            mushaf_id (int): ID of the Mushaf the pages belong to.
+            rows (iterable): (id, page_number, verse_key_start, verse_key_end) tuples.
+        """
+        entries = []
+        for page_id, page_number, start_key, end_key in rows:
+            # Pages without a usable verse range can never match a lookup
+            if start_key is None or end_key is None:
+                continue
+            entries.append((start_key, page_number, end_key, page_id))
+        entries.sort()
+
+        self.mushaf_id = mushaf_id
+        self.start_keys = [entry[0] for entry in entries]
+        self.page_numbers = [entry[1] for entry in entries]
+        self.end_keys = [entry[2] for entry in entries]
+        self.page_ids = [entry[3] for entry in entries]
+
+        # Array copies of the keys for resolving many refs in one pass
+        self.start_array = np.array(self.start_keys, dtype=np.int64)
+        self.end_array = np.array(self.end_keys, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.start_keys)
+
+    def position_for_key(self, key):
+        """
+        Return the position of the first page whose range contains `key`, or None.
+        """
+        position = bisect_right(self.start_keys, key) - 1
+        if position < 0 or self.end_keys[position] < key:
+            return None
+        # A verse that straddles a page break belongs to the earlier page
+        while position > 0 and self.start_keys[position - 1] <= key <= self.end_keys[position - 1]:
+            position -= 1
+        return position
+
+    def lookup(self, verse_ref):
+        """
+        Resolve a verse reference to a (page_id, page_number) pair.
+
+        Raises:
+            ValueError: If the verse reference is not in the format "chapter:verse".
+
+        Returns:
+            tuple: (page_id, page_number), or None if no page contains the verse.
+        """
+        key = verse_key(verse_ref)
+        if key is None:
+            raise ValueError("The verse reference must be in the format 'chapter:verse'.")
+        position = self.position_for_key(key)
+        if position is None:
+            return None
+        return self.page_ids[position], self.page_numbers[position]
+
+    def positions_for_keys(self, keys):
+        """
+        Vectorized position_for_key: resolve an array of keys with a single
+        searchsorted over the start keys. Unmatched keys get position -1.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self) or not keys.size:
+            return np.full(keys.shape, -1, dtype=np.int64)
+
+        positions = np.searchsorted(self.start_array, keys, side='right') - 1
+        clipped = np.clip(positions, 0, None)
+        positions = np.where((positions >= 0) & (self.end_array[clipped] >= keys), positions, -1)
+
+        # Step back onto the earlier page for verses that straddle a page break
+        while True:
+            previous = positions - 1
+            clipped = np.clip(previous, 0, None)
+            straddles = (
+                (previous >= 0)
+                & (self.start_array[clipped] <= keys)
+                & (self.end_array[clipped] >= keys)
+            )
+            if not straddles.any():
+                return positions
+            positions = np.where(straddles, previous, positions)
+
+    def lookup_many(self, verse_refs):
+        """
+        Resolve many verse references at once.
+
+        Returns:
+            list: One (page_id, page_number) pair per reference, in input order,
+            or None where the reference is malformed or no page contains it.
+        """
+        keys = [verse_key(verse_ref) if isinstance(verse_ref, str) else None for verse_ref in verse_refs]
+        known = [i for i, key in enumerate(keys) if key is not None]
+        results = [None] * len(keys)
+        positions = self.positions_for_keys([keys[i] for i in known])
+        for i, position in zip(known, positions.tolist()):
+            if position >= 0:
+                results[i] = (self.page_ids[position], self.page_numbers[position])
+        return results
+
+
+def get_verse_index(mushaf_id):
+    """
+    Return the VerseIndex of a mushaf from its in-memory catalog.
+    """
+    from mushaf.catalog import get_catalog
+
+    return get_catalog(mushaf_id).verse_index
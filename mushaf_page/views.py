@@ -3,10 +3,20 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .models import MushafPage
-from .serializers import MushafPageSerializer
+from .serializers import MushafPageSerializer, signed_srcset
+from .presign import presigned_image_urls, presigned_urls
+from .verse_index import verse_key
+from mushaf.catalog import catalog_conditional_get
 from rest_framework import generics
 
 class MushafPageView(APIView):
+    # The body embeds a presigned URL, so it is only reusable while that URL is,
+    # and the ETag is weak: without a shared cache each process signs its own URL
+    @catalog_conditional_get(
+        max_age=presigned_urls.seconds_left_in_window,
+        etag_parts=lambda request, page_number, **kwargs: ('page', page_number, presigned_urls.time_bucket()),
+        weak=True,
+    )
     def get(self, request, mushaf_id, page_number):
         # Retrieve the MushafPage object based on mushaf_id and page_number
         mushaf_page = get_object_or_404(MushafPage, mushaf_id=mushaf_id, page_number=page_number)
@@ -19,6 +29,55 @@ class MushafPageView(APIView):
         # Return the serialized data in the response
         return Response(serialized_data, status=status.HTTP_200_OK)
 
+class MushafPageBundleView(APIView):
+    """
+    API endpoint returning a page plus its neighbours so the reader can prefetch page turns.
+    """
+
+    DEFAULT_RADIUS = 2
+    MAX_RADIUS = 10
+
+    def get(self, request, mushaf_id, page_number):
+        try:
+            radius = int(request.query_params.get('radius', self.DEFAULT_RADIUS))
+        except ValueError:
+            return Response({"error": "radius must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        radius = max(0, min(radius, self.MAX_RADIUS))
+
+        # One query for the whole window of pages
+        pages = list(
+            MushafPage.objects.filter(
+                mushaf_id=mushaf_id,
+                page_number__range=(page_number - radius, page_number + radius),
+            ).select_related('mushaf').order_by('page_number')
+        )
+        if not any(page.page_number == page_number for page in pages):
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        image_urls = presigned_image_urls(page.image_s3_key for page in pages)
+
+        bundle = []
+        for page in pages:
+            segment, percentage = page.mushaf.get_segment_and_percentage(page.page_number)
+            bundle.append({
+                'id': page.id,
+                'page_number': page.page_number,
+                'verse_ref_start': page.verse_ref_start,
+                'verse_ref_end': page.verse_ref_end,
+                'image_s3_key': page.image_s3_key,
+                'image_s3_url': image_urls[page.image_s3_key],
+                'image_srcset': signed_srcset(page.image_variants),
+                'segment': {'id': segment.id, 'title': segment.title} if segment else None,
+                'percentage': percentage,
+            })
+
+        return Response({
+            'mushaf_id': mushaf_id,
+            'page_number': page_number,
+            'radius': radius,
+            'pages': bundle,
+        }, status=status.HTTP_200_OK)
+
 class MushafPageDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = MushafPage.objects.all()
     serializer_class = MushafPageSerializer
@@ -48,3 +107,53 @@ class FindPageByVerseRefView(APIView):
                 )
         except ValueError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class FindPagesByVerseRefsView(APIView):
+    """
+    API endpoint to resolve many verse references to MushafPages in one request.
+    """
+
+    MAX_VERSE_REFS = 1000
+
+    def post(self, request, mushaf_id):
+        """
+        Resolve the "verse_refs" list in the request body to page ids and numbers.
+
+        Malformed references are rejected with a 400 listing them; a
+        well-formed reference that is on no page resolves to nulls.
+        """
+        verse_refs = request.data.get('verse_refs') if isinstance(request.data, dict) else None
+        if not isinstance(verse_refs, list):
+            return Response(
+                {"error": "verse_refs must be a list of 'chapter:verse' strings."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(verse_refs) > self.MAX_VERSE_REFS:
+            return Response(
+                {"error": f"At most {self.MAX_VERSE_REFS} verse_refs can be resolved per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        malformed = [
+            verse_ref for verse_ref in verse_refs
+            if not isinstance(verse_ref, str) or verse_key(verse_ref) is None
+        ]
+        if malformed:
+            return Response(
+                {"error": "verse_refs must be 'chapter:verse' strings.", "malformed": malformed},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        entries = MushafPage.find_page_entries_by_verse_refs(mushaf_id, verse_refs)
+
+        results = []
+        for verse_ref, entry in zip(verse_refs, entries):
+            page_id, page_number = entry if entry else (None, None)
+            results.append({
+                'verse_ref': verse_ref,
+                'page_id': page_id,
+                'page_number': page_number,
+            })
+
+        return Response({'mushaf_id': mushaf_id, 'results': results}, status=status.HTTP_200_OK)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MushafSegmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mushaf_segment'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,131 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from mushaf.catalog import bump_catalog_version
+from mushaf.models import Mushaf
+from mushaf_page.models import MushafPage
+from mushaf_segment.models import MushafSegment
+
+SEGMENT_MODEL_LABEL = 'mushaf_segment.mushafsegment'
+REQUIRED_FIELDS = ('first_page', 'last_page', 'title', 'mushaf', 'category', 'category_position')
+
+
+def iter_json_array(path, chunk_size=64 * 1024):
+    """
+    Yield the items of a top-level JSON array one at a time without loading
+    the whole file.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as f:
+        buffer = ''
+        started = False
+        eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if buffer:
+                    if buffer[0] != '[':
+                        raise ValueError(f"{path}: expected a JSON array")
+                    buffer = buffer[1:]
+                    started = True
+                    continue
+            elif buffer.startswith(']'):
+                return
+            elif buffer.startswith(','):
+                buffer = buffer[1:]
+                continue
+            elif buffer:
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    yield item
+                    buffer = buffer[end:]
+                    continue
+
+            if eof:
+                raise ValueError(f"{path}: unexpected end of file")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert mushaf segments from fixture files such as surahs.json and juz_segments.json, "
+        "matching on (mushaf, category, category_position)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--mushaf', type=int, help="Load the segments into this mushaf instead of the one in the file")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        segments = []
+        errors = []
+        for path in options['paths']:
+            for position, item in enumerate(iter_json_array(path)):
+                label = f"{path}[{position}]"
+                if item.get('model', SEGMENT_MODEL_LABEL) != SEGMENT_MODEL_LABEL:
+                    errors.append(f"{label}: not a {SEGMENT_MODEL_LABEL} entry")
+                    continue
+                fields = item.get('fields', item)
+                missing = [name for name in REQUIRED_FIELDS if name not in fields and not (name == 'mushaf' and options['mushaf'])]
+                if missing:
+                    errors.append(f"{label}: missing {', '.join(missing)}")
+                    continue
+                segments.append((label, MushafSegment(
+                    mushaf_id=options['mushaf'] or fields['mushaf'],
+                    category=fields['category'],
+                    category_position=int(fields['category_position']),
+                    title=fields['title'],
+                    first_page=int(fields['first_page']),
+                    last_page=int(fields['last_page']),
+                )))
+
+        mushaf_ids = {segment.mushaf_id for _, segment in segments}
+        known_mushafs = set(Mushaf.objects.filter(id__in=mushaf_ids).values_list('id', flat=True))
+        page_counts = dict(
+            MushafPage.objects.filter(mushaf_id__in=mushaf_ids)
+            .values_list('mushaf_id')
+            .annotate(last_page=Max('page_number'))
+        )
+
+        seen = set()
+        for label, segment in segments:
+            if segment.mushaf_id not in known_mushafs:
+                errors.append(f"{label}: mushaf {segment.mushaf_id} does not exist")
+                continue
+            page_count = page_counts.get(segment.mushaf_id, 0)
+            if not 1 <= segment.first_page <= segment.last_page <= page_count:
+                errors.append(
+                    f"{label}: pages {segment.first_page}-{segment.last_page} are outside "
+                    f"1-{page_count} for mushaf {segment.mushaf_id}"
+                )
+            key = (segment.mushaf_id, segment.category, segment.category_position)
+            if key in seen:
+                errors.append(f"{label}: duplicate {segment.category} position {segment.category_position}")
+            seen.add(key)
+
+        if errors:
+            raise CommandError("No segments were loaded:\n" + "\n".join(errors))
+
+        with transaction.atomic():
+            MushafSegment.objects.bulk_create(
+                [segment for _, segment in segments],
+                batch_size=options['batch_size'],
+                update_conflicts=True,
+                unique_fields=['mushaf', 'category', 'category_position'],
+                update_fields=['title', 'first_page', 'last_page'],
+            )
+            # bulk_create skips the signals that normally bump the version
+            for mushaf_id in mushaf_ids:
+                bump_catalog_version(mushaf_id)
+
+        self.stdout.write(f"Upserted {len(segments)} segments into mushaf(s) {', '.join(map(str, sorted(mushaf_ids)))}")
@@ -0,0 +1,49 @@
+# Generated by Django 5.0 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+def drop_duplicate_positions(apps, schema_editor):
+    # Segments were loaded by pk through loaddata, so the same position may
+    # exist twice. Exact copies of the oldest row of a (mushaf, category,
+    # position) are dropped; rows that disagree with it stop the migration so
+    # they can be reconciled by hand.
+    MushafSegment = apps.get_model('mushaf_segment', 'MushafSegment')
+    fields = ('title', 'first_page', 'last_page')
+    kept = {}
+    duplicate_ids = []
+    conflicts = []
+    for segment in MushafSegment.objects.order_by('id'):
+        key = (segment.mushaf_id, segment.category, segment.category_position)
+        original = kept.setdefault(key, segment)
+        if original is segment:
+            continue
+        if all(getattr(segment, field) == getattr(original, field) for field in fields):
+            duplicate_ids.append(segment.id)
+        else:
+            conflicts.append((original.id, segment.id))
+
+    if conflicts:
+        raise RuntimeError(
+            'MushafSegment rows share a (mushaf, category, category_position) but differ; '
+            'resolve them before migrating. Conflicting ids: '
+            + ', '.join(f'{original_id} vs {segment_id}' for original_id, segment_id in conflicts)
+        )
+    if duplicate_ids:
+        print(f'\n  Dropping duplicate MushafSegment rows: {", ".join(map(str, duplicate_ids))}')
+        MushafSegment.objects.filter(id__in=duplicate_ids).delete()
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mushaf', '0003_mushaf_catalog_version'),
+        ('mushaf_segment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_positions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='mushafsegment',
+            constraint=models.UniqueConstraint(fields=('mushaf', 'category', 'category_position'), name='unique_mushaf_segment_position'),
+        ),
+    ]
@@ -12,14 +12,30 @@ class MushafSegment(models.Model):
     category = models.CharField(max_length=255)
     category_position = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mushaf', 'category', 'category_position'],
+                name='unique_mushaf_segment_position',
+            ),
+        ]
+
     def __str__(self):
         return self.title  # Adjust this based on how you want to represent the object as a string
 
-def find_mushaf_segment(mushaf_page_id):
-    page_number = MushafPage.objects.get(id=mushaf_page_id).page_number
-    segment = MushafSegment.objects.filter(
-        first_page__lte=page_number,
-        last_page__gte=page_number
-    ).first()
+def find_mushaf_segment(mushaf_page_id, category='surah'):
+    """
+    Return the segment of `category` ("surah" or "juz") in the page's own
+    mushaf that contains the page, or None.
+
+    Resolved from the in-memory mushaf catalog, so no query is made once the
+    catalog is loaded. On a page shared by two segments the one with the lower
+    category_position is returned.
+    """
+    from mushaf.catalog import get_catalog_for_page
 
-    return segment
\ No newline at end of file
+    catalog = get_catalog_for_page(mushaf_page_id)
+    if catalog is None:
+        return None
+    page_number = catalog.page(mushaf_page_id).page_number
+    return catalog.segment_for_page(page_number, category)
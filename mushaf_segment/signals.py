@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mushaf.catalog import bump_catalog_version
+from .models import MushafSegment
+
+
+@receiver(post_save, sender=MushafSegment)
+@receiver(post_delete, sender=MushafSegment)
+def invalidate_mushaf_segment_caches(sender, instance, **kwargs):
+    bump_catalog_version(instance.mushaf_id)
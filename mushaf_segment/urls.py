@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import MushafSegmentsView, MushafSurahSegmentsView, MushafJuzSegmentsView
+from .views import MushafSegmentsView, MushafSurahSegmentsView, MushafJuzSegmentsView, MushafPageSegmentsView
 
 urlpatterns = [
     path('mushaf_segments', MushafSegmentsView.as_view(), name='mushaf_segments'),
@@ -7,5 +7,6 @@ urlpatterns = [
 
     path('mushafs/<int:mushaf_id>/surahs', MushafSurahSegmentsView.as_view(), name='mushaf_surah_segments'),
     path('mushafs/<int:mushaf_id>/juzs', MushafJuzSegmentsView.as_view(), name='mushaf_juz_segments'),
+    path('mushafs/<int:mushaf_id>/pages/<int:page_number>/segments', MushafPageSegmentsView.as_view(), name='mushaf_page_segments'),
 
 ]
\ No newline at end of file
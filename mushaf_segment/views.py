@@ -6,6 +6,7 @@ from .serializers import MushafSegmentSerializer
 from .models import MushafSegment
 from rest_framework.authtoken.views import ObtainAuthToken
 from mushaf.models import Mushaf
+from mushaf.catalog import catalog_conditional_get, get_catalog
 
 
 class MushafSegmentsView(APIView):
@@ -16,6 +17,7 @@ class MushafSegmentsView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @catalog_conditional_get(etag_parts=lambda request, **kwargs: ('segments',))
     def get(self, request, mushaf_id):
         # Perform the query and order by category_position
         mushaf_segments = MushafSegment.objects.filter(mushaf_id=mushaf_id).order_by('category_position')
@@ -27,6 +29,7 @@ class MushafSegmentsView(APIView):
         return Response(segment_serializer.data)
     
 class MushafSurahSegmentsView(APIView):
+    @catalog_conditional_get(etag_parts=lambda request, **kwargs: ('surahs',))
     def get(self, request, mushaf_id):
         # Perform the query and order by category_position
         mushaf_segments = MushafSegment.objects.filter(mushaf_id=mushaf_id, category="surah").order_by('category_position')
@@ -38,6 +41,7 @@ class MushafSurahSegmentsView(APIView):
         return Response(segment_serializer.data)
 
 class MushafJuzSegmentsView(APIView):
+    @catalog_conditional_get(etag_parts=lambda request, **kwargs: ('juzs',))
     def get(self, request, mushaf_id):
         # Perform the query and order by category_position
         mushaf_segments = MushafSegment.objects.filter(mushaf_id=mushaf_id, category="juz").order_by('category_position')
@@ -46,4 +50,41 @@ class MushafJuzSegmentsView(APIView):
         segment_serializer = MushafSegmentSerializer(mushaf_segments, many=True)
         
         # Return the serialized data in the response
-        return Response(segment_serializer.data)
\ No newline at end of file
+        return Response(segment_serializer.data)
+
+
+class MushafPageSegmentsView(APIView):
+    """
+    Every segment (surahs, juz, ...) containing a page, or overlapping a page
+    range when ?through=<last_page> is given, grouped by category.
+    """
+
+    @catalog_conditional_get(
+        etag_parts=lambda request, page_number, **kwargs: ('page-segments', page_number, request.query_params.get('through', '')),
+    )
+    def get(self, request, mushaf_id, page_number):
+        through = request.query_params.get('through')
+        try:
+            last_page = int(through) if through else page_number
+        except ValueError:
+            return Response({"error": "through must be a page number."}, status=status.HTTP_400_BAD_REQUEST)
+
+        grouped = {}
+        for segment in get_catalog(mushaf_id).segments_overlapping(page_number, last_page):
+            grouped.setdefault(segment.category, []).append({
+                'id': segment.id,
+                'title': segment.title,
+                'category': segment.category,
+                'category_position': segment.category_position,
+                'first_page': segment.first_page,
+                'last_page': segment.last_page,
+            })
+        for segments in grouped.values():
+            segments.sort(key=lambda segment: segment['category_position'])
+
+        return Response({
+            'mushaf_id': mushaf_id,
+            'first_page': min(page_number, last_page),
+            'last_page': max(page_number, last_page),
+            'segments': grouped,
+        })
@@ -38,7 +38,9 @@ class StatsView(APIView):
                 'created_at': created_at,
                 'branch': user_page.branch.id,
                 'camped': user_page.camped,
-                'drawn_paths': user_page.drawn_paths,
+                'drawn_paths': user_page.get_drawn_paths(),
+                'stroke_count': user_page.stroke_count,
+                'markings': user_page.valid_stroke_count,
             })
 
             # Update the last commit date for the mushaf_page
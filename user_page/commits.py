@@ -0,0 +1,327 @@
+"""
+Delta storage for UserPage commits.
+
+With USER_PAGE_COMMIT_STORAGE = 'delta', a commit on a (user, page, branch)
+only stores how its strokes differ from the previous commit there (its
+parent), and every USER_PAGE_SNAPSHOT_INTERVAL commits a full snapshot is
+written again so a reconstruction never replays more than that many deltas.
+
+A delta is a list of operations applied in order to the parent's strokes:
+
+    {"keep": [start, stop]}   copy parent strokes[start:stop]
+    {"add": [stroke, ...]}    append these strokes
+
+With USER_PAGE_STROKE_STORAGE = 'binary' the added strokes are packed into
+UserPage.delta_blob with user_page.stroke_codec, and each "add" holds the
+number of strokes it takes from there instead (see pack_delta).
+
+Materialized strokes are cached, so reading a page back is usually a single
+cache hit.
+"""
+import json
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .simplify import simplify_drawn_paths
+from .stroke_codec import StrokeEncodingError, decode_drawn_paths, encode_drawn_paths
+from .stroke_stats import point_counts_for
+
+DRAWN_PATHS_CACHE_KEY = 'user_page:{id}:drawn_paths'
+
+
+def _canonical_value(value):
+    # The codec hands back 3.0 for a 3 stored next to fractional values
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _stroke_hash(stroke):
+    if isinstance(stroke, list):
+        stroke = [
+            {key: _canonical_value(value) for key, value in point.items()} if isinstance(point, dict) else point
+            for point in stroke
+        ]
+    return json.dumps(stroke, sort_keys=True, separators=(',', ':'))
+
+
+def stored_drawn_paths(drawn_paths):
+    """
+    drawn_paths as they read back once stored: quantized by the codec under
+    USER_PAGE_STROKE_STORAGE = 'binary', unchanged otherwise or when the
+    codec cannot represent them.
+    """
+    if settings.USER_PAGE_STROKE_STORAGE != 'binary':
+        return drawn_paths
+    try:
+        return decode_drawn_paths(encode_drawn_paths(drawn_paths, scale=settings.USER_PAGE_STROKE_SCALE))
+    except StrokeEncodingError:
+        return drawn_paths
+
+
+def compute_delta(parent_paths, drawn_paths):
+    """
+    Operations turning parent_paths into drawn_paths.
+    """
+    matcher = SequenceMatcher(
+        None,
+        [_stroke_hash(stroke) for stroke in parent_paths],
+        [_stroke_hash(stroke) for stroke in drawn_paths],
+        autojunk=False,
+    )
+    delta = []
+    for tag, parent_start, parent_stop, start, stop in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append({'keep': [parent_start, parent_stop]})
+        elif tag in ('insert', 'replace'):
+            delta.append({'add': drawn_paths[start:stop]})
+        # 'delete': the parent's strokes are simply not kept
+    return delta
+
+
+def pack_delta(delta, scale=None):
+    """
+    Move the strokes added by a delta into the binary format.
+
+    Returns:
+        tuple: (operations, blob) where every "add" holds how many strokes it
+        takes, in order, from the decoded blob.
+
+    Raises:
+        StrokeEncodingError: If the added strokes cannot be encoded.
+    """
+    added = [stroke for operation in delta if 'add' in operation for stroke in operation['add']]
+    blob = encode_drawn_paths(added, scale=scale)
+    operations = [{'add': len(operation['add'])} if 'add' in operation else operation for operation in delta]
+    return operations, blob
+
+
+def unpack_delta(delta, delta_blob):
+    """
+    Inverse of pack_delta(); a delta without a blob is returned as it is.
+    """
+    if delta_blob is None:
+        return delta
+    added = iter(decode_drawn_paths(delta_blob))
+    return [
+        {'add': list(islice(added, operation['add']))} if 'add' in operation else operation
+        for operation in delta
+    ]
+
+
+def apply_delta(parent_paths, delta):
+    """
+    Rebuild a commit's strokes from its parent's and its delta.
+    """
+    drawn_paths = []
+    for operation in delta:
+        if 'keep' in operation:
+            start, stop = operation['keep']
+            drawn_paths.extend(parent_paths[start:stop])
+        else:
+            drawn_paths.extend(operation['add'])
+    return drawn_paths
+
+
+def cache_drawn_paths(user_page_id, drawn_paths):
+    cache.set(DRAWN_PATHS_CACHE_KEY.format(id=user_page_id), drawn_paths, settings.USER_PAGE_DELTA_CACHE_TTL)
+
+
+def materialize_drawn_paths(user_page, store=True):
+    """
+    Full strokes of a delta commit, replayed from its snapshot.
+
+    The snapshot and every delta after it are fetched in one query. The
+    result is cached unless `store` is False (e.g. for a one-off export).
+    """
+    from .models import UserPage
+
+    cache_key = DRAWN_PATHS_CACHE_KEY.format(id=user_page.id)
+    drawn_paths = cache.get(cache_key)
+    if drawn_paths is not None:
+        return drawn_paths
+
+    chain = {
+        commit.id: commit
+        for commit in UserPage.objects.filter(
+            Q(id=user_page.base_id) | Q(base_id=user_page.base_id, id__lt=user_page.id)
+        )
+    }
+    chain[user_page.id] = user_page
+
+    # Walk back to the snapshot, then replay forwards
+    path = []
+    commit = user_page
+    while commit.base_id is not None:
+        path.append(commit)
+        commit = chain[commit.parent_id]
+    drawn_paths = commit.get_drawn_paths() or []
+    for commit in reversed(path):
+        drawn_paths = apply_delta(drawn_paths, commit.get_delta())
+
+    if store:
+        cache_drawn_paths(user_page.id, drawn_paths)
+    return drawn_paths
+
+
+def latest_commit(user, mushaf_page, branch):
+    """
+    The last commit on a (user, page, branch), or None.
+    """
+    from .models import UserPage
+
+    return (
+        UserPage.objects.filter(user=user, mushaf_page=mushaf_page, branch=branch)
+        .order_by('-created_at', '-id')
+        .first()
+    )
+
+
+def simplify_on_parent(drawn_paths, tolerance, parent):
+    """
+    simplify_drawn_paths() for a commit made on top of `parent`.
+
+    Clients send back the strokes they last read, which were simplified when
+    they were stored. Strokes unchanged from the parent keep the point counts
+    recorded for them there; only the others are simplified and counted.
+
+    Returns:
+        tuple: (simplified drawn_paths, original point count of every stroke).
+    """
+    if parent is None or not isinstance(drawn_paths, list):
+        return simplify_drawn_paths(drawn_paths, tolerance)
+
+    parent_paths = parent.get_drawn_paths() or []
+    recorded = defaultdict(list)
+    for stroke, count in zip(parent_paths, point_counts_for(parent_paths, parent.original_point_counts)):
+        recorded[_stroke_hash(stroke)].append(count)
+
+    # Compare in stored form, so strokes the parent holds quantized still match
+    point_counts = [None] * len(drawn_paths)
+    for index, stroke in enumerate(stored_drawn_paths(drawn_paths)):
+        counts = recorded.get(_stroke_hash(stroke))
+        if counts:
+            point_counts[index] = counts.pop(0)
+
+    changed = [index for index, count in enumerate(point_counts) if count is None]
+    simplified, changed_counts = simplify_drawn_paths([drawn_paths[index] for index in changed], tolerance)
+    drawn_paths = list(drawn_paths)
+    for index, stroke, count in zip(changed, simplified, changed_counts):
+        drawn_paths[index] = stroke
+        point_counts[index] = count
+    return drawn_paths, point_counts
+
+
+def place_commit(user_page, parent):
+    """
+    Lay out an unsaved commit whose drawn_paths holds its full strokes on top
+    of `parent` under USER_PAGE_COMMIT_STORAGE = 'delta': as a snapshot every
+    USER_PAGE_SNAPSHOT_INTERVAL commits, as a delta on the parent otherwise.
+    `parent` must be stored already.
+    """
+    if settings.USER_PAGE_COMMIT_STORAGE != 'delta' or not isinstance(user_page.drawn_paths, list):
+        return
+    user_page.parent = parent
+    if parent is None or parent.depth + 1 >= settings.USER_PAGE_SNAPSHOT_INTERVAL:
+        return
+
+    # Diff what will be stored, so strokes the parent already has (quantized
+    # when it was stored) are recognised as unchanged
+    drawn_paths = stored_drawn_paths(user_page.drawn_paths)
+    user_page.base_id = parent.base_id or parent.id
+    user_page.depth = parent.depth + 1
+    user_page.delta = compute_delta(parent.get_drawn_paths() or [], drawn_paths)
+    user_page.drawn_paths = None
+    # save() cannot see the strokes of a delta, so fill in their statistics here
+    user_page.set_stroke_stats(drawn_paths)
+    user_page._decoded_drawn_paths = drawn_paths
+
+
+def create_commit(user, mushaf_page, branch, drawn_paths, simplify_tolerance=None, **fields):
+    """
+    Create a UserPage commit, stored as a delta on the previous commit of the
+    same (user, page, branch) when USER_PAGE_COMMIT_STORAGE is 'delta'.
+
+    With `simplify_tolerance`, drawn_paths are the strokes as posted and are
+    simplified here (see simplify_on_parent).
+    """
+    from .models import UserPage
+
+    delta_storage = settings.USER_PAGE_COMMIT_STORAGE == 'delta' and isinstance(drawn_paths, list)
+    parent = None
+    if delta_storage or simplify_tolerance is not None:
+        parent = latest_commit(user, mushaf_page, branch)
+    if simplify_tolerance is not None:
+        drawn_paths, fields['original_point_counts'] = simplify_on_parent(drawn_paths, simplify_tolerance, parent)
+
+    user_page = UserPage(user=user, mushaf_page=mushaf_page, branch=branch, drawn_paths=drawn_paths, **fields)
+    place_commit(user_page, parent)
+    user_page.save()
+    if user_page.base_id is not None:
+        cache_drawn_paths(user_page.id, user_page.get_drawn_paths())
+    return user_page
+
+
+def detach_commits(user_pages):
+    """
+    Rewrite the commits that depend on `user_pages` so those can be deleted.
+
+    A delta whose parent is being deleted becomes a snapshot of its own
+    strokes, and the later deltas replayed through it are rebased onto it.
+    Commits that are themselves being deleted are left alone.
+    """
+    from .models import UserPage
+
+    doomed = {user_page.id for user_page in user_pages}
+    with transaction.atomic():
+        for user_page_id in sorted(doomed):
+            # Re-read: detaching an earlier commit may have rebased this one
+            current = UserPage.objects.filter(id=user_page_id).values('base_id', 'parent_id').first()
+            if current is None:
+                continue
+            base_id = current['base_id'] or user_page_id
+
+            # Snapshots after this one only point back to it as history
+            UserPage.objects.filter(parent_id=user_page_id, base__isnull=True).exclude(id__in=doomed).update(
+                parent_id=current['parent_id']
+            )
+
+            group = list(UserPage.objects.filter(Q(id=base_id) | Q(base_id=base_id)))
+            children = defaultdict(list)
+            for commit in group:
+                children[commit.parent_id].append(commit)
+
+            for child in children[user_page_id]:
+                if child.id in doomed or child.base_id is None:
+                    continue
+                # Materialize before anything in the chain changes
+                drawn_paths = child.get_drawn_paths()
+
+                descendants = []
+                pending = list(children[child.id])
+                while pending:
+                    commit = pending.pop()
+                    descendants.append(commit)
+                    pending.extend(children[commit.id])
+                for commit in descendants:
+                    commit.base_id = child.id
+                    commit.depth -= child.depth
+                UserPage.objects.bulk_update(descendants, ['base', 'depth'])
+
+                child.parent_id = current['parent_id']
+                child.base_id = None
+                child.depth = 0
+                child.delta = None
+                child.delta_blob = None
+                child.drawn_paths = drawn_paths
+                child.drawn_paths_blob = None
+                # Not a new commit, so updated_at keeps its time
+                child.save(update_fields=[
+                    'parent', 'base', 'depth', 'delta', 'delta_blob', 'drawn_paths', 'drawn_paths_blob',
+                ])
@@ -0,0 +1,120 @@
+"""
+Streaming export of a user's UserPage commits as gzip-compressed NDJSON
+(one JSON object per line, oldest commit first).
+
+Rows are read through a server-side cursor and compressed as they are
+produced, so memory use does not depend on the size of the history. Delta
+commits are replayed from the strokes of their parent, which the export has
+just produced, instead of one chain query per row, and nothing is written to
+the strokes cache.
+
+Under WSGI export_user_pages() streams as it is. An ASGI server consumes a
+sync iterator in one go, so ASGI responses use export_user_pages_async().
+"""
+import json
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from mushaf.catalog import get_catalog_page
+from .commits import apply_delta, materialize_drawn_paths
+from .models import UserPage
+
+# Compressed bytes are handed on in pieces of at least this size
+GZIP_CHUNK_SIZE = 64 * 1024
+
+# Compressed pieces produced per worker thread hop in the async stream
+ASYNC_BATCH_SIZE = 4
+
+
+def export_record(user_page, drawn_paths=None):
+    record = get_catalog_page(user_page.mushaf_page_id)
+    return {
+        'id': user_page.id,
+        'mushaf_page': user_page.mushaf_page_id,
+        'page_number': record.page_number if record else None,
+        'branch': user_page.branch_id,
+        'camped': user_page.camped,
+        'parent': user_page.parent_id,
+        'created_at': user_page.created_at,
+        'updated_at': user_page.updated_at,
+        'drawn_paths': user_page.get_drawn_paths() if drawn_paths is None else drawn_paths,
+    }
+
+
+def iter_user_page_records(user_id, chunk_size=None):
+    user_pages = UserPage.objects.filter(user_id=user_id)
+    # Strokes of commits that a later delta replays from, held until that delta is reached
+    parent_ids = set(user_pages.filter(base__isnull=False).values_list('parent_id', flat=True))
+    held = {}
+
+    for user_page in user_pages.order_by('created_at', 'id').iterator(
+        chunk_size=chunk_size or settings.USER_PAGE_EXPORT_CHUNK_SIZE
+    ):
+        if user_page.base_id is None:
+            drawn_paths = user_page.get_drawn_paths()
+        elif user_page.parent_id in held:
+            drawn_paths = apply_delta(held.pop(user_page.parent_id), user_page.get_delta())
+        else:
+            drawn_paths = materialize_drawn_paths(user_page, store=False)
+        if user_page.id in parent_ids:
+            held[user_page.id] = drawn_paths
+        yield export_record(user_page, drawn_paths)
+
+
+def iter_ndjson(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for record in records:
+        yield (encoder.encode(record) + '\n').encode('utf-8')
+
+
+def iter_gzip(chunks, chunk_size=GZIP_CHUNK_SIZE):
+    """
+    Gzip a stream of byte strings incrementally.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            pending.append(compressed)
+            pending_size += len(compressed)
+        if pending_size >= chunk_size:
+            yield b''.join(pending)
+            pending = []
+            pending_size = 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def export_user_pages(user_id, chunk_size=None):
+    """
+    gzip-compressed NDJSON of every commit of a user, as a stream of bytes.
+    """
+    return iter_gzip(iter_ndjson(iter_user_page_records(user_id, chunk_size=chunk_size)))
+
+
+async def iter_async(iterator, batch_size=ASYNC_BATCH_SIZE):
+    """
+    Drive a sync iterator from async code, `batch_size` items per call into
+    the sync thread (the same thread every time, so database cursors stay usable).
+    """
+    iterator = iter(iterator)
+    next_batch = sync_to_async(lambda: list(islice(iterator, batch_size)), thread_sensitive=True)
+    while True:
+        batch = await next_batch()
+        if not batch:
+            return
+        for item in batch:
+            yield item
+
+
+def export_user_pages_async(user_id, chunk_size=None):
+    """
+    export_user_pages() as an async iterator, for streaming under ASGI.
+    """
+    return iter_async(export_user_pages(user_id, chunk_size=chunk_size))
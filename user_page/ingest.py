@@ -0,0 +1,238 @@
+"""
+Batch ingest of commits queued by offline clients.
+
+A batch is validated up front, users, pages and branches are resolved with
+one query each, new commits are written with bulk_create, and progress
+reports are recomputed once per (user, page) rather than once per commit. Every commit carries a client-generated id, unique per user, so a
+batch that is sent again after a dropped connection is not stored twice.
+
+Commits are laid out like single ones (see commits.create_commit): under
+USER_PAGE_COMMIT_STORAGE = 'delta' each is a delta on the previous commit of
+its page, which takes one bulk_create per commit the batch holds for its
+busiest page. A commit keeps the created_at the client made it at.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from accounts.sync import reserve_sync_seqs
+from branch.models import Branch
+from mushaf_page.models import MushafPage
+from user_progress_report.models import update_user_progress_report
+from .commits import place_commit, simplify_on_parent
+from .models import UserPage
+from .serializers import BatchCommitSerializer
+
+CREATED = 'created'
+EXISTING = 'existing'
+INVALID = 'invalid'
+
+
+def _existing_ids(model, ids):
+    return set(model.objects.filter(id__in=ids).values_list('id', flat=True))
+
+
+def _stored_commits(keys):
+    """
+    (id, sync_seq) of the UserPages stored under (user, client_commit_id) pairs.
+    """
+    if not keys:
+        return {}
+    user_pages = UserPage.objects.filter(
+        user_id__in={user_id for user_id, _ in keys},
+        client_commit_id__in={client_commit_id for _, client_commit_id in keys},
+    ).values_list('user_id', 'client_commit_id', 'id', 'sync_seq')
+    return {
+        (user_id, client_commit_id): (user_page_id, sync_seq)
+        for user_id, client_commit_id, user_page_id, sync_seq in user_pages
+        if (user_id, client_commit_id) in keys
+    }
+
+
+def _commit_ids(keys):
+    """
+    UserPage ids of already stored (user, client_commit_id) pairs.
+    """
+    return {key: user_page_id for key, (user_page_id, _) in _stored_commits(keys).items()}
+
+
+def _latest_commits(keys):
+    """
+    The last stored commit of every (user, mushaf_page, branch) in `keys`.
+    """
+    if not keys:
+        return {}
+    latest = UserPage.objects.filter(
+        user=OuterRef('user'), mushaf_page=OuterRef('mushaf_page'), branch=OuterRef('branch'),
+    ).order_by('-created_at', '-id').values('id')[:1]
+    matching = Q()
+    for user_id, mushaf_page_id, branch_id in keys:
+        matching |= Q(user_id=user_id, mushaf_page_id=mushaf_page_id, branch_id=branch_id)
+    user_pages = UserPage.objects.filter(matching).filter(id=Subquery(latest))
+    return {
+        (user_page.user_id, user_page.mushaf_page_id, user_page.branch_id): user_page
+        for user_page in user_pages
+    }
+
+
+def ingest_commits(commits):
+    """
+    Store a batch of commits, in order.
+
+    Returns:
+        list: One result per commit: {"client_commit_id", "status", "id"} with
+        status "created" or "existing", or {"client_commit_id", "status":
+        "invalid", "errors"}.
+    """
+    results = []
+    valid = []
+    for commit in commits:
+        serializer = BatchCommitSerializer(data=commit)
+        if serializer.is_valid():
+            valid.append((len(results), serializer.validated_data))
+            results.append(None)
+        else:
+            client_commit_id = commit.get('client_commit_id') if isinstance(commit, dict) else None
+            results.append({'client_commit_id': client_commit_id, 'status': INVALID, 'errors': serializer.errors})
+
+    users = _existing_ids(get_user_model(), {data['user'] for _, data in valid})
+    mushaf_pages = _existing_ids(MushafPage, {data['mushaf_page'] for _, data in valid})
+    branches = _existing_ids(Branch, {data['branch'] for _, data in valid})
+    stored = _commit_ids({(data['user'], data['client_commit_id']) for _, data in valid})
+
+    new_user_pages = []
+    # Commits that the strokes of each (user, page, branch) were last read from
+    latest = _latest_commits({
+        (data['user'], data['mushaf_page'], data['branch'])
+        for _, data in valid
+        if data['user'] in users and data['mushaf_page'] in mushaf_pages and data['branch'] in branches
+        and (data['user'], data['client_commit_id']) not in stored
+    })
+    # Under delta storage a commit is a delta on an earlier one of the batch,
+    # so it can only be written once that one has an id: generation n holds
+    # the n-th new commit of every page
+    delta_storage = settings.USER_PAGE_COMMIT_STORAGE == 'delta'
+    generations = Counter()
+    batched = set()
+    repeated = []
+    for position, data in valid:
+        key = (data['user'], data['client_commit_id'])
+        missing = {
+            field: [f"Invalid pk \"{data[field]}\" - object does not exist."]
+            for field, known in (('user', users), ('mushaf_page', mushaf_pages), ('branch', branches))
+            if data[field] not in known
+        }
+        if missing:
+            results[position] = {'client_commit_id': data['client_commit_id'], 'status': INVALID, 'errors': missing}
+            continue
+        if key in stored:
+            results[position] = {'client_commit_id': data['client_commit_id'], 'status': EXISTING, 'id': stored[key]}
+            continue
+        if key in batched:
+            # The same commit twice in one batch is stored once
+            repeated.append((position, key))
+            continue
+        batched.add(key)
+
+        page_key = (data['user'], data['mushaf_page'], data['branch'])
+        parent = latest.get(page_key)
+        drawn_paths, original_point_counts = simplify_on_parent(
+            data['drawn_paths'], settings.USER_PAGE_SIMPLIFY_TOLERANCE, parent,
+        )
+        user_page = UserPage(
+            user_id=data['user'],
+            mushaf_page_id=data['mushaf_page'],
+            branch_id=data['branch'],
+            drawn_paths=drawn_paths,
+            original_point_counts=original_point_counts,
+            camped=data['camped'],
+            client_commit_id=data['client_commit_id'],
+        )
+        if delta_storage:
+            new_user_pages.append((position, user_page, parent, generations[page_key], data.get('created_at')))
+            generations[page_key] += 1
+        else:
+            new_user_pages.append((position, user_page, None, 0, data.get('created_at')))
+        # A later commit in the batch on the same page builds on this one
+        latest[page_key] = user_page
+
+    inserted = {}
+    if new_user_pages:
+        with transaction.atomic():
+            # bulk_create skips save(), so stamp the sync sequence here (see accounts.sync)
+            per_user = Counter(user_page.user_id for _, user_page, *_ in new_user_pages)
+            # In user id order, so two batches cannot deadlock on each other's counters
+            next_seqs = {user_id: reserve_sync_seqs(user_id, per_user[user_id]) for user_id in sorted(per_user)}
+            for _, user_page, *_ in new_user_pages:
+                user_page.sync_seq = next_seqs[user_page.user_id]
+                next_seqs[user_page.user_id] += 1
+
+            # Stored rows by (user, client_commit_id), to place later generations on
+            placed = {}
+            for generation in range(max(entry[3] for entry in new_user_pages) + 1):
+                user_pages = []
+                for _, user_page, parent, entry_generation, _ in new_user_pages:
+                    if entry_generation != generation:
+                        continue
+                    if parent is not None and parent.id is None:
+                        parent = placed[(parent.user_id, parent.client_commit_id)]
+                    place_commit(user_page, parent)
+                    user_page.prepare_for_write()
+                    user_pages.append(user_page)
+
+                # A concurrent upload of the same batch may have stored some of these
+                # already; those rows are skipped and their reserved sync_seq values
+                # stay unused. Gaps are harmless: sync only compares against a cursor.
+                UserPage.objects.bulk_create(user_pages, ignore_conflicts=True)
+                stored_now = _stored_commits({
+                    (user_page.user_id, user_page.client_commit_id) for user_page in user_pages
+                })
+                inserted.update(stored_now)
+
+                winners = {}
+                for user_page in user_pages:
+                    key = (user_page.user_id, user_page.client_commit_id)
+                    user_page_id, sync_seq = stored_now[key]
+                    # Sequence values are never handed out twice for a user, so only a row
+                    # written by this call carries the value reserved for it above
+                    if sync_seq == user_page.sync_seq:
+                        user_page.id = user_page.pk = user_page_id
+                        placed[key] = user_page
+                    else:
+                        winners[user_page_id] = key
+                for user_page_id, winner in UserPage.objects.in_bulk(list(winners)).items():
+                    placed[winners[user_page_id]] = winner
+
+            # created_at is set on insert, so the client's time is written afterwards
+            backdated = []
+            for _, user_page, _, _, created_at in new_user_pages:
+                if created_at is not None and user_page.id is not None:
+                    user_page.created_at = created_at
+                    backdated.append(user_page)
+            if backdated:
+                UserPage.objects.bulk_update(backdated, ['created_at'])
+        stored.update({key: user_page_id for key, (user_page_id, _) in inserted.items()})
+
+    for position, (user_id, client_commit_id) in repeated:
+        results[position] = {
+            'client_commit_id': client_commit_id, 'status': EXISTING, 'id': stored[(user_id, client_commit_id)],
+        }
+
+    affected = {}
+    for position, user_page, *_ in new_user_pages:
+        if user_page.id is None:
+            # Stored by the concurrent upload, which also updated its progress
+            user_page_id, _ = inserted[(user_page.user_id, user_page.client_commit_id)]
+            results[position] = {'client_commit_id': user_page.client_commit_id, 'status': EXISTING, 'id': user_page_id}
+            continue
+        results[position] = {'client_commit_id': user_page.client_commit_id, 'status': CREATED, 'id': user_page.id}
+        # The last commit on a page decides which branch its report follows
+        affected[(user_page.user_id, user_page.mushaf_page_id)] = user_page
+
+    for user_page in affected.values():
+        update_user_progress_report(user_page)
+
+    return results
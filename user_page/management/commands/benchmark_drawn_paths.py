@@ -0,0 +1,90 @@
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user_page.models import UserPage
+from user_page.stroke_codec import StrokeEncodingError, decode_arrays, decode_drawn_paths, encode_drawn_paths
+
+
+def synthetic_drawn_paths(strokes, points, seed=0):
+    """
+    Random-walk strokes shaped like real pen input on a page image.
+    """
+    rng = random.Random(seed)
+    drawn_paths = []
+    for _ in range(strokes):
+        x, y = rng.uniform(0, 400), rng.uniform(0, 650)
+        stroke = []
+        for _ in range(rng.randint(points // 2, points * 3 // 2)):
+            x += rng.uniform(-3, 3)
+            y += rng.uniform(-3, 3)
+            stroke.append({'x': round(x, 2), 'y': round(y, 2)})
+        drawn_paths.append(stroke)
+    return drawn_paths
+
+
+def best_of(repeat, function, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+class Command(BaseCommand):
+    help = "Compare JSON and packed binary drawn_paths by size and encode/decode time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=50, help="Most recent UserPages to measure")
+        parser.add_argument('--synthetic', action='store_true', help="Measure generated strokes instead of stored ones")
+        parser.add_argument('--strokes', type=int, default=300)
+        parser.add_argument('--points', type=int, default=40, help="Average points per synthetic stroke")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            documents = [synthetic_drawn_paths(options['strokes'], options['points'])]
+        else:
+            documents = [
+                user_page.get_drawn_paths()
+                for user_page in UserPage.objects.order_by('-id')[:options['sample']]
+            ]
+            documents = [drawn_paths for drawn_paths in documents if drawn_paths]
+
+        scale = settings.USER_PAGE_STROKE_SCALE
+        totals = dict(documents=0, skipped=0, json_bytes=0, binary_bytes=0,
+                      json_dumps=0.0, json_loads=0.0, encode=0.0, decode=0.0, decode_arrays=0.0)
+        for drawn_paths in documents:
+            try:
+                blob = encode_drawn_paths(drawn_paths, scale=scale)
+            except StrokeEncodingError:
+                totals['skipped'] += 1
+                continue
+            text = json.dumps(drawn_paths)
+            repeat = options['repeat']
+
+            totals['documents'] += 1
+            totals['json_bytes'] += len(text.encode('utf-8'))
+            totals['binary_bytes'] += len(blob)
+            totals['json_dumps'] += best_of(repeat, json.dumps, drawn_paths)
+            totals['json_loads'] += best_of(repeat, json.loads, text)
+            totals['encode'] += best_of(repeat, encode_drawn_paths, drawn_paths, scale)
+            totals['decode'] += best_of(repeat, decode_drawn_paths, blob)
+            totals['decode_arrays'] += best_of(repeat, decode_arrays, blob)
+
+        if not totals['documents']:
+            self.stdout.write("No drawn_paths to measure")
+            return
+
+        ratio = totals['json_bytes'] / max(totals['binary_bytes'], 1)
+        self.stdout.write(f"Documents: {totals['documents']} ({totals['skipped']} not encodable)")
+        self.stdout.write(f"Size: JSON {totals['json_bytes']} B, binary {totals['binary_bytes']} B ({ratio:.1f}x smaller)")
+        self.stdout.write(f"JSON: dumps {totals['json_dumps']:.2f} ms, loads {totals['json_loads']:.2f} ms")
+        self.stdout.write(
+            f"Binary: encode {totals['encode']:.2f} ms, decode to JSON {totals['decode']:.2f} ms, "
+            f"decode to arrays {totals['decode_arrays']:.2f} ms"
+        )
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from user_page.export import export_user_pages
+
+
+class Command(BaseCommand):
+    help = "Write every commit of a user as gzip-compressed NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('output', help="File to write, e.g. user-1-pages.ndjson.gz")
+        parser.add_argument('--chunk-size', type=int, help="Rows fetched per database round trip")
+
+    def handle(self, *args, **options):
+        user_id = options['user_id']
+        if not get_user_model().objects.filter(id=user_id).exists():
+            raise CommandError(f"User {user_id} does not exist")
+
+        chunks = export_user_pages(user_id, chunk_size=options['chunk_size'])
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        self.stdout.write(f"Wrote {size} bytes to {options['output']}")
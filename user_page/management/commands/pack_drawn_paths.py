@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from user_page.models import UserPage
+
+
+class Command(BaseCommand):
+    help = "Move stored drawn_paths (and the strokes added by deltas) into the column chosen by USER_PAGE_STROKE_STORAGE."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only this user's pages")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_pages = UserPage.objects.filter(
+            Q(drawn_paths__isnull=False) | Q(delta__isnull=False, delta_blob__isnull=True)
+        ).order_by('id')
+        if options['user']:
+            user_pages = user_pages.filter(user_id=options['user'])
+
+        packed = 0
+        for user_page in user_pages.iterator(chunk_size=options['chunk_size']):
+            changed = user_page.pack_drawn_paths() + user_page.pack_delta()
+            if changed:
+                # Skip save() so updated_at keeps the commit's time
+                UserPage.objects.filter(id=user_page.id).update(
+                    **{field: getattr(user_page, field) for field in changed}
+                )
+                packed += 1
+        self.stdout.write(f"Packed drawn_paths of {packed} pages")
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_page', '0005_alter_userpage_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpage',
+            name='drawn_paths_blob',
+            field=models.BinaryField(null=True),
+        ),
+    ]
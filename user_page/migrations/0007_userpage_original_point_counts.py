@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_page', '0006_userpage_drawn_paths_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpage',
+            name='original_point_counts',
+            field=models.JSONField(editable=False, null=True),
+        ),
+    ]
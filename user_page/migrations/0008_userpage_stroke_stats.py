@@ -0,0 +1,194 @@
+# Generated by Django 5.0 on 2026-10-18 06:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copies of user_page.stroke_codec (format version 1) and
+# user_page.stroke_stats as of this migration, so later changes to those
+# modules cannot change what the backfill computes.
+
+STROKE_STAT_FIELDS = (
+    'stroke_count', 'valid_stroke_count', 'long_stroke_count', 'point_count',
+    'bbox_min_x', 'bbox_min_y', 'bbox_max_x', 'bbox_max_y',
+)
+VALID_STROKE_MIN_POINTS = 10
+LONG_STROKE_MIN_POINTS = 11
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def decode_drawn_paths(data):
+    data = bytes(data)
+    if data[:2] != b'DP' or data[2] != 1:
+        return None
+
+    offset = 3
+    scale, offset = _read_varint(data, offset)
+    key_count, offset = _read_varint(data, offset)
+    keys = []
+    for _ in range(key_count):
+        length, offset = _read_varint(data, offset)
+        keys.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    stroke_count, offset = _read_varint(data, offset)
+    point_counts = []
+    for _ in range(stroke_count):
+        count, offset = _read_varint(data, offset)
+        point_counts.append(count)
+
+    deltas = []
+    while offset < len(data):
+        value, offset = _read_varint(data, offset)
+        deltas.append((value >> 1) ^ -(value & 1))
+
+    # Key-major payload: every delta of the first key, then the next key, ...
+    total = sum(point_counts)
+    columns = []
+    for index in range(len(keys)):
+        key_deltas = iter(deltas[index * total:(index + 1) * total])
+        column = []
+        for count in point_counts:
+            value = 0
+            for _ in range(count):
+                value += next(key_deltas)
+                column.append(value if scale == 1 else value / scale)
+        columns.append(column)
+
+    points = iter([dict(zip(keys, values)) for values in zip(*columns)] if keys else [])
+    return [[next(points) if keys else {} for _ in range(count)] for count in point_counts]
+
+
+def _coordinate(point, key):
+    if not isinstance(point, dict):
+        return None
+    value = point.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def stroke_stats(drawn_paths, point_counts):
+    strokes = drawn_paths if isinstance(drawn_paths, list) else []
+    counts = [len(stroke) if isinstance(stroke, list) else 0 for stroke in strokes]
+    # Recorded counts are only trusted while they still describe the strokes
+    if not (
+        isinstance(point_counts, list)
+        and len(point_counts) == len(counts)
+        and all(
+            isinstance(original, int) and not isinstance(original, bool) and original >= count
+            for original, count in zip(point_counts, counts)
+        )
+    ):
+        point_counts = counts
+
+    xs = []
+    ys = []
+    for stroke in strokes:
+        if not isinstance(stroke, list):
+            continue
+        for point in stroke:
+            x, y = _coordinate(point, 'x'), _coordinate(point, 'y')
+            if x is not None and y is not None:
+                xs.append(x)
+                ys.append(y)
+
+    return {
+        'stroke_count': len(point_counts),
+        'valid_stroke_count': sum(1 for count in point_counts if count >= VALID_STROKE_MIN_POINTS),
+        'long_stroke_count': sum(1 for count in point_counts if count >= LONG_STROKE_MIN_POINTS),
+        'point_count': sum(point_counts),
+        'bbox_min_x': min(xs) if xs else None,
+        'bbox_min_y': min(ys) if ys else None,
+        'bbox_max_x': max(xs) if xs else None,
+        'bbox_max_y': max(ys) if ys else None,
+    }
+
+
+def backfill_stroke_stats(apps, schema_editor):
+    UserPage = apps.get_model('user_page', 'UserPage')
+    user_pages = UserPage.objects.only('id', 'drawn_paths', 'drawn_paths_blob', 'original_point_counts').order_by('id')
+    batch = []
+    for user_page in user_pages.iterator(chunk_size=500):
+        drawn_paths = user_page.drawn_paths
+        if drawn_paths is None and user_page.drawn_paths_blob is not None:
+            drawn_paths = decode_drawn_paths(user_page.drawn_paths_blob)
+        for field, value in stroke_stats(drawn_paths, user_page.original_point_counts).items():
+            setattr(user_page, field, value)
+        batch.append(user_page)
+        if len(batch) >= 500:
+            UserPage.objects.bulk_update(batch, STROKE_STAT_FIELDS)
+            batch = []
+    if batch:
+        UserPage.objects.bulk_update(batch, STROKE_STAT_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('mushaf_page', '0007_mushafpage_verse_keys'),
+        ('user_page', '0007_userpage_original_point_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpage',
+            name='bbox_max_x',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='bbox_max_y',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='bbox_min_x',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='bbox_min_y',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='long_stroke_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='point_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='stroke_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='valid_stroke_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='userpage',
+            index=models.Index(fields=['user', 'branch', 'mushaf_page', 'updated_at'], name='userpage_progress_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userpage',
+            index=models.Index(fields=['user', 'long_stroke_count'], name='userpage_long_strokes_idx'),
+        ),
+        migrations.RunPython(backfill_stroke_stats, migrations.RunPython.noop),
+    ]
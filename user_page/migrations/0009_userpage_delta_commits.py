@@ -0,0 +1,34 @@
+# Generated by Django 5.0 on 2026-10-18 06:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_page', '0008_userpage_stroke_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpage',
+            name='base',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='+', to='user_page.userpage'),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='delta',
+            field=models.JSONField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userpage',
+            name='parent',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.RESTRICT, related_name='children', to='user_page.userpage'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 06:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('mushaf_page', '0007_mushafpage_verse_keys'),
+        ('user_page', '0009_userpage_delta_commits'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userpage',
+            index=models.Index(fields=['user', 'mushaf_page', 'branch', 'created_at', 'id'], name='userpage_history_idx'),
+        ),
+    ]
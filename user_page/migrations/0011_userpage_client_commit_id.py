@@ -0,0 +1,26 @@
+# Generated by Django 5.0 on 2026-10-18 06:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branch', '0001_initial'),
+        ('mushaf_page', '0007_mushafpage_verse_keys'),
+        ('user_page', '0010_userpage_history_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpage',
+            name='client_commit_id',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='userpage',
+            constraint=models.UniqueConstraint(condition=models.Q(('client_commit_id__isnull', False)), fields=('user', 'client_commit_id'), name='unique_user_client_commit'),
+        ),
+    ]
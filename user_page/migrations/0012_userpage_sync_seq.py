@@ -0,0 +1,52 @@
+# Generated by Django 5.0 on 2026-10-18 06:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_sync_seqs(apps, schema_editor):
+    """
+    Number each user's existing branches, pages and progress reports so a
+    first sync from 0 returns them.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    models_to_number = [
+        apps.get_model('branch', 'Branch'),
+        apps.get_model('user_page', 'UserPage'),
+        apps.get_model('user_progress_report', 'UserProgressReport'),
+    ]
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        seq = 0
+        for model in models_to_number:
+            rows = list(model.objects.filter(user_id=user_id).only('id').order_by('id'))
+            for row in rows:
+                seq += 1
+                row.sync_seq = seq
+            model.objects.bulk_update(rows, ['sync_seq'], batch_size=500)
+        if seq:
+            User.objects.filter(id=user_id).update(sync_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0030_user_sync_seq_alter_user_password'),
+        ('branch', '0002_branch_sync_seq'),
+        ('user_progress_report', '0003_userprogressreport_sync_seq'),
+        ('mushaf_page', '0007_mushafpage_verse_keys'),
+        ('user_page', '0011_userpage_client_commit_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpage',
+            name='sync_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='userpage',
+            index=models.Index(fields=['user', 'sync_seq'], name='userpage_user_sync_seq_idx'),
+        ),
+        migrations.RunPython(backfill_sync_seqs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_page', '0012_userpage_sync_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpage',
+            name='delta_blob',
+            field=models.BinaryField(null=True),
+        ),
+    ]
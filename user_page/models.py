@@ -1,10 +1,23 @@
-from django.db import models
+from django.db import models, transaction
 from mushaf_page.models import MushafPage
 from django.contrib.auth import get_user_model
 from branch.models import Branch  # Import the Branch model
 from django.utils.timezone import now
+from django.conf import settings
+from .stroke_codec import StrokeEncodingError, decode_drawn_paths, encode_drawn_paths
+from .stroke_stats import point_counts_for, stroke_stats
+from .commits import detach_commits, materialize_drawn_paths, pack_delta, unpack_delta
+from accounts.sync import SyncSeqMixin
 
-class UserPage(models.Model):
+class UserPageQuerySet(models.QuerySet):
+    def delete(self):
+        # See UserPage.delete
+        with transaction.atomic():
+            detach_commits(list(self.only('id')))
+            return super().delete()
+
+
+class UserPage(SyncSeqMixin, models.Model):
     # Primary key
     id = models.AutoField(primary_key=True)
 
@@ -14,6 +27,37 @@ class UserPage(models.Model):
     # Array of dicts (using a JSONField for flexibility)
     drawn_paths = models.JSONField(default=list, null=True)
 
+    # drawn_paths packed by user_page.stroke_codec (USER_PAGE_STROKE_STORAGE = 'binary');
+    # when set, drawn_paths is stored as null
+    drawn_paths_blob = models.BinaryField(null=True, editable=False)
+
+    # Point count of every stroke as drawn, before simplification on ingest
+    original_point_counts = models.JSONField(null=True, editable=False)
+
+    # Stroke statistics computed on save (see user_page.stroke_stats), so
+    # marking checks never need to load drawn_paths
+    stroke_count = models.PositiveIntegerField(default=0, editable=False)
+    valid_stroke_count = models.PositiveIntegerField(default=0, editable=False)
+    long_stroke_count = models.PositiveIntegerField(default=0, editable=False)
+    point_count = models.PositiveIntegerField(default=0, editable=False)
+    bbox_min_x = models.FloatField(null=True, editable=False)
+    bbox_min_y = models.FloatField(null=True, editable=False)
+    bbox_max_x = models.FloatField(null=True, editable=False)
+    bbox_max_y = models.FloatField(null=True, editable=False)
+
+    # Delta storage (see user_page.commits): the previous commit on the same
+    # (user, page, branch), the snapshot a delta is replayed from, and how many
+    # deltas separate this commit from it. Snapshots have no base.
+    parent = models.ForeignKey('self', on_delete=models.RESTRICT, null=True, editable=False, related_name='children')
+    base = models.ForeignKey('self', on_delete=models.RESTRICT, null=True, editable=False, related_name='+')
+    depth = models.PositiveIntegerField(default=0, editable=False)
+    delta = models.JSONField(null=True, editable=False)
+    # Strokes added by the delta, packed by user_page.stroke_codec (USER_PAGE_STROKE_STORAGE = 'binary')
+    delta_blob = models.BinaryField(null=True, editable=False)
+
+    # Id generated by an offline client for its commit, so a re-sent batch is not stored twice
+    client_commit_id = models.CharField(max_length=64, null=True, editable=False)
+
     # Foreign key to User model
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='user_pages')
 
@@ -26,9 +70,157 @@ class UserPage(models.Model):
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserPageQuerySet.as_manager()
+
+    sync_kind = 'user_pages'
     
     class Meta:
         app_label = 'user_page'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_commit_id'],
+                condition=models.Q(client_commit_id__isnull=False),
+                name='unique_user_client_commit',
+            ),
+        ]
+        indexes = [
+            # Commit history of a page on a branch, newest first (keyset pagination)
+            models.Index(fields=['user', 'mushaf_page', 'branch', 'created_at', 'id'], name='userpage_history_idx'),
+            # Latest commit of a page on a branch (progress reports)
+            models.Index(fields=['user', 'branch', 'mushaf_page', 'updated_at'], name='userpage_progress_idx'),
+            # Changes since a sync cursor
+            models.Index(fields=['user', 'sync_seq'], name='userpage_user_sync_seq_idx'),
+            # Pages with a reviewable stroke (random review)
+            models.Index(fields=['user', 'long_stroke_count'], name='userpage_long_strokes_idx'),
+        ]
 
     def __str__(self):
         return f"UserPage {self.id} (Branch: {self.branch.title})"
+
+    def get_drawn_paths(self):
+        """
+        drawn_paths in its JSON form, whichever column it is stored in.
+
+        The binary column is only decoded, and a delta commit only replayed,
+        on first access.
+        """
+        if self.base_id is not None:
+            if '_decoded_drawn_paths' not in self.__dict__:
+                self._decoded_drawn_paths = materialize_drawn_paths(self)
+            return self._decoded_drawn_paths
+        if self.drawn_paths is not None or self.drawn_paths_blob is None:
+            return self.drawn_paths
+        if '_decoded_drawn_paths' not in self.__dict__:
+            self._decoded_drawn_paths = decode_drawn_paths(self.drawn_paths_blob)
+        return self._decoded_drawn_paths
+
+    def stroke_point_counts(self):
+        """
+        Point count of every stroke as the user drew it.
+
+        Marking validity is judged on these, so simplified strokes count the
+        same as the raw ones did. Recorded counts that no longer match the
+        strokes are ignored.
+        """
+        return point_counts_for(self.get_drawn_paths(), self.original_point_counts)
+
+    def sync_stroke_stats(self):
+        """
+        Recompute the stroke statistics from drawn_paths; returns the names of
+        fields that changed.
+
+        Rows whose strokes only live in the binary column or in a delta
+        already carry their statistics, so they are left alone.
+        """
+        if self.drawn_paths is None:
+            return []
+        return self.set_stroke_stats(self.drawn_paths)
+
+    def set_stroke_stats(self, drawn_paths):
+        changed = []
+        for field, value in stroke_stats(drawn_paths, self.original_point_counts).items():
+            if getattr(self, field) != value:
+                setattr(self, field, value)
+                changed.append(field)
+        return changed
+
+    def get_drawn_paths_blob(self):
+        """
+        drawn_paths in the binary format, encoding JSON-stored rows on the fly.
+
+        Raises:
+            StrokeEncodingError: If the JSON drawn_paths cannot be encoded.
+        """
+        if self.drawn_paths is None and self.drawn_paths_blob is not None:
+            return bytes(self.drawn_paths_blob)
+        return encode_drawn_paths(self.drawn_paths or [], scale=settings.USER_PAGE_STROKE_SCALE)
+
+    def pack_drawn_paths(self):
+        """
+        Move drawn_paths into the column selected by USER_PAGE_STROKE_STORAGE;
+        returns the names of fields that changed.
+        """
+        if self.drawn_paths is None:
+            return []
+        blob = None
+        if settings.USER_PAGE_STROKE_STORAGE == 'binary':
+            try:
+                blob = encode_drawn_paths(self.drawn_paths, scale=settings.USER_PAGE_STROKE_SCALE)
+            except StrokeEncodingError:
+                # Shapes the codec does not handle stay as JSON
+                blob = None
+        if blob is None:
+            if self.drawn_paths_blob is None:
+                return []
+            self.drawn_paths_blob = None
+            return ['drawn_paths_blob']
+
+        # What reads will return: the quantized values, not the input as given
+        self._decoded_drawn_paths = decode_drawn_paths(blob)
+        self.drawn_paths = None
+        self.drawn_paths_blob = blob
+        return ['drawn_paths', 'drawn_paths_blob']
+
+    def get_delta(self):
+        """
+        The delta operations with their added strokes inline, whichever
+        column those are stored in.
+        """
+        return unpack_delta(self.delta, self.delta_blob)
+
+    def pack_delta(self):
+        """
+        Pack the strokes added by a delta into delta_blob under
+        USER_PAGE_STROKE_STORAGE = 'binary'; returns the names of fields that
+        changed.
+        """
+        if self.delta is None or self.delta_blob is not None or settings.USER_PAGE_STROKE_STORAGE != 'binary':
+            return []
+        try:
+            self.delta, self.delta_blob = pack_delta(self.delta, scale=settings.USER_PAGE_STROKE_SCALE)
+        except StrokeEncodingError:
+            # Strokes the codec does not handle stay as JSON
+            return []
+        return ['delta', 'delta_blob']
+
+    def prepare_for_write(self):
+        """
+        Fill in derived columns; save() does this itself, bulk_create callers
+        must call it first. Returns the names of fields that changed.
+        """
+        return self.sync_stroke_stats() + self.pack_drawn_paths() + self.pack_delta()
+
+    def save(self, *args, **kwargs):
+        changed = self.prepare_for_write()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and changed:
+            kwargs['update_fields'] = set(update_fields) | set(changed)
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # Later commits may be stored as deltas on this one; turn them into
+        # snapshots first instead of failing on the RESTRICT foreign keys
+        with transaction.atomic():
+            detach_commits([self])
+            return super().delete(*args, **kwargs)
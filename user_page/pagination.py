@@ -0,0 +1,53 @@
+"""
+Keyset pagination of UserPage commit history, newest first.
+
+Pages are cut on (created_at, id) rather than by offset, so fetching any page
+of a long history is one index range scan.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(user_page):
+    position = f'{user_page.created_at.isoformat()}|{user_page.id}'
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (created_at, id) of the last commit of the previous page.
+    """
+    try:
+        position = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, user_page_id = position.split('|')
+        return datetime.fromisoformat(created_at), int(user_page_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor("Invalid cursor.")
+
+
+def paginate_history(queryset, cursor=None, limit=50):
+    """
+    One page of commits, newest first, starting after `cursor`.
+
+    Returns:
+        tuple: (commits, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, user_page_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=user_page_id))
+
+    # One extra row tells whether another page follows
+    commits = list(queryset[:limit + 1])
+    if len(commits) <= limit:
+        return commits, None
+    commits = commits[:limit]
+    return commits, encode_cursor(commits[-1])
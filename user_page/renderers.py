@@ -0,0 +1,15 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class DrawnPathsRenderer(BaseRenderer):
+    """
+    Passes already-encoded drawn_paths (see user_page/stroke_codec.py) through
+    as the response body.
+    """
+    media_type = 'application/x-drawn-paths'
+    format = 'drawn_paths'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
@@ -1,18 +1,118 @@
 from rest_framework import serializers
 from .models import UserPage
 from mushaf_page.models import MushafPage
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.conf import settings
 from pytz import timezone
-from django.utils.timezone import is_naive, make_aware
-from mushaf_page.serializers import MushafPageSerializer  # Import MushafPage serializer if it exists
+from django.utils.timezone import is_naive, make_aware, now
+from mushaf_page.serializers import CatalogMushafPageField
+from mushaf.catalog import SURAH, get_catalog_for_page
 
-class UserPageSerializer(serializers.ModelSerializer):
+# Storage and bookkeeping columns of UserPage, kept out of API responses
+INTERNAL_FIELDS = (
+    'drawn_paths_blob', 'original_point_counts',
+    'stroke_count', 'valid_stroke_count', 'long_stroke_count', 'point_count',
+    'bbox_min_x', 'bbox_min_y', 'bbox_max_x', 'bbox_max_y',
+    'parent', 'base', 'depth', 'delta', 'delta_blob',
+    'client_commit_id', 'sync_seq',
+)
+
+
+class DrawnPathsField(serializers.JSONField):
+    """
+    drawn_paths as JSON, decoded from the binary column when stored there.
+    """
+
+    def get_attribute(self, instance):
+        return instance.get_drawn_paths()
+
+
+def sparse_fieldset(request):
+    """
+    Serializer kwargs from the ?fields= and ?include= query parameters
+    (comma separated field names); None where a parameter is absent.
+    """
+    def names(param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    return {'fields': names('fields'), 'include': names('include')}
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for UserPage serializers.
+
+    ?fields= limits the output to the named fields. ?include= names which
+    expandable fields (the strokes and the nested page) to render; without it
+    they are left out, except that drawn_paths is kept when ?fields= asks for
+    it and mushaf_page falls back to the page id. With neither parameter every
+    field is returned. restrict_queryset() pushes the same choice down to the
+    ORM so unused columns, above all drawn_paths, are never loaded.
+    """
+    expandable_fields = ('drawn_paths', 'mushaf_page')
+
+    # Model columns behind serializer fields that do not map onto one directly
+    field_columns = {
+        'created_at': ('created_at',),
+        'drawn_paths': ('drawn_paths', 'drawn_paths_blob', 'base', 'parent', 'delta', 'delta_blob'),
+        'mushaf_page': ('mushaf_page',),
+    }
+    required_columns = ('id',)
+
+    def __init__(self, *args, fields=None, include=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and include is None:
+            return
+
+        include = set(include or ())
+        if fields is None:
+            keep = set(self.fields) - set(self.expandable_fields)
+        else:
+            keep = set(fields)
+        keep |= include
+
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+        if 'mushaf_page' in self.fields and 'mushaf_page' not in include:
+            self.fields['mushaf_page'] = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    @classmethod
+    def restrict_queryset(cls, queryset, fields=None, include=None):
+        if fields is None and include is None:
+            return queryset
+
+        selected = cls(fields=fields, include=include).fields
+        names = {}
+        for field in queryset.model._meta.concrete_fields:
+            names[field.name] = names[field.attname] = field.name
+
+        columns = set(cls.required_columns)
+        for name, field in selected.items():
+            for column in cls.field_columns.get(name, (field.source,)):
+                if column not in names:
+                    # Built from the whole row; only keep the strokes out
+                    if 'drawn_paths' in selected:
+                        return queryset
+                    return queryset.defer(*cls.field_columns['drawn_paths'])
+                columns.add(names[column])
+        return queryset.only(*columns)
+
+
+class UserPageSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     created_at = serializers.SerializerMethodField()  # Add a custom method field
-    mushaf_page = MushafPageSerializer()  # Nested serializer for mushaf_page details
+    mushaf_page = CatalogMushafPageField()  # Nested mushaf_page details from the catalog
+    drawn_paths = DrawnPathsField(required=False, allow_null=True)
+
+    # created_at is always loaded for the history cursor
+    required_columns = ('id', 'created_at')
 
     class Meta:
         model = UserPage
-        fields = '__all__'
+        exclude = INTERNAL_FIELDS
         
 
     def get_created_at(self, obj):
@@ -32,9 +132,11 @@ class UserPageSerializer(serializers.ModelSerializer):
 
 class CreateUserPageSerializer(serializers.ModelSerializer):
     created_at = serializers.SerializerMethodField()  # Add a custom method field
+    drawn_paths = DrawnPathsField(required=False, allow_null=True)
+
     class Meta:
         model = UserPage
-        fields = '__all__'
+        exclude = INTERNAL_FIELDS
 
     def get_created_at(self, obj):
         # Convert created_at to PST
@@ -50,12 +152,17 @@ class CreateUserPageSerializer(serializers.ModelSerializer):
             return created_at_pst.strftime('%-m.%-d.%y %-I:%M%p')
         return None
     
-class UserProgressSerializer(serializers.ModelSerializer):
+class UserProgressSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     created_at = serializers.SerializerMethodField()  # Add the custom method field here too
+    drawn_paths = DrawnPathsField(required=False, allow_null=True)
+
+    # mushaf_page is only ever the id here; to_representation needs it regardless
+    expandable_fields = ('drawn_paths',)
+    required_columns = ('id', 'mushaf_page')
 
     class Meta:
         model = UserPage
-        fields = '__all__'
+        exclude = INTERNAL_FIELDS
 
     def get_created_at(self, obj):
         if obj.created_at:
@@ -68,15 +175,36 @@ class UserProgressSerializer(serializers.ModelSerializer):
         # Access the instance of the model and do something with it
         model_instance = instance  # This is the model instance being serialized
 
-        # You can access its fields or perform any custom logic
-        mushaf_page = model_instance.mushaf_page
-        page_number = mushaf_page.page_number
+        # Page and segment come from the in-memory catalog, not the database
+        catalog = get_catalog_for_page(model_instance.mushaf_page_id)
+        if catalog is None:
+            return representation
+        page_number = catalog.page(model_instance.mushaf_page_id).page_number
 
-        segment, percentage = mushaf_page.mushaf.get_segment_and_percentage(page_number)
+        segment, percentage = catalog.segment_and_percentage(page_number, SURAH)
         if segment:
-            print(segment.title, percentage)
             representation['title'] = segment.title
             representation['percentage'] = percentage
             representation['page_number'] = page_number
 
         return representation
+
+
+class BatchCommitSerializer(serializers.Serializer):
+    """
+    One queued commit in a user_pages/batch upload.
+    """
+    client_commit_id = serializers.CharField(max_length=64)
+    user = serializers.IntegerField()
+    mushaf_page = serializers.IntegerField()
+    branch = serializers.IntegerField()
+    drawn_paths = serializers.JSONField(required=False, default=list)
+    camped = serializers.BooleanField(required=False, default=False)
+    # When the commit was made on the client; the upload time when absent
+    created_at = serializers.DateTimeField(required=False)
+
+    def validate_created_at(self, value):
+        upload_time = now()
+        if value > upload_time + timedelta(seconds=settings.USER_PAGE_BATCH_CLOCK_SKEW):
+            raise serializers.ValidationError('created_at is in the future.')
+        return min(value, upload_time)
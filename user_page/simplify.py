@@ -0,0 +1,106 @@
+"""
+Ramer-Douglas-Peucker simplification of drawn_paths on ingest.
+
+Clients send raw pointer samples, so a straight underline arrives as
+hundreds of nearly collinear points. Every stroke of a commit is simplified
+in one pass: the points are laid end to end and each iteration splits every
+still-too-coarse segment of every stroke at once with NumPy, so the number
+of Python-level steps follows the recursion depth, not the point count.
+"""
+import numpy as np
+
+
+def _is_point(point):
+    if not isinstance(point, dict):
+        return False
+    for key in ('x', 'y'):
+        value = point.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+    return True
+
+
+def rdp_mask(xs, ys, boundaries, tolerance):
+    """
+    Ramer-Douglas-Peucker over several polylines laid end to end.
+
+    Args:
+        xs, ys (ndarray): Coordinates of every point of every polyline.
+        boundaries (ndarray): Indices of the first and last point of each
+            polyline; these are always kept and never joined to each other.
+        tolerance (float): Largest distance a dropped point may be from the
+            simplified line.
+
+    Returns:
+        ndarray: Boolean mask of the points to keep.
+    """
+    count = xs.size
+    keep = np.zeros(count, dtype=bool)
+    keep[boundaries] = True
+    positions = np.arange(count)
+
+    while True:
+        kept = np.flatnonzero(keep)
+        # Kept points on either side of every point
+        segment = np.searchsorted(kept, positions, side='right') - 1
+        start = kept[segment]
+        end = kept[np.minimum(segment + 1, kept.size - 1)]
+
+        dx = xs[end] - xs[start]
+        dy = ys[end] - ys[start]
+        px = xs - xs[start]
+        py = ys - ys[start]
+        chord = np.hypot(dx, dy)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance = np.where(chord > 0, np.abs(dx * py - dy * px) / chord, np.hypot(px, py))
+        distance[keep] = 0
+
+        # The farthest point of each segment, if it is out of tolerance
+        farthest = np.maximum.reduceat(distance, kept)
+        split = (distance > tolerance) & (distance == farthest[segment])
+        if not split.any():
+            return keep
+        # One split per segment: the first of any tied farthest points
+        candidates = np.flatnonzero(split)
+        _, first = np.unique(segment[candidates], return_index=True)
+        keep[candidates[first]] = True
+
+
+def simplify_drawn_paths(drawn_paths, tolerance):
+    """
+    Simplify every stroke of drawn_paths.
+
+    Strokes that are not lists of {x, y} points are left as they are. Kept
+    points are the original point objects, so any extra keys survive.
+
+    Returns:
+        tuple: (simplified drawn_paths, original point count of every stroke).
+    """
+    if not isinstance(drawn_paths, list):
+        return drawn_paths, None
+    point_counts = [len(stroke) if isinstance(stroke, list) else 0 for stroke in drawn_paths]
+    if not tolerance or tolerance <= 0:
+        return drawn_paths, point_counts
+
+    # Only strokes long enough to lose a point are worth simplifying
+    simplifiable = [
+        index for index, stroke in enumerate(drawn_paths)
+        if isinstance(stroke, list) and len(stroke) > 2 and all(_is_point(point) for point in stroke)
+    ]
+    if not simplifiable:
+        return drawn_paths, point_counts
+
+    points = [point for index in simplifiable for point in drawn_paths[index]]
+    xs = np.fromiter((point['x'] for point in points), dtype=np.float64, count=len(points))
+    ys = np.fromiter((point['y'] for point in points), dtype=np.float64, count=len(points))
+    lengths = np.array([point_counts[index] for index in simplifiable])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    keep = rdp_mask(xs, ys, np.concatenate((starts, ends - 1)), tolerance)
+
+    simplified = list(drawn_paths)
+    for index, start, end in zip(simplifiable, starts.tolist(), ends.tolist()):
+        kept = np.flatnonzero(keep[start:end]).tolist()
+        stroke = drawn_paths[index]
+        simplified[index] = [stroke[position] for position in kept]
+    return simplified, point_counts
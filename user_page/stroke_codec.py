@@ -0,0 +1,285 @@
+"""
+Compact binary encoding for UserPage.drawn_paths.
+
+drawn_paths is a list of strokes, each a list of points such as
+{"x": 12.5, "y": 40}. The binary form stores every point coordinate as a
+quantized integer, delta-encoded along its stroke, zigzag-mapped and packed
+as a varint:
+
+    MAGIC  VERSION  scale  key_count  (key_length key)*  stroke_count
+    (point_count)*  payload
+
+All counts are unsigned varints. The payload holds, for every key in turn, the
+deltas of that key across all points of all strokes. Decoding the payload is done
+with NumPy in a handful of vectorized passes, so the cost no longer grows
+with the number of Python objects in the JSON.
+"""
+import numpy as np
+
+MAGIC = b'DP'
+VERSION = 1
+
+# Quantization used when coordinates are not all integers (1/100 of a unit)
+DEFAULT_SCALE = 100
+
+# A uint64 varint never needs more than 10 bytes
+MAX_VARINT_BYTES = 10
+
+# Quantized values must stay below this in magnitude so that the difference of
+# two of them still fits an int64 (and its zigzag form a uint64)
+QUANTIZED_LIMIT = 2 ** 62
+
+
+class StrokeEncodingError(ValueError):
+    """
+    Raised when drawn_paths cannot be represented in the binary format (e.g.
+    points with differing keys or non-numeric values).
+    """
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise StrokeEncodingError("Truncated drawn_paths header.")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_varints(values):
+    """
+    Pack an array of unsigned integers as concatenated varints.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if not values.size:
+        return b''
+
+    # Bytes needed per value: one per started group of 7 bits
+    lengths = np.ones(values.shape, dtype=np.int64)
+    remaining = values >> np.uint64(7)
+    while remaining.any():
+        lengths += remaining > 0
+        remaining >>= np.uint64(7)
+
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    out = np.empty(int(ends[-1]), dtype=np.uint8)
+    for index in range(int(lengths.max())):
+        present = lengths > index
+        chunk = (values[present] >> np.uint64(7 * index)) & np.uint64(0x7F)
+        more = (lengths[present] > index + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[present] + index] = (chunk | more).astype(np.uint8)
+    return out.tobytes()
+
+
+def decode_varints(data):
+    """
+    Unpack concatenated varints into a uint64 array.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not raw.size:
+        return np.empty(0, dtype=np.uint64)
+    if raw[-1] & 0x80:
+        raise StrokeEncodingError("Truncated drawn_paths payload.")
+
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    if lengths.max() > MAX_VARINT_BYTES:
+        raise StrokeEncodingError("Malformed drawn_paths payload.")
+
+    # Bit shift of every byte inside its varint
+    byte_index = np.arange(raw.size) - np.repeat(starts, lengths)
+    parts = (raw & 0x7F).astype(np.uint64) << (byte_index * 7).astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def _zigzag(values):
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def _point_keys(drawn_paths):
+    if not isinstance(drawn_paths, list):
+        raise StrokeEncodingError("drawn_paths must be a list of strokes.")
+    for stroke in drawn_paths:
+        if not isinstance(stroke, list):
+            raise StrokeEncodingError("Every stroke must be a list of points.")
+        for point in stroke:
+            if not isinstance(point, dict):
+                raise StrokeEncodingError("Every point must be an object.")
+            return list(point.keys())
+    return []
+
+
+def encode_drawn_paths(drawn_paths, scale=None):
+    """
+    Encode drawn_paths into the binary format.
+
+    Args:
+        drawn_paths (list): Strokes, each a list of points with the same numeric keys.
+        scale (int): Quantization factor for non-integer coordinates. Integer-only
+            input is always stored exactly.
+
+    Raises:
+        StrokeEncodingError: If drawn_paths does not fit the format, including
+            values that are not finite or too large once quantized.
+
+    Returns:
+        bytes: The encoded strokes.
+    """
+    keys = _point_keys(drawn_paths)
+    key_set = set(keys)
+
+    columns = [[] for _ in keys]
+    point_counts = []
+    integral = True
+    for stroke in drawn_paths:
+        if not isinstance(stroke, list):
+            raise StrokeEncodingError("Every stroke must be a list of points.")
+        for point in stroke:
+            if not isinstance(point, dict) or point.keys() != key_set:
+                raise StrokeEncodingError("Every point must have the same keys.")
+            for column, key in zip(columns, keys):
+                value = point[key]
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise StrokeEncodingError(f"Point value for '{key}' must be a number.")
+                if integral and not isinstance(value, int):
+                    integral = False
+                column.append(value)
+        point_counts.append(len(stroke))
+
+    if integral:
+        scale = 1
+    elif scale is None:
+        scale = DEFAULT_SCALE
+
+    header = bytearray(MAGIC)
+    header.append(VERSION)
+    _write_varint(header, scale)
+    _write_varint(header, len(keys))
+    for key in keys:
+        encoded_key = key.encode('utf-8')
+        _write_varint(header, len(encoded_key))
+        header += encoded_key
+    _write_varint(header, len(point_counts))
+    for count in point_counts:
+        _write_varint(header, count)
+
+    if not keys or not sum(point_counts):
+        return bytes(header)
+
+    # (keys, points) matrix of quantized values
+    if scale == 1:
+        if any(abs(value) >= QUANTIZED_LIMIT for column in columns for value in column):
+            raise StrokeEncodingError("Point value out of range.")
+        matrix = np.array(columns, dtype=np.int64)
+    else:
+        try:
+            values = np.array(columns, dtype=np.float64)
+        except OverflowError:
+            raise StrokeEncodingError("Point value out of range.")
+        with np.errstate(over='ignore', invalid='ignore'):
+            quantized = np.rint(values * scale)
+            in_range = np.isfinite(quantized) & (np.abs(quantized) < QUANTIZED_LIMIT)
+        if not in_range.all():
+            raise StrokeEncodingError("Point value out of range.")
+        matrix = quantized.astype(np.int64)
+
+    # Delta along each stroke; the first point of a stroke is stored as-is
+    deltas = np.diff(matrix, axis=1, prepend=0)
+    stroke_starts = np.cumsum([0] + point_counts[:-1])
+    stroke_starts = stroke_starts[np.asarray(point_counts) > 0]
+    deltas[:, stroke_starts] = matrix[:, stroke_starts]
+
+    # Key-major layout: every x delta, then every y delta, ...
+    return bytes(header) + encode_varints(_zigzag(deltas.ravel()))
+
+
+def is_encoded(data):
+    return data is not None and bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def decode_arrays(data):
+    """
+    Decode the binary format into NumPy arrays without building Python points.
+
+    Returns:
+        tuple: (keys, scale, point_counts, matrix) where matrix is a
+        (len(keys), total_points) int64 array of quantized values.
+    """
+    data = bytes(data)
+    if not is_encoded(data):
+        raise StrokeEncodingError("Not an encoded drawn_paths value.")
+    if data[len(MAGIC)] != VERSION:
+        raise StrokeEncodingError(f"Unsupported drawn_paths version {data[len(MAGIC)]}.")
+
+    offset = len(MAGIC) + 1
+    scale, offset = _read_varint(data, offset)
+    key_count, offset = _read_varint(data, offset)
+    keys = []
+    for _ in range(key_count):
+        length, offset = _read_varint(data, offset)
+        keys.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    stroke_count, offset = _read_varint(data, offset)
+    point_counts = []
+    for _ in range(stroke_count):
+        count, offset = _read_varint(data, offset)
+        point_counts.append(count)
+
+    total = sum(point_counts)
+    deltas = _unzigzag(decode_varints(data[offset:]))
+    if deltas.size != total * len(keys):
+        raise StrokeEncodingError("drawn_paths payload does not match its header.")
+
+    if not total or not keys:
+        return keys, scale, point_counts, np.empty((len(keys), total), dtype=np.int64)
+
+    # Running sum along the points, restarted at every stroke
+    deltas = deltas.reshape(len(keys), total)
+    matrix = np.cumsum(deltas, axis=1)
+    counts = np.asarray(point_counts, dtype=np.int64)
+    counts = counts[counts > 0]
+    stroke_starts = np.cumsum(counts) - counts
+    carried = np.zeros((len(keys), counts.size), dtype=np.int64)
+    carried[:, 1:] = matrix[:, stroke_starts[1:] - 1]
+    matrix -= np.repeat(carried, counts, axis=1)
+    return keys, scale, point_counts, matrix
+
+
+def decode_drawn_paths(data):
+    """
+    Decode the binary format back into the JSON drawn_paths structure.
+    """
+    keys, scale, point_counts, matrix = decode_arrays(data)
+    if scale == 1:
+        columns = matrix.tolist()
+    else:
+        columns = (matrix / scale).tolist()
+
+    points = [dict(zip(keys, values)) for values in zip(*columns)] if keys else []
+    drawn_paths = []
+    start = 0
+    for count in point_counts:
+        if keys:
+            drawn_paths.append(points[start:start + count])
+        else:
+            drawn_paths.append([{} for _ in range(count)])
+        start += count
+    return drawn_paths
@@ -0,0 +1,84 @@
+"""
+Write-time statistics of a commit's strokes, stored on UserPage so marking
+checks can be answered in SQL without loading drawn_paths.
+"""
+
+# A stroke counts as a marking on progress reports from this many points
+VALID_STROKE_MIN_POINTS = 10
+
+# Random review only picks pages with a stroke longer than this
+LONG_STROKE_MIN_POINTS = 11
+
+STROKE_STAT_FIELDS = (
+    'stroke_count', 'valid_stroke_count', 'long_stroke_count', 'point_count',
+    'bbox_min_x', 'bbox_min_y', 'bbox_max_x', 'bbox_max_y',
+)
+
+
+def _coordinate(point, key):
+    if not isinstance(point, dict):
+        return None
+    value = point.get(key)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return value
+
+
+def point_counts_for(drawn_paths, point_counts=None):
+    """
+    Point count of every stroke as drawn.
+
+    `point_counts` (the counts recorded before simplification) is used only
+    when it still describes `drawn_paths`: one integer per stroke, none of
+    them smaller than the stroke as stored. Otherwise, e.g. after the strokes
+    were edited without updating it, the counts come from the strokes.
+    """
+    strokes = drawn_paths if isinstance(drawn_paths, list) else []
+    counts = [len(stroke) if isinstance(stroke, list) else 0 for stroke in strokes]
+    if (
+        isinstance(point_counts, list)
+        and len(point_counts) == len(counts)
+        and all(
+            isinstance(original, int) and not isinstance(original, bool) and original >= count
+            for original, count in zip(point_counts, counts)
+        )
+    ):
+        return point_counts
+    return counts
+
+
+def stroke_stats(drawn_paths, point_counts=None):
+    """
+    Args:
+        drawn_paths (list): Strokes as stored (possibly simplified).
+        point_counts (list): Point count of every stroke as drawn, when the
+            strokes were simplified on ingest (see point_counts_for).
+
+    Returns:
+        dict: A value for every name in STROKE_STAT_FIELDS. The bounding box
+        is None when no stroke has numeric x/y points.
+    """
+    strokes = drawn_paths if isinstance(drawn_paths, list) else []
+    point_counts = point_counts_for(strokes, point_counts)
+
+    xs = []
+    ys = []
+    for stroke in strokes:
+        if not isinstance(stroke, list):
+            continue
+        for point in stroke:
+            x, y = _coordinate(point, 'x'), _coordinate(point, 'y')
+            if x is not None and y is not None:
+                xs.append(x)
+                ys.append(y)
+
+    return {
+        'stroke_count': len(point_counts),
+        'valid_stroke_count': sum(1 for count in point_counts if count >= VALID_STROKE_MIN_POINTS),
+        'long_stroke_count': sum(1 for count in point_counts if count >= LONG_STROKE_MIN_POINTS),
+        'point_count': sum(point_counts),
+        'bbox_min_x': min(xs) if xs else None,
+        'bbox_min_y': min(ys) if ys else None,
+        'bbox_max_x': max(xs) if xs else None,
+        'bbox_max_y': max(ys) if ys else None,
+    }
@@ -1,3 +1,736 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import math
+import random
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import SyncCounter, SyncTombstone
+from accounts.sync import reserve_sync_seqs
+from branch.models import Branch
+from mushaf.catalog import discard_catalog, get_catalog
+from mushaf.models import Mushaf
+from mushaf_page.models import MushafPage
+from user_progress_report.models import UserProgressReport
+from .commits import DRAWN_PATHS_CACHE_KEY, create_commit
+from .export import export_user_pages, export_user_pages_async
+from .ingest import CREATED, EXISTING, INVALID
+from .models import UserPage
+from .pagination import InvalidCursor, decode_cursor, encode_cursor, paginate_history
+from .serializers import UserPageSerializer, UserProgressSerializer
+from .simplify import rdp_mask, simplify_drawn_paths
+from .stroke_codec import StrokeEncodingError, decode_drawn_paths, encode_drawn_paths
+from .stroke_stats import point_counts_for, stroke_stats
+
+
+def stroke(*points):
+    return [{'x': x, 'y': y} for x, y in points]
+
+
+def encode_cursor_text(text):
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+class UserPageTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.user = get_user_model().objects.create_user(email='reader@example.com', password='secret')
+        self.branch = Branch.objects.create(title='Main', position=1, user=self.user)
+        self.mushaf = Mushaf.objects.create(title='Test')
+        self.pages = [
+            MushafPage.objects.create(
+                mushaf=self.mushaf, page_number=page_number,
+                verse_ref_start=f'1:{page_number * 2 - 1}', verse_ref_end=f'1:{page_number * 2}',
+            )
+            for page_number in (1, 2, 3)
+        ]
+        self.addCleanup(discard_catalog, self.mushaf.id)
+
+
+class StrokeCodecTests(SimpleTestCase):
+    def assertRoundTrip(self, drawn_paths):
+        self.assertEqual(decode_drawn_paths(encode_drawn_paths(drawn_paths)), drawn_paths)
+
+    def test_integer_round_trip(self):
+        self.assertRoundTrip([stroke((0, 0), (5, -3), (300, 1200)), [], stroke((-7, 9))])
+
+    def test_float_round_trip(self):
+        self.assertRoundTrip([stroke((0.5, 1.25), (10.75, -3.5)), stroke((100.01, 0.99))])
+
+    def test_extra_keys_round_trip(self):
+        self.assertRoundTrip([[{'x': 1, 'y': 2, 't': 1700000000000}, {'x': 2, 'y': 3, 't': 1700000000016}]])
+
+    def test_empty(self):
+        self.assertRoundTrip([])
+        self.assertRoundTrip([[], []])
+
+    def test_floats_are_quantized(self):
+        decoded = decode_drawn_paths(encode_drawn_paths([stroke((1.234, 5.678))], scale=100))
+        self.assertEqual(decoded, [stroke((1.23, 5.68))])
+
+    def test_mixed_ints_and_floats_decode_as_floats(self):
+        decoded = decode_drawn_paths(encode_drawn_paths([stroke((1, 2.5))]))
+        self.assertEqual(decoded, [stroke((1.0, 2.5))])
+        self.assertIsInstance(decoded[0][0]['x'], float)
+
+    def test_largest_values_round_trip(self):
+        limit = 2 ** 62 - 1
+        self.assertRoundTrip([stroke((limit, -limit), (-limit, limit))])
+
+    def test_out_of_range_values_are_rejected(self):
+        for value in (2 ** 63, -2 ** 62, 1e300, float('inf'), float('nan'), 10 ** 400):
+            with self.subTest(value=value), self.assertRaises(StrokeEncodingError):
+                encode_drawn_paths([stroke((value, 0.5))])
+
+    def test_unsupported_shapes_are_rejected(self):
+        for drawn_paths in ({'x': 1}, [{'x': 1}], [[{'x': 1}, {'y': 1}]], [[{'x': 'a'}]], [[{'x': True}]]):
+            with self.subTest(drawn_paths=drawn_paths), self.assertRaises(StrokeEncodingError):
+                encode_drawn_paths(drawn_paths)
+
+    def test_truncated_payload_is_rejected(self):
+        data = encode_drawn_paths([stroke((1000, 2000), (3000, 4000))])
+        with self.assertRaises(StrokeEncodingError):
+            decode_drawn_paths(data[:-1])
+
+
+@override_settings(USER_PAGE_STROKE_STORAGE='binary', USER_PAGE_SIMPLIFY_TOLERANCE=0)
+class BinaryStorageTests(UserPageTestCase):
+    def create(self, drawn_paths):
+        return UserPage.objects.create(
+            user=self.user, mushaf_page=self.pages[0], branch=self.branch, drawn_paths=drawn_paths
+        )
+
+    def test_saved_in_binary_column(self):
+        user_page = self.create([stroke((1, 2), (3, 4))])
+        stored = UserPage.objects.get(id=user_page.id)
+        self.assertIsNone(stored.drawn_paths)
+        self.assertEqual(stored.get_drawn_paths(), [stroke((1, 2), (3, 4))])
+
+    def test_saved_instance_returns_stored_values(self):
+        user_page = self.create([stroke((1, 2.345))])
+        stored = UserPage.objects.get(id=user_page.id)
+        self.assertEqual(user_page.get_drawn_paths(), [stroke((1.0, 2.35))])
+        self.assertEqual(user_page.get_drawn_paths(), stored.get_drawn_paths())
+
+    def test_out_of_range_values_fall_back_to_json(self):
+        drawn_paths = [stroke((2 ** 63, 0))]
+        user_page = self.create(drawn_paths)
+        stored = UserPage.objects.get(id=user_page.id)
+        self.assertIsNone(stored.drawn_paths_blob)
+        self.assertEqual(stored.get_drawn_paths(), drawn_paths)
+
+    def test_create_response_matches_stored_strokes(self):
+        response = self.client.post('/user_pages', {
+            'user': self.user.id, 'mushaf_page': self.pages[0].id, 'branch': self.branch.id,
+            'drawn_paths': [stroke((1, 2.345), (3, 4))],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        stored = UserPage.objects.get(id=response.data['id'])
+        self.assertEqual(response.data['drawn_paths'], stored.get_drawn_paths())
+
+
+def reference_rdp(points, tolerance):
+    """
+    Textbook recursive Ramer-Douglas-Peucker, returning the kept indices.
+    """
+    def distance(point, start, end):
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        px, py = point[0] - start[0], point[1] - start[1]
+        chord = math.hypot(dx, dy)
+        return abs(dx * py - dy * px) / chord if chord > 0 else math.hypot(px, py)
+
+    def simplify(first, last):
+        farthest, index = 0, None
+        for position in range(first + 1, last):
+            current = distance(points[position], points[first], points[last])
+            if current > farthest:
+                farthest, index = current, position
+        if index is None or farthest <= tolerance:
+            return [first]
+        return simplify(first, index) + simplify(index, last)
+
+    return simplify(0, len(points) - 1) + [len(points) - 1]
+
+
+class SimplifyTests(SimpleTestCase):
+    def test_matches_reference_implementation(self):
+        rng = random.Random(7)
+        for _ in range(50):
+            strokes = [
+                [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(rng.randint(2, 60))]
+                for _ in range(rng.randint(1, 5))
+            ]
+            tolerance = rng.choice([0.5, 2, 10])
+            points = [point for points_of_stroke in strokes for point in points_of_stroke]
+            lengths = np.array([len(points_of_stroke) for points_of_stroke in strokes])
+            ends = np.cumsum(lengths)
+            starts = ends - lengths
+            keep = rdp_mask(
+                np.array([x for x, _ in points]), np.array([y for _, y in points]),
+                np.concatenate((starts, ends - 1)), tolerance,
+            )
+            for points_of_stroke, start, end in zip(strokes, starts, ends):
+                self.assertEqual(
+                    np.flatnonzero(keep[start:end]).tolist(),
+                    reference_rdp(points_of_stroke, tolerance),
+                )
+
+    def test_straight_line_keeps_its_ends(self):
+        line = stroke(*((x, 2 * x + 0.01 * (x % 2)) for x in range(100)))
+        simplified, point_counts = simplify_drawn_paths([line], tolerance=0.5)
+        self.assertEqual(simplified, [[line[0], line[-1]]])
+        self.assertEqual(point_counts, [100])
+
+    def test_corner_is_kept(self):
+        corner = stroke(*((x, 0) for x in range(10)), *((9, y) for y in range(1, 10)))
+        simplified, _ = simplify_drawn_paths([corner], tolerance=0.5)
+        self.assertEqual(simplified, [stroke((0, 0), (9, 0), (9, 9))])
+
+    def test_extra_keys_survive(self):
+        line = [{'x': x, 'y': 0, 't': x * 16} for x in range(5)]
+        simplified, _ = simplify_drawn_paths([line], tolerance=1)
+        self.assertEqual(simplified, [[line[0], line[-1]]])
+
+    def test_other_shapes_are_left_alone(self):
+        drawn_paths = [stroke((0, 0), (1, 1), (2, 2)), [{'x': 'a'}, {}, {}], 'scribble', []]
+        simplified, point_counts = simplify_drawn_paths(drawn_paths, tolerance=1)
+        self.assertEqual(simplified[1:], drawn_paths[1:])
+        self.assertEqual(point_counts, [3, 3, 0, 0])
+        self.assertEqual(simplify_drawn_paths(drawn_paths, tolerance=0), (drawn_paths, [3, 3, 0, 0]))
+
+
+@override_settings(USER_PAGE_SIMPLIFY_TOLERANCE=1)
+class SimplifyOnCreateTests(UserPageTestCase):
+    def test_stroke_stats_use_original_counts(self):
+        line = stroke(*((x, 0) for x in range(20)))
+        response = self.client.post('/user_pages', {
+            'user': self.user.id, 'mushaf_page': self.pages[0].id, 'branch': self.branch.id,
+            'drawn_paths': [line],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        user_page = UserPage.objects.get(id=response.data['id'])
+        self.assertEqual(user_page.get_drawn_paths(), [[line[0], line[-1]]])
+        self.assertEqual(user_page.original_point_counts, [20])
+        self.assertEqual((user_page.valid_stroke_count, user_page.long_stroke_count, user_page.point_count), (1, 1, 20))
+
+    def post_and_read_back(self, drawn_paths, **data):
+        response = self.client.post('/user_pages', {
+            'user': self.user.id, 'mushaf_page': self.pages[0].id, 'branch': self.branch.id,
+            'drawn_paths': drawn_paths, **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        user_page_id = response.data['id']
+        response = self.client.get(f'/user_pages/{user_page_id}/drawn_paths')
+        self.assertEqual(response.status_code, 200)
+        return UserPage.objects.get(id=user_page_id), response.data
+
+    def assert_read_back_keeps_counts(self):
+        line = stroke(*((x, 0) for x in range(15)))
+        first, read_back = self.post_and_read_back([line])
+        self.assertEqual(first.valid_stroke_count, 1)
+
+        # The client sends what it read, plus one new stroke
+        dot = stroke((5, 5))
+        second, _ = self.post_and_read_back(read_back + [dot])
+        self.assertEqual(second.original_point_counts, [15, 1])
+        self.assertEqual((second.valid_stroke_count, second.point_count), (1, 16))
+        self.assertEqual(UserProgressReport.objects.get(user=self.user, mushaf_page=self.pages[0]).markings, 1)
+
+    def test_strokes_read_back_keep_their_counts(self):
+        self.assert_read_back_keeps_counts()
+
+    @override_settings(USER_PAGE_COMMIT_STORAGE='delta', USER_PAGE_STROKE_STORAGE='binary', USER_PAGE_SNAPSHOT_INTERVAL=10)
+    def test_strokes_read_back_keep_their_counts_in_deltas(self):
+        self.assert_read_back_keeps_counts()
+
+    def test_redrawn_stroke_is_counted_again(self):
+        line = stroke(*((x, 0) for x in range(15)))
+        self.post_and_read_back([line])
+        second, _ = self.post_and_read_back([stroke(*((0, y) for y in range(12)))])
+        self.assertEqual(second.original_point_counts, [12])
+
+    def test_batch_commits_keep_counts_of_strokes_read_back(self):
+        line = stroke(*((x, 0) for x in range(15)))
+        first, read_back = self.post_and_read_back([line])
+        commits = [
+            {
+                'client_commit_id': client_commit_id, 'user': self.user.id, 'mushaf_page': self.pages[0].id,
+                'branch': self.branch.id, 'drawn_paths': drawn_paths,
+            }
+            for client_commit_id, drawn_paths in (('a', read_back), ('b', read_back + [stroke((1, 1))]))
+        ]
+        response = self.client.post('/user_pages/batch', {'commits': commits}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(UserPage.objects.filter(client_commit_id__isnull=False).order_by('id').values_list('original_point_counts', flat=True)),
+            [[15], [15, 1]],
+        )
+
+
+class StrokeStatsTests(UserPageTestCase):
+    def test_recorded_counts_are_used_while_they_match(self):
+        drawn_paths = [stroke((0, 0), (9, 9)), stroke((1, 1))]
+        self.assertEqual(point_counts_for(drawn_paths, [30, 1]), [30, 1])
+        stats = stroke_stats(drawn_paths, [30, 1])
+        self.assertEqual((stats['stroke_count'], stats['valid_stroke_count'], stats['point_count']), (2, 1, 31))
+        self.assertEqual((stats['bbox_min_x'], stats['bbox_max_y']), (0, 9))
+
+    def test_stale_counts_are_recomputed(self):
+        drawn_paths = [stroke((0, 0), (9, 9)), stroke((1, 1))]
+        for point_counts in (None, [30], [30, 1, 12], [30, 0], [30, '1'], {'a': 1}):
+            with self.subTest(point_counts=point_counts):
+                self.assertEqual(point_counts_for(drawn_paths, point_counts), [2, 1])
+
+    def test_save_ignores_stale_counts(self):
+        user_page = UserPage.objects.create(
+            user=self.user, mushaf_page=self.pages[0], branch=self.branch,
+            drawn_paths=[stroke(*((x, 0) for x in range(12)))], original_point_counts=[40],
+        )
+        self.assertEqual((user_page.point_count, user_page.long_stroke_count), (40, 1))
+
+        # Strokes edited without updating the recorded counts
+        user_page.drawn_paths = [stroke((0, 0), (1, 1)), stroke((2, 2))]
+        user_page.save()
+        user_page.refresh_from_db()
+        self.assertEqual((user_page.stroke_count, user_page.point_count, user_page.long_stroke_count), (2, 3, 0))
+        self.assertEqual(user_page.stroke_point_counts(), [2, 1])
+
+
+@override_settings(
+    USER_PAGE_COMMIT_STORAGE='delta', USER_PAGE_STROKE_STORAGE='binary',
+    USER_PAGE_SNAPSHOT_INTERVAL=10, USER_PAGE_SIMPLIFY_TOLERANCE=0,
+)
+class DeltaCommitTests(UserPageTestCase):
+    def commit(self, drawn_paths):
+        return create_commit(self.user, self.pages[0], self.branch, drawn_paths)
+
+    def stored(self, user_page):
+        cache.clear()
+        return UserPage.objects.get(id=user_page.id).get_drawn_paths()
+
+    def test_delta_is_packed(self):
+        first = stroke((1, 2), (3, 4))
+        self.commit([first])
+        second = self.commit([first, stroke((5, 6))])
+        stored = UserPage.objects.get(id=second.id)
+        self.assertEqual(stored.delta, [{'keep': [0, 1]}, {'add': 1}])
+        self.assertIsNotNone(stored.delta_blob)
+        self.assertEqual(stored.get_delta(), [{'keep': [0, 1]}, {'add': [stroke((5, 6))]}])
+        self.assertEqual(self.stored(second), [first, stroke((5, 6))])
+
+    def test_unchanged_strokes_are_kept_after_quantization(self):
+        first = stroke((1.234, 2.345), (3.456, 4.567))
+        self.commit([first])
+        # The client still holds its unquantized copy of the first stroke
+        second = self.commit([first, stroke((7.891, 8.912))])
+        self.assertEqual(second.delta, [{'keep': [0, 1]}, {'add': 1}])
+        self.assertEqual(self.stored(second), [stroke((1.23, 2.35), (3.46, 4.57)), stroke((7.89, 8.91))])
+        self.assertEqual(second.get_drawn_paths(), self.stored(second))
+
+    def test_integer_strokes_are_kept_next_to_fractional_ones(self):
+        first = stroke((1, 2), (3, 4))
+        self.commit([first])
+        second = self.commit([first, stroke((0.5, 0.25))])
+        self.assertEqual(second.delta, [{'keep': [0, 1]}, {'add': 1}])
+
+    def chain(self, length=4):
+        commits = []
+        drawn_paths = []
+        for index in range(length):
+            drawn_paths = drawn_paths + [stroke((index, index), (index + 1, index + 2))]
+            commits.append(self.commit(drawn_paths))
+        return commits
+
+    def test_deleting_a_snapshot_rebases_its_deltas(self):
+        snapshot, *deltas = self.chain()
+        expected = [self.stored(commit) for commit in deltas]
+
+        snapshot.delete()
+
+        promoted = UserPage.objects.get(id=deltas[0].id)
+        self.assertEqual((promoted.base_id, promoted.depth, promoted.delta, promoted.parent_id), (None, 0, None, None))
+        self.assertEqual(
+            [(commit.base_id, commit.depth) for commit in UserPage.objects.filter(id__in=[c.id for c in deltas[1:]]).order_by('id')],
+            [(promoted.id, 1), (promoted.id, 2)],
+        )
+        self.assertEqual([self.stored(commit) for commit in deltas], expected)
+
+    def test_deleting_a_delta_keeps_later_commits(self):
+        commits = self.chain()
+        expected = {commit.id: self.stored(commit) for commit in commits}
+
+        commits[1].delete()
+
+        remaining = [commits[0], commits[2], commits[3]]
+        for commit in remaining:
+            self.assertEqual(self.stored(commit), expected[commit.id])
+        self.assertEqual(UserPage.objects.get(id=commits[2].id).parent_id, commits[0].id)
+
+    def test_queryset_delete(self):
+        commits = self.chain(5)
+        expected = {commit.id: self.stored(commit) for commit in commits}
+
+        UserPage.objects.filter(id__in=[commits[0].id, commits[2].id]).delete()
+
+        for commit in (commits[1], commits[3], commits[4]):
+            self.assertEqual(self.stored(commit), expected[commit.id])
+
+
+class HistoryPaginationTests(UserPageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.commits = [
+            UserPage.objects.create(user=self.user, mushaf_page=self.pages[0], branch=self.branch, drawn_paths=[])
+            for _ in range(7)
+        ]
+        # Several commits sharing a timestamp must still page in a stable order
+        moment = timezone.now()
+        UserPage.objects.filter(id__in=[commit.id for commit in self.commits[2:5]]).update(created_at=moment)
+        self.expected = list(
+            UserPage.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.url = f'/users/{self.user.id}/pages/{self.pages[0].id}/branch/{self.branch.id}'
+
+    def test_cursor_round_trip(self):
+        commit = UserPage.objects.get(id=self.commits[3].id)
+        self.assertEqual(decode_cursor(encode_cursor(commit)), (commit.created_at, commit.id))
+
+    def test_pages_cover_history_once(self):
+        seen = []
+        cursor = None
+        while True:
+            commits, cursor = paginate_history(UserPage.objects.all(), cursor=cursor, limit=3)
+            seen += [commit.id for commit in commits]
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_last_page_has_no_cursor(self):
+        commits, cursor = paginate_history(UserPage.objects.all(), limit=7)
+        self.assertEqual(len(commits), 7)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor(self):
+        for cursor in ('not base64!', encode_cursor_text('no-separator'), encode_cursor_text('2024-01-01|x')):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_paginated_endpoint(self):
+        response = self.client.get(self.url, {'limit': 4, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[:4])
+
+        response = self.client.get(self.url, {'limit': 4, 'fields': 'id', 'cursor': response.data['next_cursor']})
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[4:])
+        self.assertIsNone(response.data['next_cursor'])
+
+    def test_endpoint_rejects_bad_input(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, 400)
+
+    def test_head(self):
+        response = self.client.get(self.url, {'head': 'true', 'fields': 'id'})
+        self.assertEqual(response.data, {'id': self.expected[0]})
+
+
+@override_settings(USER_PAGE_COMMIT_STORAGE='delta', USER_PAGE_SNAPSHOT_INTERVAL=4, USER_PAGE_SIMPLIFY_TOLERANCE=0)
+class ExportTests(UserPageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.expected = {}
+        for page in self.pages[:2]:
+            drawn_paths = []
+            for index in range(6):
+                drawn_paths = drawn_paths + [stroke((index, page.page_number), (index + 1, 0))]
+                commit = create_commit(self.user, page, self.branch, drawn_paths)
+                self.expected[commit.id] = drawn_paths
+        cache.clear()
+
+    def read(self, chunks):
+        lines = gzip.decompress(b''.join(chunks)).decode('utf-8').splitlines()
+        return [json.loads(line) for line in lines]
+
+    def test_export_replays_deltas_without_caching(self):
+        get_catalog(self.mushaf.id)
+        with self.assertNumQueries(2):
+            records = self.read(export_user_pages(self.user.id))
+        self.assertEqual({record['id']: record['drawn_paths'] for record in records}, self.expected)
+        self.assertEqual([record['id'] for record in records], sorted(self.expected))
+        for user_page_id in self.expected:
+            self.assertIsNone(cache.get(DRAWN_PATHS_CACHE_KEY.format(id=user_page_id)))
+
+    def test_export_falls_back_when_parent_was_not_exported_first(self):
+        delta = UserPage.objects.filter(base__isnull=False).order_by('id').first()
+        UserPage.objects.filter(id=delta.id).update(created_at=timezone.now() - timedelta(days=1))
+        records = self.read(export_user_pages(self.user.id))
+        self.assertEqual(records[0]['id'], delta.id)
+        self.assertEqual({record['id']: record['drawn_paths'] for record in records}, self.expected)
+
+    def test_async_export_matches_sync_export(self):
+        async def collect():
+            return [chunk async for chunk in export_user_pages_async(self.user.id)]
+
+        self.assertEqual(
+            self.read(async_to_sync(collect)()),
+            self.read(export_user_pages(self.user.id)),
+        )
+
+    def test_endpoint_streams(self):
+        response = self.client.get(f'/users/{self.user.id}/export')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(len(self.read(response.streaming_content)), len(self.expected))
+
+    def test_endpoint_streams_asynchronously_under_asgi(self):
+        async def fetch():
+            response = await AsyncClient(headers={'host': 'localhost'}).get(f'/users/{self.user.id}/export')
+            self.assertTrue(response.is_async)
+            return response.status_code, [chunk async for chunk in response.streaming_content]
+
+        status_code, chunks = async_to_sync(fetch)()
+        self.assertEqual(status_code, 200)
+        self.assertEqual(len(self.read(chunks)), len(self.expected))
+
+
+@override_settings(USER_PAGE_SIMPLIFY_TOLERANCE=0)
+class BatchIngestTests(UserPageTestCase):
+    def commit(self, client_commit_id, page=0, **fields):
+        return {
+            'client_commit_id': client_commit_id, 'user': self.user.id,
+            'mushaf_page': self.pages[page].id, 'branch': self.branch.id,
+            'drawn_paths': [stroke((page, 0), (page, 1))], **fields,
+        }
+
+    def post(self, commits):
+        response = self.client.post('/user_pages/batch', {'commits': commits}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_resent_batch_is_not_stored_twice(self):
+        commits = [self.commit('a'), self.commit('b', page=1)]
+        first = self.post(commits)
+        self.assertEqual([result['status'] for result in first], [CREATED, CREATED])
+
+        second = self.post(commits)
+        self.assertEqual([result['status'] for result in second], [EXISTING, EXISTING])
+        self.assertEqual([result['id'] for result in second], [result['id'] for result in first])
+        self.assertEqual(UserPage.objects.count(), 2)
+
+    def test_repeats_within_a_batch(self):
+        results = self.post([self.commit('a'), self.commit('a')])
+        self.assertEqual([result['status'] for result in results], [CREATED, EXISTING])
+        self.assertEqual(results[0]['id'], results[1]['id'])
+
+    def test_invalid_commits_are_reported(self):
+        results = self.post([self.commit('a', mushaf_page=999999), {'user': self.user.id}, self.commit('b')])
+        self.assertEqual([result['status'] for result in results], [INVALID, INVALID, CREATED])
+        self.assertIn('mushaf_page', results[0]['errors'])
+
+    def test_commits_get_consecutive_sync_seqs(self):
+        self.post([self.commit('a'), self.commit('b', page=1)])
+        first, second = UserPage.objects.order_by('id').values_list('sync_seq', flat=True)
+        self.assertEqual(second, first + 1)
+
+    def test_commit_stored_by_a_concurrent_upload_is_existing(self):
+        bulk_create = UserPage.objects.bulk_create
+
+        def race(user_pages, **kwargs):
+            # Another request stores "a" between our lookup and our insert
+            concurrent = UserPage.objects.create(
+                user=self.user, mushaf_page=self.pages[0], branch=self.branch,
+                drawn_paths=[], client_commit_id='a',
+            )
+            race.winner = concurrent.id
+            return bulk_create(user_pages, **kwargs)
+
+        with mock.patch.object(UserPage.objects, 'bulk_create', side_effect=race), \
+                mock.patch('user_page.ingest.update_user_progress_report') as update_progress:
+            results = self.post([self.commit('a'), self.commit('b', page=1)])
+
+        self.assertEqual(results[0], {'client_commit_id': 'a', 'status': EXISTING, 'id': race.winner})
+        self.assertEqual(results[1]['status'], CREATED)
+        self.assertEqual([call.args[0].id for call in update_progress.call_args_list], [results[1]['id']])
+
+    def test_client_created_at_is_kept(self):
+        made_at = timezone.now() - timedelta(days=2)
+        results = self.post([self.commit('a', created_at=made_at.isoformat()), self.commit('b', page=1)])
+        self.assertEqual(UserPage.objects.get(id=results[0]['id']).created_at, made_at)
+        self.assertGreater(UserPage.objects.get(id=results[1]['id']).created_at, made_at)
+
+    def test_created_at_in_the_future_is_invalid(self):
+        later = timezone.now() + timedelta(hours=1)
+        results = self.post([self.commit('a', created_at=later.isoformat())])
+        self.assertEqual(results[0]['status'], INVALID)
+        self.assertIn('created_at', results[0]['errors'])
+
+
+@override_settings(
+    USER_PAGE_COMMIT_STORAGE='delta', USER_PAGE_STROKE_STORAGE='binary',
+    USER_PAGE_SNAPSHOT_INTERVAL=3, USER_PAGE_SIMPLIFY_TOLERANCE=0,
+)
+class BatchDeltaIngestTests(BatchIngestTests):
+    def growing(self, client_commit_id, count, page=0):
+        return self.commit(client_commit_id, page=page, drawn_paths=[stroke((n, 0), (n, 1)) for n in range(count)])
+
+    def test_commits_are_stored_as_deltas(self):
+        first = create_commit(self.user, self.pages[0], self.branch, [stroke((0, 0), (0, 1))])
+        results = self.post([
+            self.growing('a', 2), self.growing('b', 3, page=1), self.growing('c', 3), self.growing('d', 4),
+        ])
+        self.assertEqual([result['status'] for result in results], [CREATED] * 4)
+        a, b, c, d = (UserPage.objects.get(id=result['id']) for result in results)
+
+        self.assertEqual((a.parent_id, a.base_id, a.depth), (first.id, first.id, 1))
+        self.assertEqual((c.parent_id, c.base_id, c.depth), (a.id, first.id, 2))
+        # The snapshot interval applies across the batch too
+        self.assertEqual((d.parent_id, d.base_id, d.depth), (c.id, None, 0))
+        self.assertEqual((b.parent_id, b.base_id), (None, None))
+        for user_page, count in ((a, 2), (c, 3), (d, 4), (b, 3)):
+            cache.clear()
+            self.assertEqual(len(user_page.get_drawn_paths()), count)
+        self.assertEqual(c.get_drawn_paths(), [stroke((n, 0), (n, 1)) for n in range(3)])
+        self.assertEqual(c.stroke_count, 3)
+
+    def test_commit_on_a_concurrently_stored_parent(self):
+        bulk_create = UserPage.objects.bulk_create
+
+        def race(user_pages, **kwargs):
+            if any(user_page.client_commit_id == 'a' for user_page in user_pages):
+                race.winner = create_commit(
+                    self.user, self.pages[0], self.branch, [stroke((0, 0), (0, 1))], client_commit_id='a',
+                )
+            return bulk_create(user_pages, **kwargs)
+
+        with mock.patch.object(UserPage.objects, 'bulk_create', side_effect=race):
+            results = self.post([self.growing('a', 1), self.growing('b', 2)])
+
+        self.assertEqual([result['status'] for result in results], [EXISTING, CREATED])
+        b = UserPage.objects.get(id=results[1]['id'])
+        self.assertEqual((b.parent_id, b.base_id, b.depth), (race.winner.id, race.winner.id, 1))
+        cache.clear()
+        self.assertEqual(b.get_drawn_paths(), [stroke((n, 0), (n, 1)) for n in range(2)])
+
+
+@override_settings(USER_PAGE_SIMPLIFY_TOLERANCE=0)
+class UserSyncTests(UserPageTestCase):
+    def sync(self, **params):
+        response = self.client.get(f'/users/{self.user.id}/sync', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def commit(self, page=0):
+        return UserPage.objects.create(
+            user=self.user, mushaf_page=self.pages[page], branch=self.branch, drawn_paths=[stroke((0, 0), (1, 1))],
+        )
+
+    def test_counter_lives_off_the_user_row(self):
+        user_seq = self.branch.sync_seq
+        self.assertEqual(SyncCounter.objects.get(user=self.user).seq, user_seq)
+        self.assertEqual(reserve_sync_seqs(self.user.id, 3), user_seq + 1)
+        self.assertEqual(reserve_sync_seqs(self.user.id), user_seq + 4)
+
+    def test_everything_since_start(self):
+        user_page = self.commit()
+        data = self.sync()
+        self.assertEqual(data['since'], 0)
+        self.assertFalse(data['has_more'])
+        self.assertEqual([branch['id'] for branch in data['branches']], [self.branch.id])
+        self.assertEqual([row['id'] for row in data['user_pages']], [user_page.id])
+        self.assertEqual(data['cursor'], UserPage.objects.get(id=user_page.id).sync_seq)
+
+    def test_only_changes_after_cursor(self):
+        self.commit()
+        cursor = self.sync()['cursor']
+        self.assertEqual(self.sync(since=cursor)['cursor'], cursor)
+        self.assertEqual(self.sync(since=cursor)['user_pages'], [])
+
+        later = self.commit(page=1)
+        data = self.sync(since=cursor)
+        self.assertEqual([row['id'] for row in data['user_pages']], [later.id])
+        self.assertEqual(data['branches'], [])
+        self.assertGreater(data['cursor'], cursor)
+
+    def test_cursor_walks_pages_of_changes(self):
+        user_pages = [self.commit(page) for page in (0, 1, 2)]
+        seen = []
+        since = 0
+        while True:
+            data = self.sync(since=since, limit=2)
+            seen += [('branch', row['id']) for row in data['branches']]
+            seen += [('user_page', row['id']) for row in data['user_pages']]
+            if not data['has_more']:
+                break
+            self.assertEqual(len(data['branches']) + len(data['user_pages']) + len(data['progress_reports']), 2)
+            since = data['cursor']
+        # Progress reports ride along with the commits; every page and branch shows up exactly once
+        self.assertEqual(sorted(seen), sorted([('branch', self.branch.id)] + [('user_page', row.id) for row in user_pages]))
+
+    def test_updated_row_moves_past_cursor(self):
+        cursor = self.sync()['cursor']
+        self.branch.title = 'Renamed'
+        self.branch.save()
+        data = self.sync(since=cursor)
+        self.assertEqual([(branch['id'], branch['title']) for branch in data['branches']], [(self.branch.id, 'Renamed')])
+
+    def test_invalid_parameters(self):
+        for params in ({'since': -1}, {'since': 'x'}, {'limit': 0}):
+            response = self.client.get(f'/users/{self.user.id}/sync', params)
+            self.assertEqual(response.status_code, 400)
+
+
+    def test_deletions_are_synced(self):
+        kept, deleted = self.commit(), self.commit(page=1)
+        cursor = self.sync()['cursor']
+        deleted_id = deleted.id
+        deleted.delete()
+
+        data = self.sync(since=cursor)
+        self.assertEqual([(row['kind'], row['id']) for row in data['deleted']], [('user_pages', deleted_id)])
+        self.assertGreater(data['cursor'], cursor)
+        self.assertEqual(self.sync(since=data['cursor'])['deleted'], [])
+        self.assertTrue(UserPage.objects.filter(id=kept.id).exists())
+
+    def test_cascaded_deletions_are_synced(self):
+        user_page = self.commit()
+        cursor = self.sync()['cursor']
+        self.pages[0].delete()
+        self.assertIn(('user_pages', user_page.id), {(row['kind'], row['id']) for row in self.sync(since=cursor)['deleted']})
+
+        cursor = self.sync()['cursor']
+        branch_id = self.branch.id
+        UserPage.objects.filter(branch=self.branch).delete()
+        Branch.objects.filter(id=branch_id).delete()
+        self.assertEqual(
+            [(row['kind'], row['id']) for row in self.sync(since=cursor)['deleted']],
+            [('branches', branch_id)],
+        )
+
+    def test_deleting_the_user_leaves_no_tombstones(self):
+        self.commit()
+        self.user.delete()
+        self.assertFalse(SyncTombstone.objects.exists())
+
+class ResponseShapeTests(UserPageTestCase):
+    fields = {'id', 'mushaf_page', 'drawn_paths', 'user', 'branch', 'camped', 'created_at', 'updated_at'}
+
+    def test_internal_columns_stay_out_of_responses(self):
+        response = self.client.post('/user_pages', {
+            'user': self.user.id, 'mushaf_page': self.pages[0].id, 'branch': self.branch.id,
+            'drawn_paths': [stroke((0, 0), (1, 1))],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(response.data), self.fields)
+
+        user_page = UserPage.objects.get(id=response.data['id'])
+        self.assertEqual(set(UserPageSerializer(user_page).data), self.fields)
+        self.assertEqual(set(UserProgressSerializer(user_page).data) - {'title', 'percentage', 'page_number'}, self.fields)
@@ -1,8 +1,11 @@
 from django.shortcuts import get_object_or_404
+from django.core.handlers.asgi import ASGIRequest
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import UserPageSerializer, CreateUserPageSerializer, UserProgressSerializer
+from rest_framework.settings import api_settings
+from rest_framework.renderers import JSONRenderer
+from .serializers import UserPageSerializer, CreateUserPageSerializer, UserProgressSerializer, sparse_fieldset
 from .models import UserPage
 from rest_framework.authtoken.views import ObtainAuthToken
 from mushaf_page.models import MushafPage
@@ -15,8 +18,20 @@ from operator import attrgetter
 import random
 from random import choice
 from django.db.models import Max
-from django.db.models import Q
+from django.db.models import Q, OuterRef, Subquery
 from user_progress_report.models import update_user_progress_report
+from mushaf.catalog import SURAH, get_catalog_for_page
+from .stroke_codec import StrokeEncodingError
+from .renderers import DrawnPathsRenderer
+from .commits import create_commit
+from .pagination import InvalidCursor, paginate_history
+from .export import export_user_pages, export_user_pages_async
+from .ingest import ingest_commits
+from user_progress_report.models import UserProgressReport
+from accounts.models import SyncTombstone
+from user_progress_report.serializers import UserProgressReportSerializer
+from django.http import StreamingHttpResponse
+from django.conf import settings
 
 class CreateUserPageView(APIView):
     def post(self, request):
@@ -28,11 +43,14 @@ class CreateUserPageView(APIView):
 
             try:
                 # Create a new UserPage instance
-                user_page = UserPage.objects.create(
+                # Stored in full or as a delta on the branch's last commit (USER_PAGE_COMMIT_STORAGE);
+                # nearly collinear pointer samples are dropped, keeping the raw counts
+                user_page = create_commit(
                     user=get_user_model().objects.get(id=user_id),
                     mushaf_page=MushafPage.objects.get(id=mushaf_page_id),
                     branch=Branch.objects.get(id=branch_id),
                     drawn_paths=request.data.get('drawn_paths', []),
+                    simplify_tolerance=settings.USER_PAGE_SIMPLIFY_TOLERANCE,
                     camped=request.data.get('camped', False)
                 )
                 serializer = CreateUserPageSerializer(user_page)
@@ -46,23 +64,186 @@ class CreateUserPageView(APIView):
                 )
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+class BatchCreateUserPagesView(APIView):
+    """
+    Upload of commits queued offline: {"commits": [{client_commit_id, user,
+    mushaf_page, branch, drawn_paths, camped, created_at}, ...]}. Commits
+    already stored under the same client_commit_id are reported as existing,
+    not stored again. created_at is when the commit was made on the client
+    (the upload time when absent), so queued commits keep their place in
+    the history.
+    """
+    def post(self, request):
+        commits = request.data.get('commits') if isinstance(request.data, dict) else None
+        if not isinstance(commits, list):
+            return Response({"error": "commits must be a list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(commits) > settings.USER_PAGE_BATCH_MAX_COMMITS:
+            return Response(
+                {"error": f"A batch can hold at most {settings.USER_PAGE_BATCH_MAX_COMMITS} commits."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({'results': ingest_commits(commits)}, status=status.HTTP_200_OK)
+
+class UserSyncView(APIView):
+    """
+    Everything that changed for a user after ?since=<cursor>: commits,
+    branches and progress reports, oldest change first, at most ?limit=
+    changes. Rows deleted since are listed under "deleted" as {kind, id}, kind
+    being the key they are synced under. Send the returned cursor as the next
+    since; has_more says whether to ask again straight away. ?fields= /
+    ?include= apply to the commits.
+    """
+    def get(self, request, user_id):
+        user = get_object_or_404(get_user_model(), id=user_id)
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', settings.USER_SYNC_PAGE_SIZE))
+            if since < 0 or limit < 1:
+                raise ValueError
+        except ValueError:
+            return Response({"error": "since and limit must be non-negative integers."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, settings.USER_SYNC_MAX_PAGE_SIZE)
+
+        # Each query is a range scan on its (user, sync_seq) index
+        fieldset = sparse_fieldset(request)
+        changed = {
+            'user_pages': list(UserPageSerializer.restrict_queryset(
+                UserPage.objects.filter(user_id=user.id, sync_seq__gt=since), **fieldset
+            ).order_by('sync_seq')[:limit + 1]),
+            'branches': list(Branch.objects.filter(user_id=user.id, sync_seq__gt=since).order_by('sync_seq')[:limit + 1]),
+            'progress_reports': list(
+                UserProgressReport.objects.filter(user_id=user.id, sync_seq__gt=since).order_by('sync_seq')[:limit + 1]
+            ),
+            'deleted': list(SyncTombstone.objects.filter(user_id=user.id, sync_seq__gt=since).order_by('sync_seq')[:limit + 1]),
+        }
+
+        # Keep the `limit` oldest changes over all kinds
+        seqs = sorted(row.sync_seq for rows in changed.values() for row in rows)
+        has_more = len(seqs) > limit
+        cursor = seqs[limit - 1] if has_more else (seqs[-1] if seqs else since)
+        for kind, rows in changed.items():
+            changed[kind] = [row for row in rows if row.sync_seq <= cursor]
+
+        return Response({
+            'since': since,
+            'cursor': cursor,
+            'has_more': has_more,
+            'user_pages': UserPageSerializer(changed['user_pages'], many=True, **fieldset).data,
+            'branches': [
+                {
+                    'id': branch.id,
+                    'title': branch.title,
+                    'position': branch.position,
+                    'hash_id': branch.hash_id,
+                    'sync_seq': branch.sync_seq,
+                }
+                for branch in changed['branches']
+            ],
+            'progress_reports': [
+                {'id': report.id, 'sync_seq': report.sync_seq, **UserProgressReportSerializer(report).data}
+                for report in changed['progress_reports']
+            ],
+            'deleted': [
+                {'kind': tombstone.kind, 'id': tombstone.object_id, 'sync_seq': tombstone.sync_seq}
+                for tombstone in changed['deleted']
+            ],
+        }, status=status.HTTP_200_OK)
+
+class UserPageDrawnPathsView(APIView):
+    """
+    drawn_paths of one commit, as the packed binary format (see
+    user_page/stroke_codec.py) for clients that send
+    Accept: application/x-drawn-paths, and as JSON otherwise.
+    """
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [DrawnPathsRenderer]
+
+    def get(self, request, user_page_id):
+        user_page = get_object_or_404(UserPage, id=user_page_id)
+
+        if not isinstance(request.accepted_renderer, DrawnPathsRenderer):
+            return Response(user_page.get_drawn_paths(), status=status.HTTP_200_OK)
+
+        try:
+            blob = user_page.get_drawn_paths_blob()
+        except StrokeEncodingError as e:
+            # The error itself is reported as JSON
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+            return Response({"error": str(e)}, status=status.HTTP_406_NOT_ACCEPTABLE)
+        return Response(blob, status=status.HTTP_200_OK)
+
+class UserPagesExportView(APIView):
+    """
+    Every commit of a user as a gzip-compressed NDJSON download, streamed
+    row by row.
+    """
+    def get(self, request, user_id):
+        user = get_object_or_404(get_user_model(), id=user_id)
+        # ASGI would buffer a sync iterator whole, so it gets an async one
+        if isinstance(request._request, ASGIRequest):
+            content = export_user_pages_async(user.id)
+        else:
+            content = export_user_pages(user.id)
+        response = StreamingHttpResponse(content, content_type='application/gzip')
+        response['Content-Disposition'] = f'attachment; filename="user-{user.id}-pages.ndjson.gz"'
+        return response
+
 class UserPageView(APIView):
+    """
+    Commit history of a page on a branch, newest first.
+
+    Without query parameters every commit is returned as a list. ?head=true
+    returns only the latest commit; ?limit= and ?cursor= page through the
+    history as {"results": [...], "next_cursor": ...}.
+    """
     def get(self, request, user_id, mushaf_page_id, branch_id):
-        user_pages = UserPage.objects.filter(
+        # ?fields= / ?include= trim both the response and the columns loaded
+        fieldset = sparse_fieldset(request)
+        user_pages = UserPageSerializer.restrict_queryset(UserPage.objects.filter(
             mushaf_page_id=mushaf_page_id, 
             user_id=user_id, 
             branch_id=branch_id
-        ).order_by('-created_at')
+        ).order_by('-created_at', '-id'), **fieldset)
+
+        if request.query_params.get('head', '').lower() in ('1', 'true'):
+            head = user_pages.first()
+            if head is None:
+                return Response({"error": "No commits found for this page."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(UserPageSerializer(head, **fieldset).data, status=status.HTTP_200_OK)
+
+        if 'limit' in request.query_params or 'cursor' in request.query_params:
+            try:
+                limit = int(request.query_params.get('limit', settings.USER_PAGE_HISTORY_PAGE_SIZE))
+                if limit < 1:
+                    raise ValueError
+                user_pages, next_cursor = paginate_history(
+                    user_pages,
+                    cursor=request.query_params.get('cursor'),
+                    limit=min(limit, settings.USER_PAGE_HISTORY_MAX_PAGE_SIZE),
+                )
+            except InvalidCursor as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            except ValueError:
+                return Response({"error": "limit must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+            serializer = UserPageSerializer(user_pages, many=True, **fieldset)
+            return Response({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
         
-        serializer = UserPageSerializer(user_pages, many=True)  # Set many=True to serialize multiple objects
+        serializer = UserPageSerializer(user_pages, many=True, **fieldset)  # Set many=True to serialize multiple objects
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 class UserProgressView(APIView):
     def get(self, request, user_id):
-        queryset = UserPage.objects.filter(user_id=user_id).order_by('mushaf_page')
+        fieldset = sparse_fieldset(request)
+        queryset = UserProgressSerializer.restrict_queryset(
+            UserPage.objects.filter(user_id=user_id).order_by('mushaf_page'), **fieldset
+        )
 
         for page in queryset:
-            segment, percentage = page.mushaf_page.mushaf.get_segment_and_percentage(page.mushaf_page.page_number)  # Add your custom value here
+            segment = None
+            catalog = get_catalog_for_page(page.mushaf_page_id)
+            if catalog is not None:
+                segment, percentage = catalog.segment_and_percentage(catalog.page(page.mushaf_page_id).page_number, SURAH)
             if segment is not None:
                 page.segment = segment.id
             else:
@@ -87,7 +268,7 @@ class UserProgressView(APIView):
 
         queryset = [page for pages in filtered_dict.values() for page in pages]
 
-        serializer = UserProgressSerializer(queryset, many=True)
+        serializer = UserProgressSerializer(queryset, many=True, **fieldset)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -104,11 +285,16 @@ class RandomUserPageView(APIView):
         if user.starting_verse_boundary and user.ending_verse_boundary and user.starting_verse_boundary.strip() and user.ending_verse_boundary.strip():
             # Proceed with existing boundaries
             try:
-                starting_page = MushafPage.find_page_by_verse_ref(mushaf_id=1, verse_ref=user.starting_verse_boundary)
-                ending_page = MushafPage.find_page_by_verse_ref(mushaf_id=1, verse_ref=user.ending_verse_boundary)
-                
+                # Resolved from the in-memory verse index, so only page ids come back
+                starting_page = MushafPage.find_page_entry_by_verse_ref(mushaf_id=1, verse_ref=user.starting_verse_boundary)
+                ending_page = MushafPage.find_page_entry_by_verse_ref(mushaf_id=1, verse_ref=user.ending_verse_boundary)
+                if starting_page is None or ending_page is None:
+                    raise ValueError("No matching page found for the verse boundaries.")
+                starting_page_id, _ = starting_page
+                ending_page_id, _ = ending_page
+
                 # Add page range to filter
-                page_range_filter &= Q(mushaf_page__gte=starting_page) & Q(mushaf_page__lte=ending_page)
+                page_range_filter &= Q(mushaf_page__gte=starting_page_id) & Q(mushaf_page__lte=ending_page_id)
             except Exception as e:
                 return Response(
                     {"error": f"Error processing verse boundaries: {str(e)}"},
@@ -118,52 +304,39 @@ class RandomUserPageView(APIView):
             # If either boundary is empty string, null, or just whitespace, proceed without page range filtering
             pass  # page_range_filter will only contain the current_page exclusion
 
-        # Step 1: Get the latest UserPage for each mushaf_page within boundaries
-        newest_user_pages = (
-            UserPage.objects.filter(
-                user_id=user_id,
-                drawn_paths__isnull=False
-            )
+        # Step 1: Commits with strokes within boundaries
+        user_pages_with_strokes = (
+            UserPage.objects.filter(user_id=user_id, stroke_count__gt=0)
             .filter(page_range_filter)  # Apply page range filter
-            .exclude(drawn_paths=[])
-            .values('mushaf_page')
-            .annotate(latest_created_at=Max('created_at'))
         )
 
-        if not newest_user_pages:
+        if not user_pages_with_strokes.exists():
             return Response(
                 {"message": "No UserPages found within the specified verse boundaries"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Step 2: Fetch the actual UserPage instances for the latest entries
-        newest_user_page_ids = [
-            UserPage.objects.filter(
-                mushaf_page=data['mushaf_page'],
-                created_at=data['latest_created_at']
-            ).first().id
-            for data in newest_user_pages
-        ]
-
-        # Step 3: Fetch the UserPages that are the latest for each mushaf_page
-        user_pages = UserPage.objects.filter(id__in=newest_user_page_ids)
-
-        # Step 4: Filter the pages with drawn_paths that contains an array with more than 10 objects
-        filtered_user_pages = []
-        for page in user_pages:
-            for drawn_path_array in page.drawn_paths:
-                if isinstance(drawn_path_array, list) and len(drawn_path_array) > 10:
-                    filtered_user_pages.append(page)
-                    break
-
-        if not filtered_user_pages:
+        # Steps 2-4: Keep the latest of those for each mushaf_page when it has a stroke
+        # of more than 10 points, using the stroke statistics columns instead of drawn_paths
+        latest_created_at = (
+            UserPage.objects.filter(user_id=user_id, stroke_count__gt=0, mushaf_page=OuterRef('mushaf_page'))
+            .order_by('-created_at')
+            .values('created_at')[:1]
+        )
+        filtered_user_page_ids = list(
+            user_pages_with_strokes
+            .filter(long_stroke_count__gt=0, created_at=Subquery(latest_created_at))
+            .values_list('id', flat=True)
+        )
+
+        if not filtered_user_page_ids:
             return Response(
                 {"message": "No UserPages found with drawn_paths arrays having more than 10 objects within the verse boundaries"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
         # Step 5: Select a random UserPage from the filtered pages
-        random_user_page = choice(filtered_user_pages)
+        random_user_page = UserPage.objects.get(id=choice(filtered_user_page_ids))
 
         # Step 6: Serialize and return the random UserPage
         serializer = UserPageSerializer(random_user_page)
@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-18 06:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mushaf_page', '0007_mushafpage_verse_keys'),
+        ('user_progress_report', '0002_userprogressreport_title'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogressreport',
+            name='sync_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='userprogressreport',
+            index=models.Index(fields=['user', 'sync_seq'], name='progress_user_sync_seq_idx'),
+        ),
+    ]
@@ -3,9 +3,10 @@ from django.contrib.auth.models import User
 from mushaf_page.models import MushafPage
 from user_page.models import UserPage
 from django.contrib.auth import get_user_model
+from accounts.sync import SyncSeqMixin
 
 
-class UserProgressReport(models.Model):
+class UserProgressReport(SyncSeqMixin, models.Model):
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name='user_progress_reports')
     markings = models.IntegerField()
     mushaf_page = models.ForeignKey(MushafPage, on_delete=models.CASCADE)
@@ -13,6 +14,13 @@ class UserProgressReport(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     title = models.CharField(max_length=150, blank=True)
 
+    sync_kind = 'progress_reports'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sync_seq'], name='progress_user_sync_seq_idx'),
+        ]
+
     def __str__(self):
         return f"Report for {self.user.email} on page {self.mushaf_page}"
 
@@ -22,21 +30,13 @@ def get_latest_user_page_progress(user_id, branch_id, mushaf_page_id):
         user_id=user_id, branch=branch_id, mushaf_page=mushaf_page_id
     ).order_by('-updated_at')
     
-    latest_page = filtered_pages.first()
+    # Markings come from the stroke statistics columns, so the strokes themselves stay in the database
+    latest_page = filtered_pages.defer('drawn_paths', 'drawn_paths_blob', 'original_point_counts', 'delta', 'delta_blob').first()
     
     if latest_page:
-        # Get drawn_paths or empty list if None
-        drawn_paths = latest_page.drawn_paths or []
-        
-        # Count only drawn_paths that have at least 10 objects
-        valid_markings_count = sum(
-            1 for path in drawn_paths 
-            if len(path) >= 10
-        )
-        
         return {
             'latest_page': latest_page,
-            'drawn_paths_count': valid_markings_count
+            'drawn_paths_count': latest_page.valid_stroke_count
         }
     
     return {
@@ -55,29 +55,30 @@ def update_user_progress_report(user_page):
     if isinstance(user_page, int):
         id = user_page
         # Get the first user page for this user
-        user_page = UserPage.objects.get(id=id)
+        user_page = UserPage.objects.filter(id=id).first()
         if not user_page:
             print(f"No pages found for user {id}")
             return
-    
-    print(user_page)
-    branch_id = user_page.branch.id
-    mushaf_page_id = user_page.mushaf_page.id
 
-    progress_data = get_latest_user_page_progress(user_page.user, branch_id, mushaf_page_id)
+    # Work with ids only so no user, branch or page rows are fetched
+    user_id = user_page.user_id
+    branch_id = user_page.branch_id
+    mushaf_page_id = user_page.mushaf_page_id
+
+    progress_data = get_latest_user_page_progress(user_id, branch_id, mushaf_page_id)
     latest_page = progress_data['latest_page']
     drawn_paths_count = progress_data['drawn_paths_count']
 
     if latest_page:
-        title = find_mushaf_segment(mushaf_page_id).title
-        print(f"Title is {title}, page {mushaf_page_id}")
-        
+        # Reference data comes from the in-memory mushaf catalog
+        segment = find_mushaf_segment(mushaf_page_id)
+        title = segment.title if segment else ''
+
         # First, try to get existing record
-        user_model = get_user_model()
         try:
             progress_report = UserProgressReport.objects.get(
-                user=user_model.objects.get(id=user_page.user.id),
-                mushaf_page=MushafPage.objects.get(id=mushaf_page_id)
+                user_id=user_id,
+                mushaf_page_id=mushaf_page_id
             )
             # Update existing record
             progress_report.title = title
@@ -87,11 +88,9 @@ def update_user_progress_report(user_page):
         except UserProgressReport.DoesNotExist:
             # Create new record
             UserProgressReport.objects.create(
-                user=user_model.objects.get(id=user_page.user.id),
-                mushaf_page=MushafPage.objects.get(id=mushaf_page_id),
+                user_id=user_id,
+                mushaf_page_id=mushaf_page_id,
                 title=title,
                 markings=drawn_paths_count,
                 updated_at=latest_page.updated_at
             )
-        
-        print(f"Done with {title}, page {mushaf_page_id}")
\ No newline at end of file
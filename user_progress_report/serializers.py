@@ -1,11 +1,11 @@
 from rest_framework import serializers
 from .models import UserProgressReport
-from mushaf_page.serializers import MushafPageSerializer
+from mushaf_page.serializers import CatalogMushafPageField
 from django.utils import timezone
 from datetime import datetime
 
 class UserProgressReportSerializer(serializers.ModelSerializer):
-    mushaf_page = MushafPageSerializer()
+    mushaf_page = CatalogMushafPageField()
     last_touched = serializers.SerializerMethodField()
 
     class Meta: